@@ -15,59 +15,188 @@ def train_classifier_component(
 ):
     """
     Trains a product attractiveness classifier based on the scraped data.
+    The model artifact's metadata (the raw CSV's hash as dataset_version, features, params, metrics and price
+    currency) is published to the app's local registry with
+    `python -m utils.model_registry import model.joblib --metadata metadata.json`, which keys it the way the
+    app looks models up (feature_store.features_version: the CSV hash combined with the FX table version).
     """
+    import hashlib
     import pandas as pd
     import numpy as np
     import re
     import joblib # For saving the model
-    from sklearn.model_selection import train_test_split
     from sklearn.ensemble import RandomForestClassifier
     from sklearn.metrics import accuracy_score, classification_report
 
-    # --- Your data cleaning and feature engineering logic from tools/machine_learning.py ---
-    # (Include helper functions: clean_price, clean_sales_info, etc.)
-    # ...
+    # --- Cleaning: the vectorized parsers of utils/cleaning.py and the target of utils/feature_store.py ---
+    # (a KFP lightweight component only ships its own body, so they are inlined here)
+    NA_STRINGS = {"", "n/a", "nan", "none"}
+    BESTSELLER_KEYWORDS = ["le plus vendu", "best seller", "top selling", "choix d'aliexpress", "choice"]
+    FEATURES = ['price_numeric', 'sales_numeric', 'rating_numeric', 'has_bestseller_badge']
+    ATTRACTIVENESS_SCORE_THRESHOLD = 3
 
-    # ** KEY CHANGE: Load data from the input artifact's path **
-    df_raw = pd.read_csv(input_dataset.path)
+    def clean_strings(series):
+        strings = series.astype("string").str.strip()
+        return strings.mask(strings.str.lower().isin(NA_STRINGS))
 
-    # (Your full preprocessing logic from preprocess_data_and_create_target goes here)
-    # ...
-    # Let's assume this results in a DataFrame called `df_processed`
-    # and a list of `features`.
-    
-    df_processed, features = ..., ... # Result of your preprocessing
+    def parse_price(series):
+        # "MAD 143.97", "1 234,50", "1.234,50": the right-most separator is the decimal mark
+        if pd.api.types.is_numeric_dtype(series):
+            return series.astype(float)
+        numbers = clean_strings(series).str.replace(r'[^\d\.,]', '', regex=True)
+        has_both = numbers.str.contains('.', regex=False) & numbers.str.contains(',', regex=False)
+        comma_last = has_both & (numbers.str.rfind(',') > numbers.str.rfind('.'))
+        numbers = numbers.where(~comma_last, numbers.str.replace('.', '', regex=False))
+        numbers = numbers.where(~has_both | comma_last, numbers.str.replace(',', '', regex=False))
+        decimal_comma = numbers.str.contains(r',\d{1,2}$', regex=True)
+        numbers = numbers.where(~decimal_comma, numbers.str.replace(',', '.', regex=False))
+        numbers = numbers.str.replace(',', '', regex=False)
+        return pd.to_numeric(numbers, errors='coerce').astype(float)
+
+    def parse_sales(series):
+        # "5 000 vendus", "1k+ sold"; missing -> 0
+        if pd.api.types.is_numeric_dtype(series):
+            return series.fillna(0).astype(np.int64)
+        strings = clean_strings(series).str.lower()
+        digits = strings.str.replace(r'[^\d]', '', regex=True)
+        sales = pd.to_numeric(digits.mask(digits == ''), errors='coerce')
+        sales = sales.where(~strings.str.contains('k', regex=False).fillna(False), sales * 1000)
+        return sales.fillna(0).astype(np.int64)
+
+    def parse_rating(series):
+        if pd.api.types.is_numeric_dtype(series):
+            return series.astype(float)
+        return pd.to_numeric(clean_strings(series).str.replace(',', '.', regex=False), errors='coerce').astype(float)
+
+    def has_bestseller_badge(series):
+        pattern = "|".join(re.escape(keyword) for keyword in BESTSELLER_KEYWORDS)
+        return series.astype("string").str.lower().str.contains(pattern, regex=True).fillna(False).astype(np.int64)
+
+    def item_ids(urls, names):
+        # /item/<id>.html, else a hash of the name (missing names hash as "nan", as in the app)
+        ids = urls.astype("string").str.extract(r'/item/(\d+)\.html', expand=False)
+        fallback = names.astype("string").fillna("nan").map(lambda name: "name-" + hashlib.sha1(name.encode("utf-8")).hexdigest()[:12])
+        return ids.fillna(fallback).astype(object)
+
+    def preprocess(df_raw):
+        """
+        One raw chunk -> (features with the `is_attractive` target, indexed by item_id; feature list), as
+        build_features + training_data do per batch in utils.out_of_core: the rating median of the score and
+        the imputations are the chunk's. Prices stay in the scraped currency (MAD, the app's default).
+        """
+        def column(name):
+            return df_raw[name] if name in df_raw.columns else pd.Series(np.nan, index=df_raw.index, dtype=object)
 
-    if df_processed is None or df_processed.empty:
+        df = pd.DataFrame({
+            'item_id': item_ids(column('url'), column('name')),
+            'price_numeric': parse_price(column('price')),
+            'sales_numeric': parse_sales(column('sales_info')),
+            'rating_numeric': parse_rating(column('rating')),
+            'has_bestseller_badge': has_bestseller_badge(column('additional_badges')),
+        }, index=df_raw.index)
+        rating_for_score = df['rating_numeric'].fillna(df['rating_numeric'].median())
+        score = (
+            (df['sales_numeric'] > 500).astype(int) + (df['sales_numeric'] > 2000).astype(int)
+            + (rating_for_score > 4.0).astype(int) + (rating_for_score > 4.5).astype(int)
+            + (df['has_bestseller_badge'] == 1).astype(int) * 2
+        )
+        df['is_attractive'] = (score >= ATTRACTIVENESS_SCORE_THRESHOLD).astype(int)
+        df = df.drop_duplicates(subset='item_id', keep='first').set_index('item_id')  # Keep the best-ranked card
+        df = df.fillna({'price_numeric': df['price_numeric'].median(), 'rating_numeric': df['rating_numeric'].median(),
+                        'sales_numeric': 0.0})
+        return df, FEATURES
+
+    # ** KEY CHANGE: Stream the input artifact in chunks instead of one pd.read_csv **
+    # Months of snapshot history don't fit in the pod: each chunk is preprocessed on its own and folded
+    # into a stratified reservoir (uniform sample per class, like utils.out_of_core), so memory is bounded
+    # by MEMORY_BUDGET_MB whatever the history length. The item-stable holdout (HOLDOUT_PERCENT of the
+    # item_ids, as utils.incremental_training.holdout_mask) is never trained on: a uniform reservoir of it
+    # keeps the stream's class mix, so the metrics compare with the app's.
+    CHUNK_ROWS = 20_000
+    MEMORY_BUDGET_MB = 256
+    TEST_ROWS = 50_000
+    HOLDOUT_PERCENT = 25
+    rng = np.random.default_rng(42)
+
+    def reservoir_update(sample, seen, rows, capacity):
+        """Algorithm R: the row at stream position t replaces a random slot with probability capacity / (t + 1)."""
+        room = max(capacity - len(sample), 0)
+        sample = np.concatenate([sample, rows[:room]])
+        positions = seen + np.arange(room, len(rows))
+        slots = rng.integers(0, positions + 1)
+        accepted = np.flatnonzero(slots < capacity)[::-1]
+        _, last = np.unique(slots[accepted], return_index=True)  # Later rows win a contested slot
+        sample[slots[accepted[last]]] = rows[room:][accepted[last]]
+        return sample, seen + len(rows)
+
+    capacity = int(MEMORY_BUDGET_MB * 2**20 / (len(FEATURES) * 4 + 1) / 2)
+    reservoirs, seen = {}, {}
+    test_sample, test_seen = np.empty((0, len(FEATURES) + 1), dtype=np.float32), 0  # Features, then the label
+    for df_raw in pd.read_csv(input_dataset.path, chunksize=CHUNK_ROWS):
+        df_processed, features = preprocess(df_raw)
+        if df_processed.empty:
+            continue
+        rows = np.column_stack([df_processed[features].to_numpy(dtype=np.float32),
+                                df_processed['is_attractive'].to_numpy(dtype=np.float32)])
+        hashes = pd.util.hash_pandas_object(df_processed.index.astype(str), index=False).to_numpy(np.uint64)
+        holdout = hashes % 100 < HOLDOUT_PERCENT
+        test_sample, test_seen = reservoir_update(test_sample, test_seen, rows[holdout], TEST_ROWS)
+        for label in np.unique(rows[~holdout, -1]).astype(int).tolist():
+            label_rows = rows[~holdout & (rows[:, -1] == label), :-1]
+            sample = reservoirs.get(label, np.empty((0, len(features)), dtype=np.float32))
+            reservoirs[label], seen[label] = reservoir_update(sample, seen.get(label, 0), label_rows, capacity)
+
+    if not reservoirs:
         print("Data processing resulted in an empty dataframe. Aborting training.")
         return
+    print(f"Training rows per class: {seen}; sampled: { {label: len(sample) for label, sample in reservoirs.items()} }; "
+          f"holdout rows: {test_seen}, evaluated: {len(test_sample)}")
 
-    X = df_processed[features]
-    y = df_processed['is_attractive']
+    X_train = pd.DataFrame(np.concatenate(list(reservoirs.values())), columns=FEATURES)
+    y_train = pd.Series(np.concatenate([np.full(len(sample), label) for label, sample in reservoirs.items()]), name='is_attractive')
+    X_test = pd.DataFrame(test_sample[:, :-1], columns=FEATURES)
+    y_test = pd.Series(test_sample[:, -1].astype(int), name='is_attractive')
 
-    if y.nunique() < 2:
+    if y_train.nunique() < 2:
         print("Not enough class diversity to train. Aborting.")
         return
 
-    X_train, X_test, y_train, y_test = train_test_split(X, y, test_size=0.25, random_state=42, stratify=y)
-    
-    model = RandomForestClassifier(n_estimators=100, random_state=42, class_weight='balanced')
+    # Same hyperparameters as MODEL_PARAMS in tools/machine_learning.py, so both produce the same registry key.
+    # The sample over-represents the rare class; "balanced" re-weights it to the sample's own mix
+    params = {'n_estimators': 100, 'random_state': 42, 'class_weight': 'balanced'}
+    model = RandomForestClassifier(**params, n_jobs=-1) # All cores of the training pod; not part of the key
     model.fit(X_train, y_train)
 
     # ** KEY CHANGE: Save the model to the output artifact's path **
     joblib.dump(model, output_model.path)
     print(f"Model saved to: {output_model.path}")
 
-    # Evaluate and log metrics
+    # Evaluate on the holdout sample (the stream's class mix) and log metrics
     y_pred = model.predict(X_test)
-    accuracy = accuracy_score(y_test, y_pred)
-    report = classification_report(y_test, y_pred, output_dict=True)
+    accuracy = accuracy_score(y_test, y_pred) if len(y_test) else float('nan')
+    report = classification_report(y_test, y_pred, output_dict=True, zero_division=0) if len(y_test) else {}
+    class_1 = report.get('1', {})
+
+    # Registry metadata: SHA-1 prefix of the raw CSV, which the registry import combines with the FX table version.
+    # Prices are the scraped amounts, not converted: the import refuses the model for another reporting currency
+    digest = hashlib.sha1()
+    with open(input_dataset.path, "rb") as f:
+        for chunk in iter(lambda: f.read(1024 * 1024), b""):
+            digest.update(chunk)
+    output_model.metadata.update({
+        "dataset_version": digest.hexdigest()[:16],
+        "features": list(features),
+        "params": params,
+        "currency": "MAD",
+        "metrics": {"accuracy": float(accuracy), "report": report, "n_samples": int(sum(seen.values()) + test_seen),
+                    "holdout_rows": len(y_test), "evaluation": "item holdout, uniform sample"},
+    })
 
     # ** KEY CHANGE: Log metrics to the metrics artifact **
     output_metrics.log_metric("accuracy", round(accuracy, 4))
-    output_metrics.log_metric("precision_class_1", round(report['1']['precision'], 4))
-    output_metrics.log_metric("recall_class_1", round(report['1']['recall'], 4))
-    output_metrics.log_metric("f1_score_class_1", round(report['1']['f1-score'], 4))
+    output_metrics.log_metric("precision_class_1", round(class_1.get('precision', 0.0), 4))
+    output_metrics.log_metric("recall_class_1", round(class_1.get('recall', 0.0), 4))
+    output_metrics.log_metric("f1_score_class_1", round(class_1.get('f1-score', 0.0), 4))
     
     print(f"Accuracy: {accuracy}")
     print("Classification Report logged to Kubeflow Metrics.")
\ No newline at end of file
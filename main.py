@@ -1,5 +1,4 @@
 import streamlit as st
-import utils.ali_express as ali_express
 pages = {
     "🔴 Ali-Express": [
         st.Page("tools/dashboard.py", title="Dashboard"),
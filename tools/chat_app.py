@@ -1,6 +1,5 @@
 import streamlit as st
 import utils.chat as chat
-import utils.ali_express as ali_express
 
 st.set_page_config(page_title="Application Chatbot", page_icon="💬") # MODIFIED
 st.title("💬 Assistant Chatbot") # MODIFIED
@@ -18,6 +17,7 @@ with st.sidebar:
     st.sidebar.markdown("## Nouvelles Données ?") # MODIFIED
     if st.button("Lancer un nouveau scraping"): # MODIFIED
         with st.spinner("Scraping des articles les plus vendus sur AliExpress..."): # MODIFIED
+            import utils.ali_express as ali_express # Deferred: pulls in Selenium and webdriver_manager
             ali_express.scrape_aliexpress_top_selling()
         st.success("Scraping terminé !") # MODIFIED
     st.sidebar.markdown("---")
@@ -1,8 +1,7 @@
 # tools/chat_shopify_app.py
 import os 
 import streamlit as st
-import utils.chat_shopify as chat # This will load chat.df
-import utils.ali_express as ali_express # Assuming this file exists and function is defined
+import utils.chat_shopify as chat # chat.load_df() loads the product data on first use
 
 st.set_page_config(page_title="Application Chatbot", page_icon="💬")
 st.title("💬 Assistant Chatbot pour Shopify Insights") # MODIFIED for clarity
@@ -20,9 +19,10 @@ initialize_or_reset_chat()
 
 
 # --- Data Loading Check ---
-# The df is loaded when utils.chat_shopify is imported
+# The df is loaded on first use (and kept until the CSV changes), not when utils.chat_shopify is imported
 # We can add a check here to inform the user if data loading failed.
-if chat.df.empty:
+products_df = chat.load_df()
+if products_df.empty:
     st.error(
         "Le fichier de données produits (`utils/products_data.csv`) n'a pas pu être chargé ou est vide. "
         "Les fonctionnalités de RAG seront limitées ou indisponibles. "
@@ -36,7 +36,7 @@ if chat.df.empty:
 # --- Sidebar ---
 with st.sidebar:
     st.sidebar.markdown("Modèle LLM: `llama3-70b-8192` (via Groq)")
-    st.sidebar.markdown(f"Produits chargés: {len(chat.df)} (depuis `{chat.FILENAME}`)")
+    st.sidebar.markdown(f"Produits chargés: {len(products_df)} (depuis `{chat.FILENAME}`)")
 
 
 # --- Chat Interface ---
@@ -59,13 +59,13 @@ if user_input:
     # Get model response
     with st.chat_message("assistant"):
         with st.spinner("Réflexion en cours..."):
-            # CORE FIX: Pass user_input and the loaded dataframe (chat.df)
-            if chat.df.empty:
+            # CORE FIX: Pass user_input and the loaded dataframe (products_df)
+            if products_df.empty:
                 response = "Je ne peux pas répondre car les données produits ne sont pas chargées."
             elif not os.environ.get("GROQ_API_KEY"):
                  response = "La clé API GROQ n'est pas configurée. Je ne peux pas contacter le modèle IA."
             else:
-                response = chat.generate_rag_completion(user_input, chat.df)
+                response = chat.generate_rag_completion(user_input, products_df)
             
             st.markdown(response)
 
@@ -1,10 +1,21 @@
 import streamlit as st
 import pandas as pd
 import numpy as np
-import re
 import plotly.express as px
 import os # Added to check for file existence
-import utils.ali_express as ali_express
+import io
+import utils.snapshots as snapshots
+import utils.feature_store as feature_store
+import utils.scoring as scoring
+import utils.binning as binning
+import utils.pagination as pagination
+import utils.images as images
+import utils.model_registry as model_registry
+import utils.ranking as ranking
+from utils.range_index import RangeIndex
+from utils.dataset_version import file_version, bytes_version
+from utils.chunked import is_large_file
+from utils.currency import REPORTING_CURRENCY as CURRENCY, convert, fx_table_version
 
 
 
@@ -18,61 +29,98 @@ with st.sidebar:
     st.sidebar.markdown("## Nouvelles Données ?") # MODIFIED
     if st.button("Lancer un nouveau scraping"): # MODIFIED
         with st.spinner("Scraping des articles les plus vendus sur AliExpress..."): # MODIFIED
+            import utils.ali_express as ali_express # Deferred: pulls in Selenium and webdriver_manager
             ali_express.scrape_aliexpress_top_selling()
         st.success("Scraping terminé !") # MODIFIED
     st.sidebar.markdown("---")
 
-# --- Helper Functions (same as before) ---
-def clean_price(price_str):
-    if pd.isna(price_str) or price_str == "N/A": # N/A can be kept as is for data, or use specific NaN markers
-        return np.nan
-    cleaned_price = str(price_str).replace("MAD", "").replace(",", ".").strip()
-    try:
-        return float(cleaned_price)
-    except ValueError:
-        return np.nan
-
-def clean_rating(rating_str):
-    if pd.isna(rating_str) or rating_str == "N/A":
-        return np.nan
-    try:
-        return float(str(rating_str).replace(",", "."))
-    except ValueError:
-        return np.nan
-
-def extract_sales(sales_info_str):
-    if pd.isna(sales_info_str) or sales_info_str == "N/A":
-        return 0
-    match = re.search(r'([\d\s,]+)\s*vendus', str(sales_info_str)) # "vendus" is already French
-    if match:
-        try:
-            return int(match.group(1).replace(" ", "").replace(",", ""))
-        except ValueError:
-            return 0
-    return 0
-
-def calculate_score(row, weights):
-    score = 0
-    if pd.notna(row['rating_numeric']) and weights['rating'] > 0:
-        score += row['rating_numeric'] * weights['rating']
-    if pd.notna(row['sales_numeric']) and weights['sales'] > 0:
-        score += np.log1p(row['sales_numeric']) * weights['sales']
-    if pd.notna(row['price_numeric']) and weights['price'] > 0:
-        score -= (row['price_numeric']/100) * weights['price']
-    if pd.notna(row['discount_percentage_numeric']) and weights['discount'] > 0:
-        score += row['discount_percentage_numeric'] * weights['discount']
-    return score
-
-def clean_discount(discount_str):
-    if pd.isna(discount_str) or discount_str == "N/A" or not isinstance(discount_str, str):
-        return 0.0
-    match = re.search(r'(\d+\.?\d*)', discount_str)
-    if match:
-        try:
-            return float(match.group(1))
-        except ValueError:
-            return 0.0
-    return 0.0
+# --- Cached Loaders (keyed on the dataset version, not on the file name) ---
+RAW_PREVIEW_ROWS = 1000 # Rows read for the raw-data preview when the CSV is too large to load whole
+TOP_K_PAGE_SIZE = 10 # Top-K cards built per page
+
+@st.cache_data(max_entries=4)
+def load_csv(file_path, version):
+    # Large files are only previewed here; their features are built from chunked reads
+    return pd.read_csv(file_path, nrows=RAW_PREVIEW_ROWS if is_large_file(file_path) else None)
+
+@st.cache_data(max_entries=4)
+def load_uploaded_csv(_data, version):
+    # `_data` (raw bytes) is not hashed by Streamlit; `version` is its digest
+    return pd.read_csv(io.BytesIO(_data))
+
+@st.cache_data(max_entries=4)
+def load_features(_df_raw, version, fx_version, csv_path=None):
+    # Cleaned numeric columns come from the feature store, materialized once per dataset version
+    # (prices already converted to the reporting currency, hence the FX table version in the key).
+    # Files on disk go through the store's chunked reader; uploads are already in memory.
+    if csv_path is not None:
+        return feature_store.load_features_for_csv(csv_path).reset_index()
+    return feature_store.load_features(version, lambda: _df_raw).reset_index()
+
+@st.cache_data(max_entries=4)
+def load_item_deltas(version):
+    # Per-item price/sales/rank deltas from the snapshot history, keyed on the state file version
+    return snapshots.load_item_deltas()
+
+# --- Staged Processing (each stage only reruns when its own inputs change) ---
+@st.cache_resource(max_entries=4)
+def load_processed(_df_raw, version, fx_version, csv_path, history_version, model_key, scores_version, ranker_key):
+    # Features + trend columns + the classifier's attractiveness_proba (batch-scored by the registry's
+    # current model, NaN until it has scored this version) + the learned rank_score (stored per version
+    # on first use, NaN until a ranker is trained), and the score terms built from them.
+    # Held as a shared resource (no per-rerun copy): callers must treat the frame and matrix as read-only.
+    df_processed = load_features(_df_raw, version, fx_version, csv_path)
+    df_processed = df_processed.join(load_item_deltas(history_version)[snapshots.DELTA_COLUMNS], on='item_id')
+    # Snapshot price deltas are in the scraped currency; shown next to converted prices, so converted too
+    df_processed['price_change'] = convert(df_processed['price_change'], df_processed['currency'])
+    model_scores = feature_store.load_scores(version, model_key)
+    df_processed[feature_store.SCORE_COLUMN] = df_processed['item_id'].map(model_scores) if model_scores is not None else np.nan
+    rank_scores = ranking.scores_for_version(df_processed.set_index('item_id'), version) if ranker_key is not None else None
+    df_processed[feature_store.RANK_COLUMN] = df_processed['item_id'].map(rank_scores) if rank_scores is not None else np.nan
+    return df_processed, scoring.score_matrix(df_processed)
+
+@st.cache_resource(max_entries=4)
+def load_rank_order(_df_processed, processed_key):
+    # Row positions by descending rank_score, sorted once per version: a learned Top-K is then a lookup
+    return scoring.rank_order(_df_processed[feature_store.RANK_COLUMN].to_numpy(dtype=float))
+
+@st.cache_data(max_entries=16)
+def compute_scores(_score_terms, processed_key, weights):
+    # Only reruns when a weight slider moves
+    return scoring.weighted_scores(_score_terms, dict(weights))
+
+@st.cache_resource(max_entries=4)
+def load_range_index(_df_processed, processed_key):
+    # Sorted price/rating/probability columns, so range filters are searchsorted lookups instead of full masks
+    return RangeIndex(_df_processed, ['price_numeric', 'rating_numeric', feature_store.SCORE_COLUMN])
+
+@st.cache_data(max_entries=16)
+def filter_positions(_range_index, processed_key, price_range, rating_threshold, min_proba=0.0):
+    # Row positions passing the filters; only reruns when a filter moves.
+    # Missing prices pass the price range and missing ratings count as 0, as before; unscored rows
+    # only pass when the probability filter is off.
+    return _range_index.query({
+        'price_numeric': (price_range[0], price_range[1], True),
+        'rating_numeric': (rating_threshold, None, rating_threshold <= 0),
+        feature_store.SCORE_COLUMN: (min_proba, None, min_proba <= 0),
+    })
+
+@st.cache_data(max_entries=16)
+def summarize_large_csv(csv_path, version, fx_version, scores_version, price_range, rating_threshold, min_proba, _scores):
+    # Files over the large-file threshold: KPIs and histograms folded batch by batch (bounded memory),
+    # once per filter state; `_scores` is not hashed, its stored version is
+    return feature_store.summarize_csv(csv_path, price_range, rating_threshold, min_proba, _scores)
+
+@st.cache_data(max_entries=16)
+def chart_data(_filtered_df, filter_key, price_bin_method, scatter_mode):
+    # Chart inputs aggregated server-side once per filter state: Plotly gets a fixed number of bins /
+    # hexagons / sampled points, whatever the size of the catalog
+    price_bins = binning.binned_counts(_filtered_df['price_numeric'], bins=30, method=price_bin_method)
+    rating_bins = binning.binned_counts(_filtered_df['rating_numeric'], bins=10, value_range=(0, 5))
+    points = _filtered_df.dropna(subset=['price_numeric', 'rating_numeric'])[['name', 'price_numeric', 'rating_numeric', 'sales_numeric']]
+    if len(points) > binning.MAX_PLOT_POINTS and scatter_mode == 'hexbin':
+        return price_bins, rating_bins, None, binning.hexbin(points['price_numeric'], points['rating_numeric'], c=points['sales_numeric'])
+    return price_bins, rating_bins, binning.downsample(points), None
 
 # --- Main Application ---
 st.title("🛍️ Tableau de Bord d'Analyse de Produits") # MODIFIED
@@ -80,23 +128,36 @@ st.title("🛍️ Tableau de Bord d'Analyse de Produits") # MODIFIED
 # --- Data Loading Logic ---
 DEFAULT_CSV_FILE = "aliexpress_multi_page_firefox.csv"
 df = None
+data_version = None
+data_csv_path = None # Set when the data comes from a file on disk rather than an upload
 data_source_message = ""
 
 # Try to load the default CSV first
 if os.path.exists(DEFAULT_CSV_FILE):
     try:
-        df = pd.read_csv(DEFAULT_CSV_FILE)
+        data_version = file_version(DEFAULT_CSV_FILE)
+        df = load_csv(DEFAULT_CSV_FILE, data_version)
+        data_csv_path = DEFAULT_CSV_FILE
         data_source_message = f"✅ Fichier par défaut utilisé : `{DEFAULT_CSV_FILE}`. Vous pouvez téléverser un autre CSV pour le remplacer." # MODIFIED
     except Exception as e:
         data_source_message = f"⚠️ Erreur lors du chargement du fichier par défaut `{DEFAULT_CSV_FILE}` : {e}. Veuillez téléverser un fichier." # MODIFIED
         df = None # Ensure df is None if default load fails
+    if df is not None:
+        try:
+            snapshots.sync_from_csv(DEFAULT_CSV_FILE) # No-op unless this CSV isn't in the history yet
+        except Exception as e:
+            # The CSV itself loaded fine: only the trend columns miss this scrape (e.g. read-only data/ in the pod)
+            st.sidebar.warning(f"Historique des snapshots non mis à jour : {e}. Les tendances ne tiennent pas compte de ce fichier.") # MODIFIED
 
 # File uploader in the sidebar
 uploaded_file = st.sidebar.file_uploader("Téléversez votre fichier CSV de produits (de l'Étape 1)", type=["csv"]) # MODIFIED
 
 if uploaded_file is not None:
     try:
-        df = pd.read_csv(uploaded_file) # User upload overrides default
+        uploaded_bytes = uploaded_file.getvalue()
+        data_version = bytes_version(uploaded_bytes)
+        df = load_uploaded_csv(uploaded_bytes, data_version) # User upload overrides default
+        data_csv_path = None
         st.sidebar.success("Fichier téléversé avec succès !") # MODIFIED
         data_source_message = f"✅ Fichier téléversé utilisé : `{uploaded_file.name}`." # MODIFIED
     except Exception as e:
@@ -105,7 +166,9 @@ if uploaded_file is not None:
         # Attempt to reload default if upload fails and default was previously loaded
         if os.path.exists(DEFAULT_CSV_FILE) and (df is None or uploaded_file is not None): # Check if df was overwritten by failed upload attempt
             try:
-                df = pd.read_csv(DEFAULT_CSV_FILE)
+                data_version = file_version(DEFAULT_CSV_FILE)
+                df = load_csv(DEFAULT_CSV_FILE, data_version)
+                data_csv_path = DEFAULT_CSV_FILE
                 data_source_message = f"⚠️ Échec du téléversement. Retour au fichier par défaut : `{DEFAULT_CSV_FILE}`." # MODIFIED
             except Exception as e_default_reload:
                 data_source_message = f"⚠️ Échec du téléversement ET le fichier par défaut `{DEFAULT_CSV_FILE}` n'a pas pu être rechargé : {e_default_reload}. Veuillez téléverser un fichier." # MODIFIED
@@ -125,43 +188,22 @@ if df is not None:
     with st.expander("Afficher un Échantillon des Données Brutes", expanded=False): # MODIFIED
         st.write(df.head())
 
-    df_processed = df.copy()
+    for raw_col, label in [('price', "prix"), ('rating', "évaluations"), ('sales_info', "ventes")]:
+        if raw_col not in df.columns:
+            st.warning(f"Colonne '{raw_col}' introuvable. L'analyse basée sur les {label} sera limitée.") # MODIFIED
 
-    if 'price' in df_processed.columns:
-        df_processed['price_numeric'] = df_processed['price'].apply(clean_price)
-    else:
-        st.warning("Colonne 'price' introuvable. L'analyse basée sur les prix sera limitée.") # MODIFIED
-        df_processed['price_numeric'] = np.nan
-
-    if 'rating' in df_processed.columns:
-        df_processed['rating_numeric'] = df_processed['rating'].apply(clean_rating)
-    else:
-        st.warning("Colonne 'rating' introuvable. L'analyse basée sur les évaluations sera limitée.") # MODIFIED
-        df_processed['rating_numeric'] = np.nan
-
-    if 'sales_info' in df_processed.columns:
-        df_processed['sales_numeric'] = df_processed['sales_info'].apply(extract_sales)
-    else:
-        st.warning("Colonne 'sales_info' introuvable. L'analyse basée sur les ventes sera limitée.") # MODIFIED
-        df_processed['sales_numeric'] = 0
-        
-    if 'discount_percentage' in df_processed.columns:
-        df_processed['discount_percentage_numeric'] = df_processed['discount_percentage'].apply(clean_discount)
-    else:
-        if 'original_price' in df_processed.columns and 'price_numeric' in df_processed.columns:
-            df_processed['original_price_numeric'] = df_processed['original_price'].apply(clean_price)
-            df_processed['discount_percentage_numeric'] = np.where(
-                (df_processed['original_price_numeric'] > df_processed['price_numeric']) & (df_processed['original_price_numeric'] > 0),
-                ((df_processed['original_price_numeric'] - df_processed['price_numeric']) / df_processed['original_price_numeric']) * 100,
-                0
-            )
-            df_processed['discount_percentage_numeric'] = df_processed['discount_percentage_numeric'].fillna(0)
-        else:
-            st.warning("Colonne 'discount_percentage' introuvable, et original_price/price non disponibles pour le calcul.") # MODIFIED
-            df_processed['discount_percentage_numeric'] = 0.0
+    # Features with trend columns from the snapshot history, keyed on every input version
+    # The current registry model and its stored batch scores are part of the key (joined as attractiveness_proba),
+    # and so is the current learning-to-rank model (joined as rank_score)
+    current_model = model_registry.current()
+    model_key = current_model['key'] if current_model else None
+    processed_key = (data_version, fx_table_version(), data_csv_path, snapshots.state_version(),
+                     model_key, feature_store.scores_version(data_version, model_key), ranking.current_key())
+    df_processed, score_terms = load_processed(df, *processed_key)
+    trend_columns = snapshots.DELTA_COLUMNS
 
     with st.expander("Afficher un Échantillon des Données Traitées & Infos", expanded=False): # MODIFIED
-        st.write(df_processed[['name', 'price_numeric', 'rating_numeric', 'sales_numeric', 'discount_percentage_numeric']].head())
+        st.write(df_processed[['name', 'price_numeric', 'rating_numeric', 'sales_numeric', 'discount_percentage_numeric'] + trend_columns].head())
         st.write(df_processed[['price_numeric', 'rating_numeric', 'sales_numeric', 'discount_percentage_numeric']].describe())
 
     # --- Étape 2: Analyse et sélection des Top-K produits ---
@@ -170,11 +212,11 @@ if df is not None:
     st.sidebar.subheader("Pondérations du Score") # MODIFIED
     w_rating = st.sidebar.slider("Poids de l'Évaluation", 0.0, 5.0, 2.0, 0.1) # MODIFIED
     w_sales = st.sidebar.slider("Poids des Ventes (échelle log)", 0.0, 5.0, 1.5, 0.1) # MODIFIED
-    w_price = st.sidebar.slider("Poids de Pénalité du Prix (par 100 MAD)", 0.0, 2.0, 0.5, 0.1) # MODIFIED
+    w_price = st.sidebar.slider(f"Poids de Pénalité du Prix (par 100 {CURRENCY})", 0.0, 2.0, 0.5, 0.1) # MODIFIED
     w_discount = st.sidebar.slider("Poids de la Réduction", 0.0, 2.0, 1.0, 0.1) # MODIFIED
 
     score_weights = {'rating': w_rating, 'sales': w_sales, 'price': w_price, 'discount': w_discount}
-    df_processed['score'] = df_processed.apply(lambda row: calculate_score(row, score_weights), axis=1)
+    scores = compute_scores(score_terms, processed_key, tuple(score_weights.items()))
 
     num_top_k = st.sidebar.slider("Nombre de Top-K produits à afficher", 1, 100, 10) # MODIFIED
 
@@ -183,7 +225,7 @@ if df is not None:
     max_price_val = float(df_processed['price_numeric'].max()) if df_processed['price_numeric'].notna().any() else 1000.0
     if min_price_val > max_price_val: max_price_val = min_price_val # handle single value case
     price_range = st.sidebar.slider(
-        "Fourchette de Prix (MAD)", # MODIFIED
+        f"Fourchette de Prix ({CURRENCY})", # MODIFIED
         min_value=min_price_val,
         max_value=max_price_val,
         value=(min_price_val, max_price_val)
@@ -205,11 +247,26 @@ if df is not None:
         st.sidebar.text(f"Plage de données d'évaluation limitée. Éval. Min : {min_rating_val:.1f}") # MODIFIED
         rating_threshold = min_rating_val
 
-    filtered_df = df_processed[
-        (df_processed['price_numeric'].fillna(price_range[0]) >= price_range[0]) &
-        (df_processed['price_numeric'].fillna(price_range[1]) <= price_range[1]) &
-        (df_processed['rating_numeric'].fillna(0) >= rating_threshold)
-    ]
+    # Classifier probability, once the catalog has been batch-scored by the current model (page du classificateur)
+    has_model_scores = bool(df_processed[feature_store.SCORE_COLUMN].notna().any())
+    has_rank_scores = bool(df_processed[feature_store.RANK_COLUMN].notna().any())
+    rank_options = ["Score Calculé"] # MODIFIED
+    if has_model_scores:
+        min_proba = st.sidebar.slider("Probabilité d'Attractivité Minimale (modèle)", 0.0, 1.0, 0.0, 0.05) # MODIFIED
+        rank_options.append("Probabilité d'Attractivité") # MODIFIED
+    else:
+        min_proba = 0.0
+        st.sidebar.caption("Probabilité d'attractivité indisponible : lancez le scoring du catalogue depuis la page du classificateur.") # MODIFIED
+    if has_rank_scores:
+        rank_options.append("Modèle de Classement (croissance des ventes)") # MODIFIED
+    rank_by = st.sidebar.radio("Classer le Top-K par", rank_options) if len(rank_options) > 1 else rank_options[0] # MODIFIED
+
+    positions = filter_positions(load_range_index(df_processed, processed_key), processed_key, tuple(price_range), rating_threshold, min_proba)
+    filtered_df = df_processed.iloc[positions].assign(score=scores[positions])
+    large_summary = None
+    if data_csv_path is not None and is_large_file(data_csv_path):
+        large_summary = summarize_large_csv(data_csv_path, data_version, fx_table_version(), processed_key[5], tuple(price_range),
+                                            rating_threshold, min_proba, feature_store.load_scores(data_version, model_key))
 
     # --- Étape 4: Dashboard de Business Intelligence ---
     st.header("📊 Tableau de Bord Business Intelligence (Étape 4)") # MODIFIED
@@ -217,11 +274,15 @@ if df is not None:
     st.subheader("Indicateurs Clés de Performance (KPIs)") # MODIFIED
     col1, col2, col3, col4 = st.columns(4)
     col1.metric("Total Produits (après filtre)", f"{filtered_df.shape[0]}") # MODIFIED
-    if not filtered_df.empty:
+    if large_summary is not None and large_summary['products'] > 0:
+        col2.metric("Prix Moyen (filtré)", f"{CURRENCY} {large_summary['average_price']:.2f}" if pd.notna(large_summary['average_price']) else "N/D") # MODIFIED
+        col3.metric("Éval. Moyenne (filtrée)", f"{large_summary['average_rating']:.2f} ⭐" if pd.notna(large_summary['average_rating']) else "N/D") # MODIFIED
+        col4.metric("Ventes Estimées Totales (filtrées)", f"{large_summary['total_sales']:,.0f}") # MODIFIED
+    elif not filtered_df.empty:
         avg_price_filtered = filtered_df['price_numeric'].mean()
         avg_rating_filtered = filtered_df['rating_numeric'].mean()
         total_sales_filtered = filtered_df['sales_numeric'].sum()
-        col2.metric("Prix Moyen (filtré)", f"MAD {avg_price_filtered:.2f}" if pd.notna(avg_price_filtered) else "N/D") # MODIFIED ("N/D")
+        col2.metric("Prix Moyen (filtré)", f"{CURRENCY} {avg_price_filtered:.2f}" if pd.notna(avg_price_filtered) else "N/D") # MODIFIED ("N/D")
         col3.metric("Éval. Moyenne (filtrée)", f"{avg_rating_filtered:.2f} ⭐" if pd.notna(avg_rating_filtered) else "N/D") # MODIFIED ("N/D")
         col4.metric("Ventes Estimées Totales (filtrées)", f"{total_sales_filtered:,.0f}") # MODIFIED
     else:
@@ -232,10 +293,30 @@ if df is not None:
 
     st.subheader("Visualisations des Données (sur Données Filtrées)") # MODIFIED
     if not filtered_df.empty:
+        if large_summary is None:
+            price_bin_method = 'quantile' if st.radio("Classes de prix", ["Largeur fixe", "Quantiles"], horizontal=True) == "Quantiles" else 'fixed' # MODIFIED
+        else:
+            price_bin_method = 'fixed' # Streaming histograms need their edges up front
+            st.caption("Fichier volumineux : indicateurs et histogrammes calculés par lots (classes de largeur fixe sur la fourchette de prix).") # MODIFIED
+        scatter_mode = 'hexbin'
+        if len(filtered_df) > binning.MAX_PLOT_POINTS:
+            scatter_mode = 'sample' if st.radio(f"Nuage de points (plus de {binning.MAX_PLOT_POINTS:,} produits)", ["Hexbin", "Échantillon"], horizontal=True) == "Échantillon" else 'hexbin' # MODIFIED
+        price_bins, rating_bins, scatter_points, scatter_hexbins = chart_data(
+            filtered_df, (processed_key, tuple(price_range), rating_threshold, min_proba), price_bin_method, scatter_mode
+        )
+        if large_summary is not None:
+            price_bins, rating_bins = large_summary['price_histogram'], large_summary['rating_histogram']
+
         viz_cols = st.columns(2)
         with viz_cols[0]:
             if 'price_numeric' in filtered_df.columns and filtered_df['price_numeric'].notna().any():
-                fig_price = px.histogram(filtered_df.dropna(subset=['price_numeric']), x="price_numeric", nbins=30, title="Distribution des Prix") # MODIFIED
+                # Quantile bins have unequal widths, so their bar height is a density rather than a count
+                price_y = 'density' if price_bin_method == 'quantile' else 'count'
+                fig_price = px.bar(price_bins, x="center", y=price_y, title="Distribution des Prix", # MODIFIED
+                                   hover_data=['left', 'right', 'count'],
+                                   labels={'center': f'Prix ({CURRENCY})', 'count': 'Nombre', 'density': f'Produits par {CURRENCY}'}) # MODIFIED
+                fig_price.update_traces(width=price_bins['width'])
+                fig_price.update_layout(bargap=0)
                 st.plotly_chart(fig_price, use_container_width=True)
             else:
                 st.caption("Pas assez de données de prix pour tracer la distribution.") # MODIFIED
@@ -255,21 +336,30 @@ if df is not None:
 
         with viz_cols[1]:
             if 'rating_numeric' in filtered_df.columns and filtered_df['rating_numeric'].notna().any():
-                fig_rating = px.histogram(filtered_df.dropna(subset=['rating_numeric']), x="rating_numeric", nbins=10, title="Distribution des Évaluations (0-5 étoiles)") # MODIFIED
+                fig_rating = px.bar(rating_bins, x="center", y="count", title="Distribution des Évaluations (0-5 étoiles)", # MODIFIED
+                                    labels={'center': 'Évaluation', 'count': 'Nombre'}) # MODIFIED
+                fig_rating.update_traces(width=rating_bins['width'])
+                fig_rating.update_layout(bargap=0.05)
                 fig_rating.update_xaxes(range=[0,5])
                 st.plotly_chart(fig_rating, use_container_width=True)
             else:
                 st.caption("Pas assez de données d'évaluation pour tracer la distribution.") # MODIFIED
 
-            if ('price_numeric' in filtered_df.columns and 'rating_numeric' in filtered_df.columns and
-               filtered_df['price_numeric'].notna().any() and filtered_df['rating_numeric'].notna().any()):
-                fig_scatter = px.scatter(filtered_df.dropna(subset=['price_numeric', 'rating_numeric']),
+            if scatter_hexbins is not None:
+                # One hexagon per cell: size is the number of products, color their mean sales
+                fig_scatter = px.scatter(scatter_hexbins, x="x", y="y", size="count", color="c_mean",
+                                         title="Prix vs. Évaluation (hexbin)", # MODIFIED
+                                         labels={'x':f'Prix ({CURRENCY})', 'y':'Évaluation', 'count':'Produits', 'c_mean':'Ventes Moyennes'}) # MODIFIED
+                fig_scatter.update_traces(marker_symbol='hexagon')
+                st.plotly_chart(fig_scatter, use_container_width=True)
+            elif scatter_points is not None and not scatter_points.empty:
+                fig_scatter = px.scatter(scatter_points,
                                          x="price_numeric", y="rating_numeric",
-                                         title="Prix vs. Évaluation", # MODIFIED
+                                         title="Prix vs. Évaluation" + (f" (échantillon de {len(scatter_points):,})" if scatter_mode == 'sample' else ""), # MODIFIED
                                          hover_data=['name', 'sales_numeric'],
                                          color="sales_numeric",
                                          size="sales_numeric",
-                                         labels={'price_numeric':'Prix (MAD)', 'rating_numeric':'Évaluation', 'sales_numeric':'Volume des Ventes'}) # MODIFIED
+                                         labels={'price_numeric':f'Prix ({CURRENCY})', 'rating_numeric':'Évaluation', 'sales_numeric':'Volume des Ventes'}) # MODIFIED
                 st.plotly_chart(fig_scatter, use_container_width=True)
             else:
                 st.caption("Pas assez de données de prix/évaluation pour le nuage de points.") # MODIFIED
@@ -280,26 +370,52 @@ if df is not None:
     st.sidebar.info("Cette section pourrait intégrer des LLMs pour générer des résumés de produits ou des recommandations.") # MODIFIED
 
     
-    st.subheader(f"🏆 Top {num_top_k} Produits (Basé sur le Score Calculé & Filtres)") # MODIFIED
+    rank_label = {"Score Calculé": "le Score Calculé", "Probabilité d'Attractivité": "la Probabilité d'Attractivité"}.get(rank_by, "le Modèle de Classement") # MODIFIED
+    st.subheader(f"🏆 Top {num_top_k} Produits (Basé sur {rank_label} & Filtres)") # MODIFIED
     if not filtered_df.empty:
-        top_k_products = filtered_df.sort_values(by='score', ascending=False).head(num_top_k)
+        if rank_by == "Modèle de Classement (croissance des ventes)":
+            # Precomputed per-version order: the filtered Top-K is a lookup, nothing is scored or sorted here
+            top_positions = scoring.top_k_in_order(load_rank_order(df_processed, processed_key), positions, num_top_k)
+            top_k_products = df_processed.iloc[top_positions].assign(score=scores[top_positions])
+        else:
+            rank_column = feature_store.SCORE_COLUMN if rank_by == "Probabilité d'Attractivité" else 'score'
+            top_k_products = filtered_df.iloc[scoring.top_k_indices(filtered_df[rank_column].to_numpy(dtype=float), num_top_k)]
         
         if not top_k_products.empty:
-            for index, row in top_k_products.iterrows():
+            # Only the current page of cards is built; the cursor resets when the ranking inputs change
+            top_k_query = (processed_key, tuple(score_weights.items()), tuple(price_range), rating_threshold, min_proba, rank_by, num_top_k)
+            if st.session_state.get("top_k_query") != top_k_query:
+                st.session_state.top_k_query = top_k_query
+                st.session_state.top_k_page = 0
+            num_pages = pagination.page_count(len(top_k_products), TOP_K_PAGE_SIZE)
+            st.session_state.top_k_page = pagination.clamp_page(st.session_state.top_k_page, len(top_k_products), TOP_K_PAGE_SIZE)
+            current_page = st.session_state.top_k_page
+            if num_pages > 1:
+                nav_prev, nav_info, nav_next = st.columns([1, 2, 1])
+                nav_prev.button("◀ Précédent", on_click=pagination.shift_page, args=(st.session_state, "top_k_page", -1), disabled=current_page == 0, use_container_width=True) # MODIFIED
+                nav_info.markdown(f"<div style='text-align: center;'>Page {current_page + 1} / {num_pages}</div>", unsafe_allow_html=True)
+                nav_next.button("Suivant ▶", on_click=pagination.shift_page, args=(st.session_state, "top_k_page", 1), disabled=current_page >= num_pages - 1, use_container_width=True) # MODIFIED
+            page_start, page_stop = pagination.page_bounds(current_page, len(top_k_products), TOP_K_PAGE_SIZE)
+
+            page_products = top_k_products.iloc[page_start:page_stop]
+            # Downscaled thumbnails for this page, fetched concurrently and served from the local disk cache
+            thumbnails = images.prefetch(page_products['image_url'])
+
+            for index, row in page_products.iterrows():
                 st.markdown("---")
                 cols_display = st.columns([1, 3])
                 with cols_display[0]:
                     if 'image_url' in row and pd.notna(row['image_url']):
-                        st.image(row['image_url'], width=150, caption=f"Image pour {row.get('name', 'N/D')[:30]}...") # MODIFIED ("Image pour", "N/D")
+                        st.image(thumbnails.get(row['image_url']) or row['image_url'], width=150, caption=f"Image pour {row.get('name', 'N/D')[:30]}...") # MODIFIED ("Image pour", "N/D")
                     else:
                         st.caption("Pas d'image") # MODIFIED
                 
                 with cols_display[1]:
                     st.markdown(f"**{row.get('name', 'N/D')}**") # MODIFIED ("N/D")
-                    price_display = f"MAD {row['price_numeric']:.2f}" if pd.notna(row['price_numeric']) else "N/D" # MODIFIED ("N/D")
+                    price_display = f"{CURRENCY} {row['price_numeric']:.2f}" if pd.notna(row['price_numeric']) else "N/D" # MODIFIED ("N/D")
                     original_price_display = ""
                     if 'original_price_numeric' in row and pd.notna(row['original_price_numeric']) and row['original_price_numeric'] > row.get('price_numeric',0) :
-                        original_price_display = f"~~MAD {row['original_price_numeric']:.2f}~~"
+                        original_price_display = f"~~{CURRENCY} {row['original_price_numeric']:.2f}~~"
                     discount_display = ""
                     if 'discount_percentage_numeric' in row and pd.notna(row['discount_percentage_numeric']) and row['discount_percentage_numeric'] > 0:
                         discount_display = f" ({row['discount_percentage_numeric']:.0f}% de réduction)" # MODIFIED
@@ -309,6 +425,19 @@ if df is not None:
                     sales_display = f"{row['sales_numeric']:,}" if pd.notna(row['sales_numeric']) else "N/D" # MODIFIED ("N/D")
                     st.markdown(f"**Ventes :** ~{sales_display} unités") # MODIFIED
                     st.markdown(f"**Score Calculé :** {row['score']:.2f}") # MODIFIED
+                    if pd.notna(row[feature_store.SCORE_COLUMN]):
+                        st.markdown(f"**Probabilité d'Attractivité (modèle) :** {row[feature_store.SCORE_COLUMN]:.0%}") # MODIFIED
+                    if pd.notna(row[feature_store.RANK_COLUMN]):
+                        st.markdown(f"**Score de Classement (modèle) :** {row[feature_store.RANK_COLUMN]:.2f}") # MODIFIED
+                    if pd.notna(row.get('price_change')):
+                        trend_parts = [f"prix {row['price_change']:+.2f} {CURRENCY}"]
+                        if pd.notna(row.get('price_change_pct')):
+                            trend_parts[0] += f" ({row['price_change_pct']:+.1f}%)"
+                        if pd.notna(row.get('sales_growth_per_day')):
+                            trend_parts.append(f"{row['sales_growth_per_day']:+,.0f} ventes/jour")
+                        if pd.notna(row.get('rank_change')):
+                            trend_parts.append(f"rang {row['rank_change']:+.0f}")
+                        st.markdown(f"**Tendance (depuis le dernier scraping) :** {' · '.join(trend_parts)}")
                     if 'url' in row and pd.notna(row['url']):
                         st.markdown(f"[Voir le Produit sur AliExpress]({row['url']})") # MODIFIED
                     if 'additional_badges' in row and pd.notna(row['additional_badges']):
@@ -1,132 +1,66 @@
 import streamlit as st
 import pandas as pd
-import numpy as np
-import re
-from sklearn.model_selection import train_test_split
-from sklearn.ensemble import RandomForestClassifier
-from sklearn.metrics import accuracy_score, classification_report
-# from sklearn.preprocessing import LabelEncoder # Not currently used, can be removed if not planned
+# sklearn is imported inside train_classifier: it's the slowest import of the app and is only needed to train
 import os
+import io
+import time
+import utils.feature_store as feature_store
+import utils.model_registry as model_registry
+import utils.batch_scoring as batch_scoring
+import utils.model_search as model_search
+import utils.incremental_training as incremental_training
+import utils.model_diagnostics as model_diagnostics
+from utils.cleaning import has_bestseller_badge
+from utils.currency import fx_table_version
+from utils.dataset_version import file_version, bytes_version
 
 # --- Configuration ---
 DATA_FILE_PATH = os.path.join(os.path.dirname(__file__), '..', 'aliexpress_multi_page_firefox.csv')
-# Heuristic scoring parameters (can be adjusted)
-SALES_THRESHOLD_LOW = 500
-SALES_THRESHOLD_HIGH = 2000
-RATING_THRESHOLD_GOOD = 4.0
-RATING_THRESHOLD_EXCELLENT = 4.5
-ATTRACTIVENESS_SCORE_THRESHOLD = 3 # Product needs at least this score to be "attractive"
-
-# --- Helper Functions (Updated) ---
-def clean_price(price_str):
-    # 1. Handle explicit NaNs or "N/A" strings first
-    if pd.isna(price_str) or str(price_str).lower() == "n/a":
-        return np.nan
-
-    # 2. If it's already a number (int or float that is not NaN)
-    if isinstance(price_str, (int, float)):
-        return float(price_str)
-
-    # 3. If it's a string, try to parse it
-    cleaned_price = re.sub(r'[^\d\.]', '', str(price_str))
-    try:
-        if cleaned_price: # Ensure there's something to convert
-            return float(cleaned_price)
-        else:
-            return np.nan
-    except ValueError:
-        return np.nan
-
-def clean_sales_info(sales_str):
-    # 1. Handle explicit NaNs or "N/A" strings first
-    if pd.isna(sales_str) or str(sales_str).lower() == "n/a":
-        return 0  # Default to 0 sales if not specified
-
-    # 2. If it's already an int
-    if isinstance(sales_str, int):
-        return sales_str
-    
-    # 3. If it's a float (and not NaN, due to the first check)
-    if isinstance(sales_str, float):
-        return int(sales_str) # Safe to convert to int
-
-    # 4. If it's a string, try to parse it
-    sales_str_cleaned = str(sales_str).lower().replace(' ', '').replace(',', '')
-    numbers = re.findall(r'\d+', sales_str_cleaned)
-    if numbers:
-        num_part = int("".join(numbers))
-        if 'k' in sales_str_cleaned: # k is usually for "kilo" / 1000, universal
-            num_part *= 1000
-        return num_part
-    
-    # 5. If all else fails (e.g., unparseable string), return 0
-    return 0
-
-def clean_rating(rating_val):
-    if pd.isna(rating_val) or str(rating_val).lower() == "n/a":
-        return np.nan 
-    try:
-        return float(rating_val) 
-    except ValueError:
-        return np.nan
+# Heuristic scoring parameters live with the feature store, which materializes `attractiveness_score`
+ATTRACTIVENESS_SCORE_THRESHOLD = feature_store.ATTRACTIVENESS_SCORE_THRESHOLD # Product needs at least this score to be "attractive"
+# Hyperparameters are part of the model registry key: changing them trains and publishes a new model
+MODEL_PARAMS = {'n_estimators': 100, 'random_state': 42, 'class_weight': 'balanced'}
 
+# --- Helper Functions ---
 def extract_bestseller_badge(badges_str):
-    if pd.isna(badges_str):
-        return 0
-    badges_str_lower = str(badges_str).lower()
-    # "Le plus vendu" and "choix d'aliexpress" are already French
-    if "le plus vendu" in badges_str_lower or \
-       "best seller" in badges_str_lower or \
-       "top selling" in badges_str_lower or \
-       "choix d'aliexpress" in badges_str_lower or \
-       "choice" in badges_str_lower: # "choice" is general, could be part of "AliExpress Choice"
-        return 1
-    return 0
+    # Same keyword rules as the feature store ("Le plus vendu", "Choix d'AliExpress", ...)
+    return int(has_bestseller_badge(pd.Series([badges_str])).iloc[0])
 
 # --- Data Loading and Caching ---
-@st.cache_data
-def load_data(file_path):
-    try:
-        df = pd.read_csv(file_path)
-        return df
-    except FileNotFoundError:
+@st.cache_data(max_entries=4)
+def load_data(file_path, version, fx_version):
+    # Cleaned features come from the feature store; the raw CSV is only parsed once per dataset version
+    # (converted prices also depend on the FX table, hence `fx_version` in the cache key)
+    if version is None:
         st.error(f"Erreur : Fichier de données non trouvé à {file_path}. Assurez-vous que 'aliexpress_multi_page_firefox.csv' est dans le répertoire parent.") # MODIFIED
         return None
+    try:
+        return feature_store.load_features(version, lambda: pd.read_csv(file_path))
     except Exception as e:
         st.error(f"Erreur lors du chargement du CSV : {e}") # MODIFIED
         return None
 
-@st.cache_data
-def preprocess_data_and_create_target(df_raw):
-    if df_raw is None:
+@st.cache_data(max_entries=4)
+def load_data_from_bytes(_data, version, fx_version):
+    # Uploaded CSV to batch-score; `_data` is not hashed, `version` is its digest
+    try:
+        return feature_store.load_features(version, lambda: pd.read_csv(io.BytesIO(_data)))
+    except Exception as e:
+        st.error(f"Erreur lors du chargement du CSV : {e}") # MODIFIED
+        return None
+
+@st.cache_data(max_entries=4)
+def preprocess_data_and_create_target(_df_features, version, fx_version):
+    # `_df_features` is not hashed by Streamlit; the cache is keyed on the dataset and FX table versions instead
+    if _df_features is None:
         return None, None
 
-    df = df_raw.copy()
-    
-    expected_cols = ['price', 'sales_info', 'rating', 'additional_badges', 'name'] 
-    for col in expected_cols:
-        if col not in df.columns:
-            st.warning(f"Colonne '{col}' non trouvée dans le CSV. Elle sera traitée comme manquante.") # MODIFIED
-            df[col] = np.nan 
-
-    df['price_numeric'] = df['price'].apply(clean_price)
-    df['sales_numeric'] = df['sales_info'].apply(clean_sales_info)
-    df['rating_numeric'] = df['rating'].apply(clean_rating)
-    df['has_bestseller_badge'] = df['additional_badges'].apply(extract_bestseller_badge)
-    
-    df['price_numeric'].fillna(df['price_numeric'].median(), inplace=True)
-    df['sales_numeric'].fillna(0, inplace=True) 
-    df['rating_numeric'].fillna(df['rating_numeric'].median(), inplace=True) 
-
-    scores = pd.Series(0, index=df.index)
-    scores += (df['sales_numeric'] > SALES_THRESHOLD_LOW) * 1
-    scores += (df['sales_numeric'] > SALES_THRESHOLD_HIGH) * 1
-    scores += (df['rating_numeric'] > RATING_THRESHOLD_GOOD) * 1
-    scores += (df['rating_numeric'] > RATING_THRESHOLD_EXCELLENT) * 1
-    scores += (df['has_bestseller_badge'] == 1) * 2
-
-    df['attractiveness_score'] = scores
-    df['is_attractive'] = (scores >= ATTRACTIVENESS_SCORE_THRESHOLD).astype(int)
+    df = _df_features.copy()
+
+    # Median price/rating, 0 sales: the same imputation batch scoring applies (recorded with the model)
+    df = df.fillna(batch_scoring.fill_values(df))
+
+    df['is_attractive'] = (df['attractiveness_score'] >= ATTRACTIVENESS_SCORE_THRESHOLD).astype(int)
     
     features = ['price_numeric', 'sales_numeric', 'rating_numeric', 'has_bestseller_badge']
     
@@ -154,8 +88,11 @@ def preprocess_data_and_create_target(df_raw):
     return df_processed, features
 
 # --- Model Training ---
-@st.cache_resource 
 def train_classifier(df_processed, features_list):
+    from sklearn.model_selection import train_test_split
+    from sklearn.ensemble import RandomForestClassifier
+    from sklearn.metrics import accuracy_score, classification_report
+
     if df_processed is None or df_processed.empty:
         st.error("Impossible d'entraîner le modèle : Les données traitées sont vides.") # MODIFIED
         return None, None, None
@@ -177,7 +114,7 @@ def train_classifier(df_processed, features_list):
         st.info(f"Distribution des classes dans y avant la division : {y.value_counts().to_dict()}") # MODIFIED
         return None, None, None
 
-    model = RandomForestClassifier(n_estimators=100, random_state=42, class_weight='balanced')
+    model = RandomForestClassifier(**MODEL_PARAMS, n_jobs=-1) # All cores; n_jobs doesn't change the model, so it isn't in the key
     
     try:
         model.fit(X_train, y_train)
@@ -196,6 +133,49 @@ def train_classifier(df_processed, features_list):
     
     return model, accuracy, report
 
+@st.cache_resource(max_entries=4)
+def load_or_train_classifier(_df_processed, features_list, version, _fill_values, current_key=None, incremental=False):
+    # The registry is shared by every process and replica: a model trained once for this dataset
+    # version, feature list and MODEL_PARAMS is loaded from disk instead of being retrained.
+    # A tuned model (model_search) published as current for this dataset version takes precedence;
+    # `current_key` is in the cache key so a new publication is picked up.
+    # With `incremental`, a new dataset version only adds trees for the rows the last forest hasn't seen.
+    meta = model_registry.current()
+    if meta is None or meta['dataset_version'] != version or meta['features'] != list(features_list):
+        meta = model_registry.find(version, features_list, MODEL_PARAMS)
+    if meta is not None:
+        model, meta = model_registry.load(meta['key'])
+        return model, meta['metrics'].get('accuracy'), meta['metrics'].get('report'), meta
+
+    if incremental:
+        model, meta = incremental_training.refresh(
+            _df_processed[features_list], _df_processed['is_attractive'], version, features_list, MODEL_PARAMS,
+            _fill_values, log=lambda message: None,
+        )
+        return model, meta['metrics'].get('accuracy'), meta['metrics'].get('report'), meta
+
+    model, accuracy, report = train_classifier(_df_processed, features_list)
+    if model is None:
+        return None, None, None, None
+    meta = model_registry.publish(
+        model, version, features_list, MODEL_PARAMS,
+        metrics={'accuracy': accuracy, 'report': report, 'n_samples': len(_df_processed)},
+        extra={'fill_values': _fill_values},
+    )
+    return model, accuracy, report, meta
+
+@st.cache_data(max_entries=8)
+def load_diagnostics(_model, _model_meta, _df_processed, model_key):
+    # Permutation importance and threshold/calibration sweeps are computed once per model (right after it is
+    # trained or first loaded) and stored beside it in the registry; afterwards this only reads the JSON.
+    # A ValueError (evaluation split with a single class) propagates, so the failure isn't cached.
+    return model_diagnostics.diagnostics_for(_model, _model_meta, _df_processed, _df_processed['is_attractive'])
+
+@st.cache_resource(max_entries=4)
+def load_engine(_model, model_key):
+    # Forest flattened into NumPy arrays: no sklearn dispatch overhead for one-product predictions
+    return model_registry.load_engine(model_key, _model)
+
 # --- Streamlit App ---
 st.set_page_config(page_title="Classificateur d'Attractivité de Produit", layout="wide") # MODIFIED
 
@@ -206,13 +186,17 @@ L'objectif est de prédire si un produit est "attractif" en fonction de caracté
 Cela correspond à **Étape 2 : Analyse et sélection des Top-K produits** de votre dossier.
 """) # MODIFIED
 
-raw_df = load_data(DATA_FILE_PATH)
+data_version = file_version(DATA_FILE_PATH)
+fx_version = fx_table_version()
+# Models are registered under the version of the features they were trained on, FX table included
+model_data_version = feature_store.features_version(data_version)
+raw_df = load_data(DATA_FILE_PATH, data_version, fx_version)
 
 if raw_df is not None:
     st.sidebar.success("Données chargées avec succès !") # MODIFIED
     st.sidebar.metric("Nombre total de produits dans le CSV", len(raw_df)) # MODIFIED
 
-    processed_df, model_features = preprocess_data_and_create_target(raw_df)
+    processed_df, model_features = preprocess_data_and_create_target(raw_df, data_version, fx_version)
 
     if processed_df is not None and not processed_df.empty:
         st.sidebar.metric("Produits après Prétraitement", len(processed_df)) # MODIFIED
@@ -227,10 +211,19 @@ if raw_df is not None:
             st.dataframe(processed_df[display_cols].head())
             st.caption(f"Le seuil du score d'attractivité pour 'is_attractive'=1 est : {ATTRACTIVENESS_SCORE_THRESHOLD}") # MODIFIED
 
-        model, accuracy, report = train_classifier(processed_df.copy(), model_features) 
+        incremental_mode = st.sidebar.checkbox("Entraînement incrémental (nouvelles lignes seulement)", False, help="Ajoute des arbres entraînés sur les produits que le dernier modèle n'a pas encore vus, au lieu de tout réentraîner.") # MODIFIED
+        model, accuracy, report, model_meta = load_or_train_classifier(processed_df, model_features, model_data_version, batch_scoring.fill_values(raw_df), (model_registry.current() or {}).get('key'), incremental_mode)
 
         if model:
+            try:
+                diagnostics = load_diagnostics(model, model_meta, processed_df, model_meta['key'])
+            except ValueError:
+                diagnostics = None  # Evaluation split with a single class: nothing meaningful to report
             st.sidebar.subheader("📊 Performance du Modèle") # MODIFIED
+            st.sidebar.caption(f"Modèle `{model_meta['key']}` ({model_meta['estimator']}) du registre, entraîné le {model_meta['created_at'][:16].replace('T', ' ')} UTC") # MODIFIED
+            if model_meta.get('incremental', {}).get('mode') == 'incremental':
+                update_info = model_meta['incremental']
+                st.sidebar.caption(f"Mise à jour incrémentale n°{update_info['updates']} : {update_info['delta_rows']} nouvelles lignes, {update_info['trees_added']} arbres ajoutés ({update_info['n_trees']} au total) en {update_info['fit_seconds']:.2f} s") # MODIFIED
             if accuracy is not None:
                 st.sidebar.metric("Précision sur l'Ensemble de Test", f"{accuracy:.2%}") # MODIFIED
             if report:
@@ -271,10 +264,20 @@ if raw_df is not None:
                 
                 input_df = input_df[model_features] 
 
-                prediction_proba = model.predict_proba(input_df)[0]
-                prediction = model.predict(input_df)[0]
+                # One predict_proba call; the label is the class it gives the highest probability (what predict returns).
+                # Forests go through the array engine (same probabilities as sklearn, a fraction of the latency).
+                engine = load_engine(model, model_meta['key'])
+                prediction_start = time.perf_counter()
+                if engine is not None:
+                    prediction_proba = engine.predict_proba(input_df.to_numpy(dtype=float))[0]
+                else:
+                    prediction_proba = model.predict_proba(input_df)[0]
+                prediction_ms = (time.perf_counter() - prediction_start) * 1000
+                prediction = model.classes_[prediction_proba.argmax()]
 
                 st.subheader("📈 Résultat de la Prédiction :") # MODIFIED
+                prediction_backend = "moteur d'arbres compact" if engine is not None else "scikit-learn" # MODIFIED
+                st.caption(f"Prédiction en {prediction_ms:.2f} ms ({prediction_backend})") # MODIFIED
                 if prediction == 1:
                     st.success(f"Ce produit est PROBABLEMENT ATTRACTIF (Confiance : {prediction_proba[1]:.2%})") # MODIFIED
                     st.balloons()
@@ -283,14 +286,76 @@ if raw_df is not None:
                 
                 st.markdown("---")
                 st.write("Importances des Caractéristiques du modèle entraîné :") # MODIFIED
-                try:
-                    feature_importances = pd.Series(model.feature_importances_, index=model_features).sort_values(ascending=False)
-                    st.bar_chart(feature_importances)
-                except Exception as e:
-                    st.error(f"Impossible d'afficher les importances des caractéristiques : {e}") # MODIFIED
+                # Precomputed with the model: permutation importance (F1 lost when a feature is shuffled),
+                # not biased toward many-valued features like the impurity importances shown next to it
+                if diagnostics is None:
+                    st.caption("Diagnostics indisponibles pour ce modèle (ensemble d'évaluation à une seule classe).") # MODIFIED
+                else:
+                    importances = model_diagnostics.importance_table(diagnostics)
+                    st.bar_chart(importances[['f1_mean'] + (['impurity'] if 'impurity' in importances.columns else [])].rename(columns={'f1_mean': 'Permutation (perte de F1)', 'impurity': 'Impureté'}), stack=False) # MODIFIED
 
                 st.write("Données d'entrée utilisées pour la prédiction :") # MODIFIED
                 st.dataframe(input_df)
+
+            st.markdown("---")
+            st.header("🧪 Diagnostics du Modèle") # MODIFIED
+            if diagnostics is None:
+                st.info("Diagnostics indisponibles : l'ensemble d'évaluation de ce modèle ne contient qu'une seule classe.") # MODIFIED
+            else:
+                st.markdown(f"Calculés une fois pour le modèle `{diagnostics['model_key']}` sur ses {diagnostics['evaluation_rows']} produits d'évaluation ({diagnostics['evaluation_positives']} attractifs), avec {diagnostics['n_repeats']} permutations par caractéristique, et enregistrés dans le registre à côté du modèle.") # MODIFIED
+                st.subheader("Importance par Permutation") # MODIFIED
+                st.dataframe(model_diagnostics.importance_table(diagnostics).rename(columns={'f1_mean': 'perte F1 (moy.)', 'f1_std': 'perte F1 (écart-type)', 'roc_auc_mean': 'perte ROC AUC (moy.)', 'roc_auc_std': 'perte ROC AUC (écart-type)', 'impurity': 'importance par impureté'})) # MODIFIED
+                diag_col1, diag_col2 = st.columns(2)
+                with diag_col1:
+                    st.subheader("Balayage du Seuil de Décision") # MODIFIED
+                    threshold_table = pd.DataFrame(diagnostics['thresholds']).set_index('threshold')
+                    st.line_chart(threshold_table[['precision', 'recall', 'f1']].rename(columns={'precision': 'précision', 'recall': 'rappel', 'f1': 'F1'})) # MODIFIED
+                    best = diagnostics['best_threshold']
+                    st.caption(f"Meilleur F1 : {best['f1']:.3f} au seuil {best['threshold']:.2f} (précision {best['precision']:.2f}, rappel {best['recall']:.2f}, {best['flagged_share']:.1%} des produits marqués attractifs). Le modèle décide au seuil 0,50.") # MODIFIED
+                with diag_col2:
+                    st.subheader("Calibration des Probabilités") # MODIFIED
+                    calibration_stats = diagnostics['calibration']
+                    reliability = pd.DataFrame(calibration_stats['bins']).set_index('mean_predicted')
+                    st.scatter_chart(reliability.assign(parfait=reliability.index)[['observed_rate', 'parfait']].rename(columns={'observed_rate': 'taux observé'})) # MODIFIED
+                    st.caption(f"Score de Brier {calibration_stats['brier']:.4f}, log loss {calibration_stats['log_loss']:.4f}, erreur de calibration attendue (ECE) {calibration_stats['ece']:.4f}") # MODIFIED
+
+            st.markdown("---")
+            st.header("📦 Scoring par Lot du Catalogue") # MODIFIED
+            st.markdown("Calcule `attractiveness_proba` pour tous les produits en une seule passe vectorisée. Les scores sont enregistrés dans le feature store : les tableaux de bord peuvent ensuite trier et filtrer par probabilité d'attractivité.") # MODIFIED
+            # Scores are stored per (dataset version, model): the dashboards read them for the current model
+            if st.button("⚡ Scorer tout le catalogue"): # MODIFIED
+                with st.spinner("Scoring du catalogue..."): # MODIFIED
+                    catalog_scores, scoring_stats = batch_scoring.score_version(raw_df, data_version, model, model_meta)
+                st.success(f"{scoring_stats['rows']:,} produits scorés en {scoring_stats['seconds']:.2f} s ({scoring_stats['rows_per_second']:,.0f} lignes/s)") # MODIFIED
+                if model_meta['key'] != (model_registry.current() or {}).get('key'):
+                    st.info("Ce modèle n'est pas le modèle courant du registre : les tableaux de bord afficheront les scores du modèle courant.") # MODIFIED
+                st.dataframe(raw_df[['name', 'price_numeric', 'rating_numeric', 'sales_numeric']].assign(attractiveness_proba=catalog_scores).nlargest(10, 'attractiveness_proba'))
+
+            scoring_upload = st.file_uploader("Ou scorer un autre CSV de produits (même format que le scraping)", type=["csv"]) # MODIFIED
+            if scoring_upload is not None:
+                upload_bytes = scoring_upload.getvalue()
+                upload_version = bytes_version(upload_bytes)
+                upload_features = load_data_from_bytes(upload_bytes, upload_version, fx_version)
+                if upload_features is not None:
+                    upload_scores, upload_stats = batch_scoring.score_version(upload_features, upload_version, model, model_meta)
+                    st.success(f"{upload_stats['rows']:,} produits scorés en {upload_stats['seconds']:.2f} s ({upload_stats['rows_per_second']:,.0f} lignes/s)") # MODIFIED
+                    scored_upload = upload_features.assign(attractiveness_proba=upload_scores).sort_values('attractiveness_proba', ascending=False)
+                    st.dataframe(scored_upload[['name', 'price_numeric', 'rating_numeric', 'sales_numeric', 'attractiveness_proba']].head(20))
+                    st.download_button("Télécharger les scores (CSV)", scored_upload.to_csv().encode("utf-8"), file_name=f"scores-{upload_version}.csv", mime="text/csv") # MODIFIED
+
+            st.markdown("---")
+            st.header("🔬 Recherche d'Hyperparamètres") # MODIFIED
+            st.markdown(f"Recherche par *successive halving* sur plusieurs familles de modèles (forêts aléatoires, extra-trees, gradient boosting, régression logistique), en validation croisée stratifiée à {model_search.CV_SPLITS} plis sur tous les cœurs. Les résultats par pli sont mis en cache pour cette version des données ; le meilleur modèle est publié dans le registre et utilisé par l'application.") # MODIFIED
+            search_budget = st.slider("Budget de temps (secondes)", 30, 600, int(model_search.TIME_BUDGET_SECONDS), 30) # MODIFIED
+            if st.button("Lancer la recherche"): # MODIFIED
+                search_log = st.empty()
+                with st.spinner("Recherche en cours..."): # MODIFIED
+                    tuned_meta, leaderboard = model_search.tune_and_publish(
+                        processed_df[model_features], processed_df['is_attractive'], model_data_version, model_features,
+                        batch_scoring.fill_values(raw_df), time_budget=search_budget, log=search_log.text,
+                    )
+                st.success(f"Meilleur modèle : {tuned_meta['estimator']} (F1 en validation croisée {tuned_meta['metrics'][f'cv_{model_search.SCORING}']:.3f}, précision sur l'ensemble de test {tuned_meta['metrics']['accuracy']:.2%}). Publié comme modèle courant `{tuned_meta['key']}`.") # MODIFIED
+                st.dataframe(leaderboard.assign(params=leaderboard['params'].map(str)).sort_values(['round', 'mean_score'], ascending=[False, False]), use_container_width=True)
         else:
             st.error("L'entraînement du modèle a échoué ou a été ignoré. Vérifiez les données et les étapes de prétraitement. Voir les avertissements/erreurs ci-dessus ou dans la console.") # MODIFIED
     else:
@@ -1,7 +1,17 @@
 import streamlit as st
 import pandas as pd
-import utils.ali_express as ali_express # Assuming this module exists and works
+import numpy as np
+from utils.dataset_version import file_version
+from utils.cleaning import item_ids
+import utils.feature_store as feature_store
+import utils.model_registry as model_registry
+import utils.binning as binning
+import utils.pagination as pagination
+import utils.images as images
+import utils.search as search
+from utils.range_index import RangeIndex
 from pathlib import Path
+from typing import Optional
 
 # --- Page Configuration ---
 st.set_page_config(
@@ -15,9 +25,9 @@ st.set_page_config(
 CSV_FILE_PATH = Path("./aliexpress_multi_page_firefox.csv")
 
 # --- Data Loading and Caching ---
-@st.cache_data # Cache the data loading and processing
-def load_and_clean_data(file_path: Path) -> pd.DataFrame:
-    """Loads, cleans, and prepares the AliExpress data."""
+@st.cache_data(max_entries=4) # Keyed on the dataset version, so a new scrape only misses this entry
+def load_and_clean_data(file_path: Path, version: str) -> pd.DataFrame:
+    """Loads, cleans, and prepares the AliExpress data for a given dataset version."""
     if not file_path.exists():
         st.error(f"Le fichier de données '{file_path}' n'a pas été trouvé. Veuillez d'abord lancer un scraping.")
         return pd.DataFrame() # Return empty DataFrame
@@ -47,6 +57,31 @@ def load_and_clean_data(file_path: Path) -> pd.DataFrame:
         st.error(f"Erreur lors du chargement ou du traitement des données : {e}")
         return pd.DataFrame()
 
+@st.cache_resource(max_entries=4) # Shared, read-only: built once per dataset version, never copied per rerun
+def load_title_index(_titles: pd.Series, version: str) -> search.TitleIndex:
+    """Inverted index over the product titles (accent-folded tokens)."""
+    return search.TitleIndex.build(_titles)
+
+@st.cache_data(max_entries=4)
+def load_model_scores(_df: pd.DataFrame, version: str, model_key: Optional[str], scores_version: Optional[str]) -> np.ndarray:
+    """Classifier probability per row, from the feature store (NaN until the current model has batch-scored this version)."""
+    scores = feature_store.load_scores(version, model_key)
+    if scores is None:
+        return np.full(len(_df), np.nan)
+    return item_ids(_df["URL"], _df["Title"]).map(scores).to_numpy(dtype=float)
+
+@st.cache_resource(max_entries=4)
+def load_range_index(_df: pd.DataFrame, version: str, scores_version: Optional[str]) -> RangeIndex:
+    """Sorted price, rating and attractiveness-probability columns for the range filters."""
+    return RangeIndex(_df, ["Price_MAD", "Rating", "Attractiveness"])
+
+@st.cache_data(max_entries=16)
+def chart_bins(_filtered_df: pd.DataFrame, filter_key: tuple) -> tuple:
+    """Price and rating histograms binned server-side, once per filter state (sorting doesn't change them)."""
+    price_bins = binning.binned_counts(_filtered_df["Price_MAD"], bins=binning.DEFAULT_BINS)
+    rating_bins = binning.binned_counts(_filtered_df["Rating"], bins=20, value_range=(0.0, 5.0))
+    return price_bins.set_index("center")["count"], rating_bins.set_index("center")["count"]
+
 # --- Sidebar ---
 with st.sidebar:
     st.image("https://upload.wikimedia.org/wikipedia/commons/thumb/3/3b/AliExpress_logo.svg/2560px-AliExpress_logo.svg.png", width=150) # Placeholder logo
@@ -54,9 +89,10 @@ with st.sidebar:
     if st.button("🔄 Lancer un nouveau scraping", type="primary", use_container_width=True):
         try:
             with st.spinner("Scraping des articles les plus vendus sur AliExpress..."):
+                import utils.ali_express as ali_express # Deferred: pulls in Selenium and webdriver_manager
                 ali_express.scrape_aliexpress_top_selling() # Ensure this function creates/updates CSV_FILE_PATH
             st.success("Scraping terminé ! Rechargement des données...")
-            st.cache_data.clear() # Clear cache to reload new data
+            # No cache clearing needed: the new file has a new version token, so only loaders keyed on it reload
             # st.experimental_rerun() # Force rerun is often good after data changes
         except Exception as e:
             st.error(f"Erreur pendant le scraping: {e}")
@@ -64,10 +100,15 @@ with st.sidebar:
     st.markdown("---")
     st.markdown("## 📊 Filtres")
 
-    df_original = load_and_clean_data(CSV_FILE_PATH)
+    data_version = file_version(CSV_FILE_PATH)
+    df_original = load_and_clean_data(CSV_FILE_PATH, data_version)
+    current_model = model_registry.current()
+    model_key = current_model["key"] if current_model else None
+    scores_version = feature_store.scores_version(data_version, model_key) # Changes when the catalog is re-scored
 
     if not df_original.empty:
-        keyword = st.text_input("Rechercher dans le titre :", placeholder="Ex: smartphone, robe...")
+        df_original["Attractiveness"] = load_model_scores(df_original, data_version, model_key, scores_version)
+        keyword = st.text_input("Rechercher dans le titre :", placeholder="Ex: smartphone, robe...", help="Tous les mots doivent apparaître ; début de mot accepté, accents et majuscules ignorés.")
         
         min_price_val = 0.0
         max_price_val = float(df_original["Price_MAD"].max()) if not df_original["Price_MAD"].empty and pd.notna(df_original["Price_MAD"].max()) else 1000.0
@@ -83,6 +124,11 @@ with st.sidebar:
 
         min_rating = st.slider("⭐ Évaluation Minimale", 0.0, 5.0, 0.0, 0.1, help="Produits avec cette évaluation ou plus.")
 
+        has_model_scores = bool(df_original["Attractiveness"].notna().any())
+        min_proba = 0.0
+        if has_model_scores:
+            min_proba = st.slider("🎯 Probabilité d'Attractivité Minimale", 0.0, 1.0, 0.0, 0.05, help="Probabilité estimée par le classificateur (scoring par lot du catalogue).")
+
         sort_options = {
             "Pertinence": "Index", # Assuming original order is relevance
             "Prix (croissant)": "Price_MAD_asc",
@@ -90,12 +136,14 @@ with st.sidebar:
             "Évaluation (décroissant)": "Rating_desc",
             "Ventes (décroissant)": "Sales_Num_desc"
         }
+        if has_model_scores:
+            sort_options["Probabilité d'attractivité (décroissant)"] = "Attractiveness_desc"
         sort_by = st.selectbox("Trier par :", options=list(sort_options.keys()))
 
     else:
         st.warning("Aucune donnée à filtrer. Veuillez lancer un scraping.")
         # Provide dummy values so the rest of the app doesn't break
-        keyword, min_price, max_price, min_rating, sort_by = "", 0.0, 1000.0, 0.0, "Pertinence"
+        keyword, min_price, max_price, min_rating, min_proba, sort_by = "", 0.0, 1000.0, 0.0, 0.0, "Pertinence"
 
 
 # --- Main Page ---
@@ -106,26 +154,29 @@ if df_original.empty:
     st.info("Les données sont en cours de chargement ou le fichier est vide. Si vous venez de lancer un scraping, les données apparaîtront bientôt.")
     st.stop() # Stop execution if no data
 
-# Apply filters
-filtered_df = df_original.copy() # Start with a copy
-
+# Apply filters: keyword hits and price/rating ranges are row position sets, intersected smallest first
+keyword_rows = None
 if keyword:
-    filtered_df = filtered_df[filtered_df["Title"].str.contains(keyword, case=False, na=False)]
-filtered_df = filtered_df[
-    (filtered_df["Price_MAD"] >= min_price) &
-    (filtered_df["Price_MAD"] <= max_price) &
-    ((filtered_df["Rating"].isna()) | (filtered_df["Rating"] >= min_rating)) # Keep NaNs or if rating meets criteria
-]
-
-# Apply sorting
+    # Index lookup instead of a regex scan over every title
+    keyword_rows = load_title_index(df_original["Title"], data_version).search(keyword)
+filtered_rows = load_range_index(df_original, data_version, scores_version).query({
+    "Price_MAD": (min_price, max_price, False),
+    "Rating": (min_rating, None, True), # Keep NaNs or if rating meets criteria
+    "Attractiveness": (min_proba, None, min_proba <= 0), # Unscored products only pass when the filter is off
+}, candidates=keyword_rows)
+filtered_df = df_original.iloc[filtered_rows]
+
+# Apply sorting (stable, so equal keys keep their relevance order and cards don't jump between pages)
 if sort_by == "Prix (croissant)":
-    filtered_df = filtered_df.sort_values(by="Price_MAD", ascending=True)
+    filtered_df = pagination.stable_sort(filtered_df, "Price_MAD", ascending=True)
 elif sort_by == "Prix (décroissant)":
-    filtered_df = filtered_df.sort_values(by="Price_MAD", ascending=False)
+    filtered_df = pagination.stable_sort(filtered_df, "Price_MAD", ascending=False)
 elif sort_by == "Évaluation (décroissant)":
-    filtered_df = filtered_df.sort_values(by="Rating", ascending=False, na_position='last')
+    filtered_df = pagination.stable_sort(filtered_df, "Rating", ascending=False)
 elif sort_by == "Ventes (décroissant)":
-    filtered_df = filtered_df.sort_values(by="Sales_Num", ascending=False, na_position='last')
+    filtered_df = pagination.stable_sort(filtered_df, "Sales_Num", ascending=False)
+elif sort_by == "Probabilité d'attractivité (décroissant)":
+    filtered_df = pagination.stable_sort(filtered_df, "Attractiveness", ascending=False)
 # "Pertinence" (Index) is the default, no action needed if df_original was already sorted that way
 
 
@@ -134,30 +185,21 @@ if not filtered_df.empty:
     st.header("📈 Statistiques Détaillées", divider="rainbow")
     
     col1, col2 = st.columns(2)
+    price_counts, rating_counts = chart_bins(filtered_df, (data_version, scores_version, keyword, min_price, max_price, min_rating, min_proba))
 
     with col1:
         st.subheader("Distribution des Prix")
-        # Use a histogram for better distribution view
-        # Filter out NaN prices for charting
-        prices_for_chart = filtered_df["Price_MAD"].dropna()
-        if not prices_for_chart.empty:
-            st.bar_chart(prices_for_chart.value_counts().sort_index(), height=300)
-            # Or for histogram:
-            # import altair as alt
-            # chart = alt.Chart(prices_for_chart.reset_index()).mark_bar().encode(
-            #     alt.X("Price_MAD", bin=alt.Bin(maxbins=20), title="Fourchette de Prix (MAD)"),
-            #     alt.Y('count()', title="Nombre de Produits")
-            # ).properties(height=300)
-            # st.altair_chart(chart, use_container_width=True)
+        # Histogram binned server-side: one bar per price bin (centre in MAD), NaN prices excluded
+        if price_counts.sum() > 0:
+            st.bar_chart(price_counts, height=300)
         else:
             st.caption("Aucune donnée de prix à afficher.")
 
 
     with col2:
         st.subheader("Distribution des Évaluations")
-        ratings_for_chart = filtered_df["Rating"].dropna()
-        if not ratings_for_chart.empty:
-            st.bar_chart(ratings_for_chart.value_counts().sort_index(), height=300)
+        if rating_counts.sum() > 0:
+            st.bar_chart(rating_counts, height=300)
         else:
             st.caption("Aucune donnée d'évaluation à afficher.")
     
@@ -184,6 +226,27 @@ else:
 if not filtered_df.empty:
     st.subheader(f"✨ {filtered_df.shape[0]} Produits Correspondants")
     
+    # Only the current page's cards are built. The page cursor lives in session_state and goes back
+    # to the first page whenever the filters or the sort order change.
+    query_key = (data_version, scores_version, keyword, min_price, max_price, min_rating, min_proba, sort_by)
+    if st.session_state.get("products_query") != query_key:
+        st.session_state.products_query = query_key
+        st.session_state.products_page = 0
+    page_size = st.select_slider("Produits par page", options=pagination.PAGE_SIZE_OPTIONS, value=pagination.DEFAULT_PAGE_SIZE)
+    num_pages = pagination.page_count(filtered_df.shape[0], page_size)
+    st.session_state.products_page = pagination.clamp_page(st.session_state.products_page, filtered_df.shape[0], page_size)
+    current_page = st.session_state.products_page
+
+    nav_prev, nav_info, nav_next = st.columns([1, 2, 1])
+    nav_prev.button("◀ Précédent", on_click=pagination.shift_page, args=(st.session_state, "products_page", -1), disabled=current_page == 0, use_container_width=True)
+    nav_info.markdown(f"<div style='text-align: center;'>Page {current_page + 1} / {num_pages}</div>", unsafe_allow_html=True)
+    nav_next.button("Suivant ▶", on_click=pagination.shift_page, args=(st.session_state, "products_page", 1), disabled=current_page >= num_pages - 1, use_container_width=True)
+
+    page_start, page_stop = pagination.page_bounds(current_page, filtered_df.shape[0], page_size)
+    page_df = filtered_df.iloc[page_start:page_stop]
+    # Downscaled thumbnails for this page, fetched concurrently and served from the local disk cache
+    thumbnails = images.prefetch(page_df["Image_URL"])
+
     # Dynamic columns based on screen width (approximation)
     # This is a simple way, for true responsiveness, CSS and components are better.
     # Streamlit's native columns are fixed at creation.
@@ -192,14 +255,14 @@ if not filtered_df.empty:
     num_cols = 3 # Number of columns for product display
     product_cols = st.columns(num_cols)
     
-    for index, row in enumerate(filtered_df.iterrows()):
+    for index, row in enumerate(page_df.iterrows()):
         row_data = row[1] # Get the Series from the tuple
         col_index = index % num_cols
         with product_cols[col_index]:
             with st.container(border=True):
                 # Image with a fallback
                 if row_data["Image_URL"] and pd.notna(row_data["Image_URL"]) and row_data["Image_URL"].startswith("http"):
-                    st.image(row_data["Image_URL"])
+                    st.image(thumbnails.get(row_data["Image_URL"]) or row_data["Image_URL"]) # Remote image if no thumbnail
                 else:
                     st.image("https://via.placeholder.com/150?text=Image+N/A") # Placeholder
 
@@ -219,6 +282,9 @@ if not filtered_df.empty:
                 else:
                     st.markdown("📦 **Ventes**: N/A")
 
+                if pd.notna(row_data['Attractiveness']):
+                    st.markdown(f"🎯 **Attractivité (modèle)**: {row_data['Attractiveness']:.0%}")
+
                 if isinstance(row_data['Highlight'], str) and row_data['Highlight'].strip():
                     st.markdown(f"🔥 <span style='color: #ff4b4b;'>**{row_data['Highlight']}**</span>", unsafe_allow_html=True) # Make highlight stand out
                 
@@ -1,10 +1,15 @@
 import streamlit as st
 import pandas as pd
+import numpy as np
 import plotly.express as px
 import plotly.graph_objects as go
 import os
 import subprocess # <-- Import subprocess
 import sys        # <-- Import sys to get python executable
+from utils.dataset_version import file_version
+import utils.shopify_data as shopify_data
+from utils.chunked import LARGE_FILE_BYTES, is_large_file
+from utils.currency import REPORTING_CURRENCY as CURRENCY, fx_table_version
 
 # --- Page Configuration ---
 st.set_page_config(
@@ -22,36 +27,20 @@ CSV_FILENAME = "utils/products_data.csv" # Assumes CSV is in the root directory
 
 
 # --- Helper Functions ---
-@st.cache_data # Cache the data loading to improve performance
-def load_data(filename):
-    """Loads data from the CSV file."""
+@st.cache_data(max_entries=4) # Keyed on the dataset version, so a refresh only misses this entry
+def load_data(filename, version, fx_version):
+    """
+    Loads the dashboard columns from the CSV in typed batches, for a given dataset version.
+    Prices are converted from each store's currency to the reporting currency with the FX table `fx_version`.
+    """
     absolute_csv_path = os.path.abspath(filename) # Get absolute path for clarity
     if not os.path.exists(absolute_csv_path):
         st.error(f"Erreur : Fichier de données non trouvé à l'emplacement attendu : {absolute_csv_path}. Veuillez d'abord exécuter le scraper.") # MODIFIED
         return None
     try:
-        df = pd.read_csv(absolute_csv_path) # Load using absolute path
-        # --- Basic Data Cleaning & Type Conversion ---
-        # Convert price columns to numeric, coercing errors to NaN
-        df['price'] = pd.to_numeric(df['price'], errors='coerce')
-        df['compare_at_price'] = pd.to_numeric(df['compare_at_price'], errors='coerce')
-
-        # Convert relevant columns to datetime objects
-        for col in ['created_at', 'updated_at', 'published_at', 'variant_created_at', 'variant_updated_at']:
-             if col in df.columns:
-                df[col] = pd.to_datetime(df[col], errors='coerce') # Coerce errors if format is inconsistent
-
-        # Ensure 'available' is boolean (handle potential string representations)
-        if 'available' in df.columns:
-             df['available'] = df['available'].apply(lambda x: True if str(x).lower() == 'true' else (False if str(x).lower() == 'false' else None))
-             df['available'] = df['available'].astype('boolean') # Use pandas nullable boolean type
-
-        # Handle potential missing values in key categorical columns
-        for col in ['vendor', 'product_type', 'store_domain']:
-            if col in df.columns:
-                df[col].fillna('Inconnu', inplace=True) # MODIFIED (Unknown -> Inconnu)
-
-        return df
+        # Heavy text columns (body_html, tags, ...) are skipped at parse time and each batch is
+        # cleaned as it's read, so multi-GB exports don't have to fit in memory as raw strings.
+        return shopify_data.load_shopify_frame(absolute_csv_path)
     except pd.errors.EmptyDataError:
         st.error(f"Erreur : {absolute_csv_path} est vide. Veuillez vous assurer que le script de récupération s'est exécuté avec succès et a généré des données.") # MODIFIED
         return None
@@ -59,6 +48,177 @@ def load_data(filename):
         st.error(f"Une erreur s'est produite lors du chargement ou du traitement du CSV ({absolute_csv_path}) : {e}") # MODIFIED
         return None
 
+@st.cache_data(max_entries=4)
+def load_summary(filename, version, fx_version):
+    """
+    Out-of-core summary (KPIs, price histogram, per-vendor / per-type counts) of an export over the
+    large-file threshold: two chunked passes, memory bounded by the batch size and the distinct products.
+    """
+    return shopify_data.summarize_csv(filename), pd.read_csv(filename, nrows=0).columns.tolist()
+
+@st.cache_resource(max_entries=4) # Shared, read-only: built once per loaded dataset
+def load_facets(_data, version, fx_version):
+    """Facet index (domain -> vendor -> product type) with row positions and product/variant counts."""
+    return shopify_data.FacetIndex(_data)
+
+@st.cache_resource(max_entries=4)
+def load_aggregator(_data, version, fx_version):
+    """Integer codes (products, vendors, types, availability) factorized once for the aggregation kernel."""
+    return shopify_data.SelectionAggregator(_data)
+
+@st.cache_data(max_entries=32) # Bounded LRU: recently used filter combinations are served without recomputation
+def aggregate_selection(_aggregator, _rows, version, fx_version, filter_key):
+    """KPIs, chart data and story sections of one filter state, computed together in a single kernel call."""
+    return _aggregator.aggregate(_rows)
+
+def facet_label(options):
+    """Selectbox label with the option's counts, e.g. "Allbirds (230 produits, 254 variantes)"."""
+    counts = options.set_index('value')
+    def label(value):
+        if value not in counts.index:
+            return value
+        return f"{value} ({counts.at[value, 'products']:,} produits, {counts.at[value, 'variants']:,} variantes)" # MODIFIED
+    return label
+
+def render_overview(summary, columns):
+    """KPI metrics and the four charts of a summary (SelectionAggregator.aggregate, or summarize_csv for large files)."""
+    st.header("📈 Indicateurs Clés de Performance (KPIs)") # MODIFIED
+    st.markdown("Métriques d'aperçu pour les données sélectionnées.") # MODIFIED
+
+    total_unique_products = summary['total_unique_products']
+    total_variants = summary['total_variants']
+    available_variants = summary['available_variants']
+    unavailable_variants = summary['unavailable_variants']
+    average_price = summary['average_price'] if 'price' in columns else None
+    median_price = summary['median_price'] if 'price' in columns else None
+    num_vendors = summary['num_vendors']
+    num_product_types = summary['num_product_types']
+
+    # Display KPIs in columns
+    col1, col2, col3, col4 = st.columns(4)
+    with col1:
+        st.metric("Total Produits Uniques", f"{total_unique_products:,}") # MODIFIED
+        st.metric("Total Variantes", f"{total_variants:,}") # MODIFIED
+    with col2:
+        st.metric("Variantes Disponibles", f"{available_variants:,}") # MODIFIED
+        st.metric("Variantes Indisponibles", f"{unavailable_variants:,}") # MODIFIED
+    with col3:
+        st.metric("Prix Moyen des Variantes", f"{average_price:,.2f} {CURRENCY}" if pd.notna(average_price) else "N/D") # MODIFIED
+        st.metric("Prix Médian des Variantes", f"{median_price:,.2f} {CURRENCY}" if pd.notna(median_price) else "N/D") # MODIFIED
+    with col4:
+        st.metric("Nombre de Fournisseurs", f"{num_vendors:,}") # MODIFIED
+        st.metric("Nombre de Types de Produits", f"{num_product_types:,}") # MODIFIED
+
+    st.markdown("---") # Divider
+
+    # --- Data Visualizations ---
+    st.header("📊 Visualisations des Données") # MODIFIED
+    st.markdown("Graphiques interactifs explorant les données produits.") # MODIFIED
+
+    viz_col1, viz_col2 = st.columns(2)
+
+    with viz_col1:
+        # Price Distribution Histogram
+        st.subheader("Distribution des Prix des Variantes") # MODIFIED
+        if 'price' in columns and pd.notna(summary['average_price']):
+            price_bins = summary['price_histogram']
+            fig_price_hist = px.bar(
+                price_bins,
+                x="center",
+                y="count",
+                title="Distribution des Prix des Variantes", # MODIFIED
+                hover_data=['left', 'right'],
+                labels={'center': f'Prix ({CURRENCY})', 'count': 'Nombre de variantes'}, # MODIFIED
+                color_discrete_sequence=px.colors.sequential.Viridis
+            )
+            fig_price_hist.update_traces(width=price_bins['width'] * 0.9)
+            st.plotly_chart(fig_price_hist, use_container_width=True)
+        else:
+            st.warning("Aucune donnée de prix valide disponible pour la sélection actuelle pour afficher la distribution.") # MODIFIED
+
+        # Product Count per Vendor Bar Chart
+        st.subheader("Nombre de Produits par Fournisseur") # MODIFIED
+        if 'vendor' in columns and 'product_id' in columns:
+            vendor_product_counts = summary['vendor_product_counts'].reset_index()
+            vendor_product_counts.columns = ['Fournisseur', 'Nombre de Produits Uniques'] # MODIFIED
+            if not vendor_product_counts.empty:
+                top_n = 20
+                display_counts = vendor_product_counts.head(top_n)
+                if len(vendor_product_counts) > top_n:
+                     st.caption(f"Affichage des {top_n} Principaux Fournisseurs par Nombre de Produits") # MODIFIED
+
+                fig_vendor_bar = px.bar(
+                    display_counts, 
+                    x="Fournisseur", # MODIFIED
+                    y="Nombre de Produits Uniques", # MODIFIED
+                    title="Produits Uniques par Fournisseur", # MODIFIED
+                    labels={'Fournisseur': 'Fournisseur', 'Nombre de Produits Uniques': 'Nombre de Produits Uniques'}, # MODIFIED (keys are new column names)
+                    color='Fournisseur', # MODIFIED
+                    color_discrete_sequence=px.colors.qualitative.Pastel
+                )
+                fig_vendor_bar.update_layout(xaxis_tickangle=-45, showlegend=False)
+                st.plotly_chart(fig_vendor_bar, use_container_width=True)
+            else:
+                st.warning("Aucune donnée de fournisseur disponible pour la sélection actuelle.") # MODIFIED
+        else:
+             st.warning("Données de Fournisseur ou d'ID Produit manquantes pour ce graphique.") # MODIFIED
+
+
+    with viz_col2:
+         # Variant Availability Pie Chart
+        st.subheader("Disponibilité des Variantes") # MODIFIED
+        if 'available' in columns:
+            availability_counts = summary['availability_counts'].reset_index()
+            availability_counts.columns = ['Disponible', 'Nombre'] # MODIFIED
+            # Map boolean/None to readable strings safely
+            availability_counts['Disponible'] = availability_counts['Disponible'].apply(
+                lambda x: 'Disponible' if x is True else ('Indisponible' if x is False else 'Inconnu') # MODIFIED
+            )
+
+
+            if not availability_counts.empty:
+                fig_avail_pie = px.pie(
+                    availability_counts,
+                    names='Disponible', # MODIFIED
+                    values='Nombre', # MODIFIED
+                    title='Statut de Disponibilité des Variantes', # MODIFIED
+                    hole=0.3, # Make it a donut chart
+                    color_discrete_map={'Disponible':'#2ca02c', 'Indisponible':'#d62728', 'Inconnu':'#7f7f7f'} # MODIFIED
+                )
+                fig_avail_pie.update_traces(textposition='inside', textinfo='percent+label')
+                st.plotly_chart(fig_avail_pie, use_container_width=True)
+            else:
+                st.warning("Aucune donnée de disponibilité disponible pour la sélection actuelle.") # MODIFIED
+        else:
+            st.warning("Colonne de données de disponibilité introuvable pour le diagramme circulaire.") # MODIFIED
+
+        # Product Count per Type Bar Chart
+        st.subheader("Nombre de Produits par Type de Produit") # MODIFIED
+        if 'product_type' in columns and 'product_id' in columns:
+            type_product_counts = summary['type_product_counts'].reset_index()
+            type_product_counts.columns = ['Type de Produit', 'Nombre de Produits Uniques'] # MODIFIED
+            if not type_product_counts.empty:
+                top_n_type = 20
+                display_type_counts = type_product_counts.head(top_n_type)
+                if len(type_product_counts) > top_n_type:
+                     st.caption(f"Affichage des {top_n_type} Principaux Types de Produits par Nombre de Produits") # MODIFIED
+
+                fig_type_bar = px.bar(
+                    display_type_counts, 
+                    x="Type de Produit", # MODIFIED
+                    y="Nombre de Produits Uniques", # MODIFIED
+                    title="Produits Uniques par Type", # MODIFIED
+                    labels={'Type de Produit': 'Type de Produit', 'Nombre de Produits Uniques': 'Nombre de Produits Uniques'}, # MODIFIED
+                    color='Type de Produit', # MODIFIED
+                    color_discrete_sequence=px.colors.qualitative.Set2
+                )
+                fig_type_bar.update_layout(xaxis_tickangle=-45, showlegend=False)
+                st.plotly_chart(fig_type_bar, use_container_width=True)
+            else:
+                st.warning("Aucune donnée de type de produit disponible pour la sélection actuelle.") # MODIFIED
+        else:
+             st.warning("Données de Type de Produit ou d'ID Produit manquantes pour ce graphique.") # MODIFIED
+
 # --- Function to run the scraper script ---
 def run_scraper(script_path):
     """Runs the external Python script using subprocess."""
@@ -120,9 +280,9 @@ if st.sidebar.button("🔄 Récupérer de Nouvelles Données Shopify"): # MODIFI
     with st.spinner(f"Exécution du scraper de données Shopify... Veuillez patienter. Cela peut prendre un certain temps."): # MODIFIED
         success = run_scraper(scraper_script_path)
         if success:
-            # IMPORTANT: Clear the cache so load_data runs again
-            st.cache_data.clear()
-            st.success("Cache vidé. Redémarrage de l'application pour charger les nouvelles données...") # MODIFIED
+            # The refreshed CSV gets a new version token, so load_data misses on its own;
+            # caches of other pages and datasets stay warm.
+            st.success("Nouvelles données récupérées. Redémarrage de l'application pour les charger...") # MODIFIED
             # Rerun the app immediately to reflect the newly scraped data
             st.experimental_rerun()
         else:
@@ -137,40 +297,56 @@ st.sidebar.header("Filtres") # MODIFIED
 # Let's try resolving the path relative to the dashboard script's parent directory (project root)
 project_root = os.path.abspath(os.path.join(os.path.dirname(__file__), ".."))
 absolute_csv_path = os.path.join(project_root, CSV_FILENAME)
-data = load_data(absolute_csv_path)
+data_version = file_version(absolute_csv_path)
+large_file = is_large_file(absolute_csv_path)
+data = None if large_file else load_data(absolute_csv_path, data_version, fx_table_version())
 
 
 # --- Dashboard Content (Only if data loaded successfully) ---
-if data is not None and not data.empty:
-
-    # Filter data based on domain selection (using the already loaded 'data' DataFrame)
-    all_domains = ['Tous'] + sorted(data['store_domain'].unique().tolist()) # MODIFIED
-    selected_domain = st.sidebar.selectbox("Sélectionner le Domaine de la Boutique", all_domains) # MODIFIED
-
+if large_file:
+    # The export isn't loaded whole: the overview is folded batch by batch, and the filters need the full frame
+    st.info(f"Fichier volumineux (plus de {LARGE_FILE_BYTES // (1024 * 1024)} Mo) : indicateurs et graphiques calculés par lots sur l'ensemble des données. Les filtres, la narration et le tableau des données brutes sont désactivés.") # MODIFIED
+    large_summary, large_columns = load_summary(absolute_csv_path, data_version, fx_table_version())
+    render_overview(large_summary, large_columns)
+
+elif data is not None and not data.empty:
+
+    # Cascading facets (domain -> vendor -> type) come from the facet index built at load time:
+    # options and counts are lookups, and the selection is a set of row positions (no intermediate copies)
+    facets = load_facets(data, data_version, fx_table_version())
+    facet_selection = [None] * len(facets.levels)
+
+    domain_options = facets.options('store_domain', facet_selection)
+    all_domains = ['Tous'] + domain_options['value'].tolist() # MODIFIED
+    selected_domain = st.sidebar.selectbox("Sélectionner le Domaine de la Boutique", all_domains, format_func=facet_label(domain_options)) # MODIFIED
     if selected_domain != 'Tous': # MODIFIED
-        filtered_data = data[data['store_domain'] == selected_domain].copy()
-    else:
-        filtered_data = data.copy()
+        facet_selection[0] = selected_domain
+
+    selected_rows = facets.selection_rows(facet_selection)
 
     # --- Dynamic Filters based on current selection ---
-    if not filtered_data.empty:
+    if len(selected_rows) > 0:
         # Filter by Vendor
-        all_vendors = ['Tous'] + sorted(filtered_data['vendor'].unique().tolist()) # MODIFIED
-        selected_vendor = st.sidebar.selectbox("Sélectionner le Fournisseur", all_vendors) # MODIFIED
+        vendor_options = facets.options('vendor', facet_selection)
+        all_vendors = ['Tous'] + vendor_options['value'].tolist() # MODIFIED
+        selected_vendor = st.sidebar.selectbox("Sélectionner le Fournisseur", all_vendors, format_func=facet_label(vendor_options)) # MODIFIED
         if selected_vendor != 'Tous': # MODIFIED
-            filtered_data = filtered_data[filtered_data['vendor'] == selected_vendor].copy()
+            facet_selection[1] = selected_vendor
 
         # Filter by Product Type
-        all_product_types = ['Tous'] + sorted(filtered_data['product_type'].unique().tolist()) # MODIFIED
-        selected_product_type = st.sidebar.selectbox("Sélectionner le Type de Produit", all_product_types) # MODIFIED
+        type_options = facets.options('product_type', facet_selection)
+        all_product_types = ['Tous'] + type_options['value'].tolist() # MODIFIED
+        selected_product_type = st.sidebar.selectbox("Sélectionner le Type de Produit", all_product_types, format_func=facet_label(type_options)) # MODIFIED
         if selected_product_type != 'Tous': # MODIFIED
-            filtered_data = filtered_data[filtered_data['product_type'] == selected_product_type].copy()
+            facet_selection[2] = selected_product_type
+        selected_rows = facets.selection_rows(facet_selection)
 
         # Filter by Price Range
         # Ensure price column exists and has valid numbers before calculating min/max
-        if 'price' in filtered_data.columns and not filtered_data['price'].isnull().all():
-            min_price_val = float(filtered_data['price'].min())
-            max_price_val = float(filtered_data['price'].max())
+        selected_prices = data['price'].to_numpy(dtype=float, na_value=np.nan)[selected_rows] if 'price' in data.columns else None
+        if selected_prices is not None and not np.isnan(selected_prices).all():
+            min_price_val = float(np.nanmin(selected_prices))
+            max_price_val = float(np.nanmax(selected_prices))
             # Handle case where min and max are the same for the slider
             if min_price_val == max_price_val:
                 max_price_val += 1.0
@@ -185,22 +361,20 @@ if data is not None and not data.empty:
 
 
         price_range = st.sidebar.slider(
-            "Sélectionner la Fourchette de Prix ($)", # MODIFIED
+            f"Sélectionner la Fourchette de Prix ({CURRENCY})", # MODIFIED
             min_value=min_price_val,
             max_value=max_price_val,
             value=default_price_range, # Use calculated default range
             step=0.01
         )
-        # Apply price filter only if price column exists
-        if 'price' in filtered_data.columns:
-            filtered_data = filtered_data[
-                (filtered_data['price'] >= price_range[0]) &
-                (filtered_data['price'] <= price_range[1])
-            ].copy()
+        # Apply price filter only if price column exists (masks on the selected rows only)
+        keep = np.ones(len(selected_rows), dtype=bool)
+        if selected_prices is not None:
+            keep &= (selected_prices >= price_range[0]) & (selected_prices <= price_range[1])
 
 
          # Filter by Availability
-        if 'available' in filtered_data.columns:
+        if 'available' in data.columns:
             availability_options = {'Tous': None, 'Disponible': True, 'Indisponible': False} # MODIFIED
             selected_availability_str = st.sidebar.radio(
                 "Filtrer par Disponibilité", # MODIFIED
@@ -209,158 +383,30 @@ if data is not None and not data.empty:
             )
             selected_availability_bool = availability_options[selected_availability_str]
             if selected_availability_bool is not None:
-                filtered_data = filtered_data[filtered_data['available'] == selected_availability_bool].copy()
+                keep &= (data['available'].array[selected_rows] == selected_availability_bool).to_numpy(dtype=bool, na_value=False)
         else:
             st.sidebar.warning("Colonne de données de disponibilité introuvable.") # MODIFIED
+        selected_rows = selected_rows[keep]
+        filter_key = (tuple(facet_selection), tuple(price_range), selected_availability_str if 'available' in data.columns else None)
 
     else:
         st.sidebar.warning("Aucune donnée ne correspond au filtre de domaine actuel.") # MODIFIED
 
+    filtered_data = data.iloc[selected_rows] # Single take of the final selection
+
 
     # --- Main Dashboard Area (Only if filtered_data is not empty) ---
     if not filtered_data.empty:
-        st.header("📈 Indicateurs Clés de Performance (KPIs)") # MODIFIED
-        st.markdown("Métriques d'aperçu pour les données sélectionnées.") # MODIFIED
-
-        # --- Calculate KPIs (Safely handle potential missing columns/data) ---
-        total_unique_products = filtered_data['product_id'].nunique() if 'product_id' in filtered_data else 0
-        total_variants = len(filtered_data)
-
-        available_variants = 0
-        if 'available' in filtered_data.columns:
-            # Ensure we handle potential Pandas <NA> boolean type correctly
-             available_variants = filtered_data[filtered_data['available'].eq(True)].shape[0]
-
-        unavailable_variants = total_variants - available_variants
-
-        average_price = filtered_data['price'].mean() if 'price' in filtered_data.columns else None
-        median_price = filtered_data['price'].median() if 'price' in filtered_data.columns else None
-
-        num_vendors = filtered_data['vendor'].nunique() if 'vendor' in filtered_data else 0
-        num_product_types = filtered_data['product_type'].nunique() if 'product_type' in filtered_data else 0
-
-        # Display KPIs in columns
-        col1, col2, col3, col4 = st.columns(4)
-        with col1:
-            st.metric("Total Produits Uniques", f"{total_unique_products:,}") # MODIFIED
-            st.metric("Total Variantes", f"{total_variants:,}") # MODIFIED
-        with col2:
-            st.metric("Variantes Disponibles", f"{available_variants:,}") # MODIFIED
-            st.metric("Variantes Indisponibles", f"{unavailable_variants:,}") # MODIFIED
-        with col3:
-            st.metric("Prix Moyen des Variantes", f"${average_price:,.2f}" if pd.notna(average_price) else "N/D") # MODIFIED
-            st.metric("Prix Médian des Variantes", f"${median_price:,.2f}" if pd.notna(median_price) else "N/D") # MODIFIED
-        with col4:
-            st.metric("Nombre de Fournisseurs", f"{num_vendors:,}") # MODIFIED
-            st.metric("Nombre de Types de Produits", f"{num_product_types:,}") # MODIFIED
-
-        st.markdown("---") # Divider
-
-        # --- Data Visualizations ---
-        st.header("📊 Visualisations des Données") # MODIFIED
-        st.markdown("Graphiques interactifs explorant les données produits.") # MODIFIED
-
-        viz_col1, viz_col2 = st.columns(2)
-
-        with viz_col1:
-            # Price Distribution Histogram
-            st.subheader("Distribution des Prix des Variantes") # MODIFIED
-            if 'price' in filtered_data.columns and not filtered_data['price'].isnull().all():
-                fig_price_hist = px.histogram(
-                    filtered_data.dropna(subset=['price']),
-                    x="price",
-                    nbins=50,
-                    title="Distribution des Prix des Variantes", # MODIFIED
-                    labels={'price': 'Prix ($)'}, # MODIFIED
-                    color_discrete_sequence=px.colors.sequential.Viridis
-                )
-                fig_price_hist.update_layout(bargap=0.1)
-                st.plotly_chart(fig_price_hist, use_container_width=True)
-            else:
-                st.warning("Aucune donnée de prix valide disponible pour la sélection actuelle pour afficher la distribution.") # MODIFIED
-
-            # Product Count per Vendor Bar Chart
-            st.subheader("Nombre de Produits par Fournisseur") # MODIFIED
-            if 'vendor' in filtered_data.columns and 'product_id' in filtered_data.columns:
-                vendor_product_counts = filtered_data.groupby('vendor')['product_id'].nunique().sort_values(ascending=False).reset_index()
-                vendor_product_counts.columns = ['Fournisseur', 'Nombre de Produits Uniques'] # MODIFIED
-                if not vendor_product_counts.empty:
-                    top_n = 20
-                    display_counts = vendor_product_counts.head(top_n)
-                    if len(vendor_product_counts) > top_n:
-                         st.caption(f"Affichage des {top_n} Principaux Fournisseurs par Nombre de Produits") # MODIFIED
-
-                    fig_vendor_bar = px.bar(
-                        display_counts, 
-                        x="Fournisseur", # MODIFIED
-                        y="Nombre de Produits Uniques", # MODIFIED
-                        title="Produits Uniques par Fournisseur", # MODIFIED
-                        labels={'Fournisseur': 'Fournisseur', 'Nombre de Produits Uniques': 'Nombre de Produits Uniques'}, # MODIFIED (keys are new column names)
-                        color='Fournisseur', # MODIFIED
-                        color_discrete_sequence=px.colors.qualitative.Pastel
-                    )
-                    fig_vendor_bar.update_layout(xaxis_tickangle=-45, showlegend=False)
-                    st.plotly_chart(fig_vendor_bar, use_container_width=True)
-                else:
-                    st.warning("Aucune donnée de fournisseur disponible pour la sélection actuelle.") # MODIFIED
-            else:
-                 st.warning("Données de Fournisseur ou d'ID Produit manquantes pour ce graphique.") # MODIFIED
-
-
-        with viz_col2:
-             # Variant Availability Pie Chart
-            st.subheader("Disponibilité des Variantes") # MODIFIED
-            if 'available' in filtered_data.columns:
-                availability_counts = filtered_data['available'].value_counts().reset_index()
-                availability_counts.columns = ['Disponible', 'Nombre'] # MODIFIED
-                # Map boolean/None to readable strings safely
-                availability_counts['Disponible'] = availability_counts['Disponible'].apply(
-                    lambda x: 'Disponible' if x is True else ('Indisponible' if x is False else 'Inconnu') # MODIFIED
-                )
-
-
-                if not availability_counts.empty:
-                    fig_avail_pie = px.pie(
-                        availability_counts,
-                        names='Disponible', # MODIFIED
-                        values='Nombre', # MODIFIED
-                        title='Statut de Disponibilité des Variantes', # MODIFIED
-                        hole=0.3, # Make it a donut chart
-                        color_discrete_map={'Disponible':'#2ca02c', 'Indisponible':'#d62728', 'Inconnu':'#7f7f7f'} # MODIFIED
-                    )
-                    fig_avail_pie.update_traces(textposition='inside', textinfo='percent+label')
-                    st.plotly_chart(fig_avail_pie, use_container_width=True)
-                else:
-                    st.warning("Aucune donnée de disponibilité disponible pour la sélection actuelle.") # MODIFIED
-            else:
-                st.warning("Colonne de données de disponibilité introuvable pour le diagramme circulaire.") # MODIFIED
-
-            # Product Count per Type Bar Chart
-            st.subheader("Nombre de Produits par Type de Produit") # MODIFIED
-            if 'product_type' in filtered_data.columns and 'product_id' in filtered_data.columns:
-                type_product_counts = filtered_data.groupby('product_type')['product_id'].nunique().sort_values(ascending=False).reset_index()
-                type_product_counts.columns = ['Type de Produit', 'Nombre de Produits Uniques'] # MODIFIED
-                if not type_product_counts.empty:
-                    top_n_type = 20
-                    display_type_counts = type_product_counts.head(top_n_type)
-                    if len(type_product_counts) > top_n_type:
-                         st.caption(f"Affichage des {top_n_type} Principaux Types de Produits par Nombre de Produits") # MODIFIED
-
-                    fig_type_bar = px.bar(
-                        display_type_counts, 
-                        x="Type de Produit", # MODIFIED
-                        y="Nombre de Produits Uniques", # MODIFIED
-                        title="Produits Uniques par Type", # MODIFIED
-                        labels={'Type de Produit': 'Type de Produit', 'Nombre de Produits Uniques': 'Nombre de Produits Uniques'}, # MODIFIED
-                        color='Type de Produit', # MODIFIED
-                        color_discrete_sequence=px.colors.qualitative.Set2
-                    )
-                    fig_type_bar.update_layout(xaxis_tickangle=-45, showlegend=False)
-                    st.plotly_chart(fig_type_bar, use_container_width=True)
-                else:
-                    st.warning("Aucune donnée de type de produit disponible pour la sélection actuelle.") # MODIFIED
-            else:
-                 st.warning("Données de Type de Produit ou d'ID Produit manquantes pour ce graphique.") # MODIFIED
+        # --- Calculate KPIs (and every other section's aggregates, cached per filter state) ---
+        summary = aggregate_selection(
+            load_aggregator(data, data_version, fx_table_version()), selected_rows, data_version, fx_table_version(), filter_key
+        )
+        render_overview(summary, filtered_data.columns)
+        total_variants = summary['total_variants']
+        unavailable_variants = summary['unavailable_variants']
+        average_price = summary['average_price'] if 'price' in filtered_data.columns else None
+        median_price = summary['median_price'] if 'price' in filtered_data.columns else None
+        num_vendors = summary['num_vendors']
 
         st.markdown("---")
 
@@ -379,7 +425,7 @@ if data is not None and not data.empty:
             unavailable_sample_cols = ['title', 'variant_title', 'vendor', 'store_domain']
             # Check if required columns exist before trying to display
             if all(col in filtered_data.columns for col in unavailable_sample_cols):
-                 unavailable_sample = filtered_data[filtered_data['available'] == False][unavailable_sample_cols].drop_duplicates().head(10)
+                 unavailable_sample = summary['unavailable_sample']
                  if not unavailable_sample.empty:
                      with st.expander("Voir un Échantillon des Variantes Indisponibles"): # MODIFIED
                          st.dataframe(unavailable_sample, use_container_width=True)
@@ -391,13 +437,13 @@ if data is not None and not data.empty:
         st.subheader("Analyse des Niveaux de Prix") # MODIFIED
         if 'price' in filtered_data.columns and pd.notna(average_price):
             st.markdown(f"""
-            Le prix moyen d'une variante dans l'ensemble de données sélectionné est de **${average_price:,.2f}**, avec un prix médian de **${median_price:,.2f}**.
+            Le prix moyen d'une variante dans l'ensemble de données sélectionné est de **{average_price:,.2f} {CURRENCY}**, avec un prix médian de **{median_price:,.2f} {CURRENCY}**.
             Le graphique de distribution ci-dessus montre comment les prix sont répartis dans la sélection. Des pics significatifs pourraient indiquer des niveaux de prix courants.
             """) # MODIFIED
             # Highlight most expensive items
             expensive_cols = ['title', 'vendor', 'price', 'store_domain']
             if all(col in filtered_data.columns for col in expensive_cols):
-                most_expensive = filtered_data.sort_values('price', ascending=False).drop_duplicates(subset=['product_id']).head(5)
+                most_expensive = summary['most_expensive']
                 if not most_expensive.empty:
                      with st.expander("Top 5 des Produits les Plus Chers (basé sur le prix de variante le plus élevé)"): # MODIFIED
                         st.dataframe(most_expensive[expensive_cols], use_container_width=True)
@@ -408,7 +454,7 @@ if data is not None and not data.empty:
 
         # Storytelling Example 3: Vendor Dominance (if applicable)
         if 'vendor' in filtered_data.columns and 'product_id' in filtered_data.columns and num_vendors > 1:
-             vendor_counts = filtered_data.groupby('vendor')['product_id'].nunique().sort_values(ascending=False)
+             vendor_counts = summary['vendor_product_counts']
              if not vendor_counts.empty:
                 top_vendor = vendor_counts.index[0]
                 top_vendor_count = vendor_counts.iloc[0]
@@ -7,6 +7,7 @@ from selenium.webdriver.support.ui import WebDriverWait
 from selenium.webdriver.support import expected_conditions as EC
 from webdriver_manager.firefox import GeckoDriverManager
 from bs4 import BeautifulSoup
+import utils.snapshots as snapshots
 
 def scrape_aliexpress_top_selling(
     max_pages=20,
@@ -144,6 +145,11 @@ def scrape_aliexpress_top_selling(
         df = pd.DataFrame(all_product_data)
         df.to_csv(output_csv, index=False, encoding='utf-8-sig')
         print(f"\nScraping completed: {len(df)} products saved to {output_csv}")
+        try:
+            snapshot_id = snapshots.sync_from_csv(output_csv)
+            print(f"Snapshot {snapshot_id} appended to the price/sales history.")
+        except Exception as e:
+            print(f"Could not record the snapshot history: {e}")
     else:
         print("No data was scraped.")
 
@@ -0,0 +1,121 @@
+# utils/batch_scoring.py
+import argparse
+import os
+import time
+import warnings
+
+import numpy as np
+import pandas as pd
+
+import utils.feature_store as feature_store
+import utils.model_registry as model_registry
+from utils.dataset_version import file_version
+
+# --- Configuration ---
+CHUNK_ROWS = 65_536  # Rows per predict_proba call: bounds the per-tree probability buffers on large catalogs
+FILL_RULES = {'price_numeric': 'median', 'sales_numeric': 0.0, 'rating_numeric': 'median'}  # Imputation used in training
+
+
+# --- Model Inputs ---
+def fill_values(features):
+    """Imputation values for the model inputs: median price and rating, 0 sales (as in training)."""
+    values = {}
+    for col, rule in FILL_RULES.items():
+        if col in features.columns:
+            values[col] = float(features[col].median()) if rule == 'median' else rule
+    return values
+
+
+def model_inputs(features, feature_list, fills):
+    """Float32 input matrix (the dtype the trees split on, so predict_proba doesn't copy it), NaNs imputed."""
+    X = np.empty((len(features), len(feature_list)), dtype=np.float32)
+    for j, col in enumerate(feature_list):
+        X[:, j] = features[col].to_numpy(dtype=np.float32, na_value=np.nan)
+        X[np.isnan(X[:, j]), j] = fills.get(col, 0.0)
+    return X
+
+
+def positive_proba(model, X, chunk_rows=CHUNK_ROWS):
+    """P(attractive) for every row of `X`, one predict_proba call per chunk (no separate predict pass)."""
+    positive = list(model.classes_).index(1)
+    proba = np.empty(len(X), dtype=np.float32)
+    with warnings.catch_warnings():
+        # The model was fitted on a DataFrame; the matrix columns are in the same order
+        warnings.filterwarnings("ignore", message="X does not have valid feature names")
+        for start in range(0, len(X), chunk_rows):
+            proba[start:start + chunk_rows] = model.predict_proba(X[start:start + chunk_rows])[:, positive]
+    return proba
+
+
+# --- Batch Scoring ---
+def score_features(features, model, meta, chunk_rows=CHUNK_ROWS):
+    """
+    `attractiveness_proba` for every row of a feature frame (same index) and throughput stats.
+    Missing inputs get the imputation values recorded with the model, else this frame's own.
+    """
+    start = time.perf_counter()
+    fills = meta.get('fill_values') or fill_values(features)
+    proba = positive_proba(model, model_inputs(features, meta['features'], fills), chunk_rows)
+    seconds = time.perf_counter() - start
+    stats = {'rows': len(features), 'seconds': seconds, 'rows_per_second': len(features) / max(seconds, 1e-9)}
+    return pd.Series(proba, index=features.index, name=feature_store.SCORE_COLUMN), stats
+
+
+def score_version(features, version, model=None, meta=None, chunk_rows=CHUNK_ROWS):
+    """
+    Scores a feature-store frame (indexed by item_id) with `model`, by default the registry's current model,
+    and writes `attractiveness_proba` back to the feature store. Returns (scores, stats), or (None, None)
+    when the registry has no model yet.
+    """
+    if model is None:
+        meta = model_registry.current()
+        if meta is None:
+            return None, None
+        model, meta = model_registry.load(meta['key'])
+    scores, stats = score_features(features, model, meta, chunk_rows)
+    feature_store.write_scores(scores, version, meta['key'])
+    return scores, {**stats, 'model_key': meta['key']}
+
+
+def current_scores(version):
+    """
+    (model key, stored scores) of the registry's current model for a dataset version; the scores are None
+    if that model hasn't scored this version yet. Reading never imports sklearn.
+    """
+    meta = model_registry.current()
+    if meta is None:
+        return None, None
+    return meta['key'], feature_store.load_scores(version, meta['key'])
+
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser(description="Scores a scraped CSV with the registry's current model")
+    parser.add_argument("csv_path", nargs="?", default=os.path.join(feature_store.PROJECT_ROOT, "aliexpress_multi_page_firefox.csv"))
+    parser.add_argument("--chunk-rows", type=int, default=CHUNK_ROWS)
+    parser.add_argument("--benchmark", type=int, metavar="N_ROWS", help="Also time N_ROWS resampled rows against one-row scoring")
+    args = parser.parse_args()
+
+    features = feature_store.load_features_for_csv(args.csv_path)
+    if features is None:
+        parser.error(f"{args.csv_path} not found")
+    scores, stats = score_version(features, file_version(args.csv_path), chunk_rows=args.chunk_rows)
+    if scores is None:
+        parser.error("The model registry has no current model: train one from the ML page first")
+    print(f"Scored {stats['rows']:,} rows with model {stats['model_key']} in {stats['seconds']:.3f} s "
+          f"({stats['rows_per_second']:,.0f} rows/s)")
+
+    if args.benchmark:
+        # Previous approach: a one-row DataFrame per product, then predict_proba and predict
+        model, meta = model_registry.load(stats['model_key'])
+        big = features.sample(args.benchmark, replace=True, random_state=0)
+        for chunk_rows in [4_096, 16_384, 65_536, 262_144]:
+            _, stats = score_features(big, model, meta, chunk_rows)
+            print(f"batch, chunks of {chunk_rows:,}: {stats['rows_per_second']:,.0f} rows/s")
+        sample = big.head(200)
+        filled = sample[meta['features']].fillna(meta.get('fill_values') or fill_values(sample))
+        start = time.perf_counter()
+        for _, row in filled.iterrows():
+            one_row = pd.DataFrame([row.to_dict()])[meta['features']]
+            model.predict_proba(one_row)
+            model.predict(one_row)
+        print(f"one row at a time: {len(sample) / (time.perf_counter() - start):,.0f} rows/s")
@@ -0,0 +1,103 @@
+# utils/binning.py
+import os
+
+import numpy as np
+import pandas as pd
+
+# --- Configuration ---
+# Above this many points, charts get pre-aggregated (or sampled) data instead of every row
+MAX_PLOT_POINTS = int(os.environ.get("MAX_PLOT_POINTS", 5000))
+DEFAULT_BINS = 30
+HEX_GRIDSIZE = 40  # Hexagons across the x axis
+
+
+# --- 1D Binning ---
+def bin_edges(values, bins=DEFAULT_BINS, method='fixed', value_range=None):
+    """
+    Bin edges for `values`: `bins` equal-width bins over `value_range` (default: data min/max),
+    or with method='quantile', edges at evenly spaced quantiles (duplicates collapsed for tied data).
+    """
+    values = np.asarray(values, dtype=float)
+    values = values[~np.isnan(values)]
+    if value_range is not None:
+        low, high = value_range
+    elif values.size:
+        low, high = float(values.min()), float(values.max())
+    else:
+        low, high = 0.0, 1.0
+    if high <= low:
+        high = low + 1.0
+    if method == 'quantile' and values.size:
+        edges = np.unique(np.quantile(values, np.linspace(0, 1, bins + 1)))
+        if edges.size >= 2:
+            return edges
+    return np.linspace(low, high, bins + 1)
+
+
+def binned_counts(values, bins=DEFAULT_BINS, method='fixed', value_range=None):
+    """
+    Histogram computed server-side: one row per bin (left, right, center, width, count, density).
+    The chart payload is `bins` rows whatever the number of values.
+    """
+    values = np.asarray(values, dtype=float)
+    values = values[~np.isnan(values)]
+    edges = bin_edges(values, bins, method, value_range)
+    counts = np.histogram(values, bins=edges)[0]
+    widths = np.diff(edges)
+    return pd.DataFrame({
+        'left': edges[:-1],
+        'right': edges[1:],
+        'center': (edges[:-1] + edges[1:]) / 2,
+        'width': widths,
+        'count': counts,
+        'density': counts / widths,  # Comparable across unequal (quantile) bins
+    })
+
+
+# --- 2D Binning ---
+def hexbin(x, y, c=None, gridsize=HEX_GRIDSIZE):
+    """
+    Hexagonal 2D binning of (x, y) points: one row per non-empty hexagon with its center, point count
+    and, if `c` is given, the mean of `c` over the points in it. Same lattice construction as matplotlib's hexbin:
+    each point goes to the nearer center of two offset rectangular lattices.
+    """
+    x = np.asarray(x, dtype=float)
+    y = np.asarray(y, dtype=float)
+    keep = ~(np.isnan(x) | np.isnan(y))
+    x, y = x[keep], y[keep]
+    columns = ['x', 'y', 'count'] + (['c_mean'] if c is not None else [])
+    if x.size == 0:
+        return pd.DataFrame(columns=columns)
+
+    nx = gridsize
+    ny = max(int(round(gridsize / np.sqrt(3))), 1)
+    x_min, y_min = float(x.min()), float(y.min())
+    sx = (float(x.max()) - x_min) / nx or 1.0
+    sy = (float(y.max()) - y_min) / ny or 1.0
+    u = (x - x_min) / sx
+    v = (y - y_min) / sy
+
+    i1, j1 = np.round(u), np.round(v)
+    i2, j2 = np.floor(u), np.floor(v)
+    d1 = (u - i1) ** 2 + 3.0 * (v - j1) ** 2
+    d2 = (u - i2 - 0.5) ** 2 + 3.0 * (v - j2 - 0.5) ** 2
+    on_first = d1 <= d2
+    cells = pd.DataFrame({
+        'x': np.where(on_first, i1, i2 + 0.5) * sx + x_min,
+        'y': np.where(on_first, j1, j2 + 0.5) * sy + y_min,
+    })
+    if c is not None:
+        cells['c'] = np.asarray(c, dtype=float)[keep]
+        grouped = cells.groupby(['x', 'y'], sort=False)['c'].agg(count='size', c_mean='mean')
+    else:
+        grouped = cells.groupby(['x', 'y'], sort=False).size().rename('count').to_frame()
+    return grouped.reset_index()[columns]
+
+
+# --- Downsampling ---
+def downsample(df, max_points=MAX_PLOT_POINTS, seed=0):
+    """At most `max_points` rows of `df`: a fixed-seed random sample (same sample for the same data), in original order."""
+    if len(df) <= max_points:
+        return df
+    positions = np.sort(np.random.default_rng(seed).choice(len(df), size=max_points, replace=False))
+    return df.iloc[positions]
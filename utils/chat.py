@@ -1,16 +1,39 @@
+import functools
 import os
-from groq import Groq
 import pandas as pd
+import utils.feature_store as feature_store
+from utils.currency import REPORTING_CURRENCY as CURRENCY
+from utils.dataset_version import file_version
 
 filename = "aliexpress_multi_page_firefox.csv"  
+# Cleaned columns shown to the LLM (read from the feature store instead of the raw price/sales strings)
+PREVIEW_COLUMNS = ['name', 'price_numeric', 'original_price_numeric', 'discount_percentage_numeric',
+                   'rating_numeric', 'sales_numeric', 'additional_badges', 'attractiveness_score']
+PREVIEW_ROWS = 20
 
-df = pd.read_csv(filename)
-# print(df)
+@functools.lru_cache(maxsize=2)
+def _load_df(csv_path, version):
+    df = feature_store.load_features_for_csv(csv_path)
+    return df if df is not None else pd.DataFrame(columns=PREVIEW_COLUMNS)
+
+
+def load_df(csv_path=filename):
+    """Features of the scraped CSV, loaded on first use (not at import) and reloaded when the file changes."""
+    return _load_df(csv_path, file_version(csv_path))
+
+
+def __getattr__(name):
+    # `chat.df` stays available to callers, but is only loaded when accessed
+    if name == "df":
+        return load_df()
+    raise AttributeError(f"module {__name__!r} has no attribute {name!r}")
 
 
 
 def completion(user_query, data="aliexpress_multi_page_firefox.csv", model="llama-3.3-70b-versatile"): 
+    from groq import Groq # Deferred: the client library is only needed when a question is asked
 
+    df = load_df(data)
 
     SYSTEM_PROMPT = f"""
 You are an intelligent eCommerce analytics assistant.
@@ -19,8 +42,8 @@ You have access to a structured product dataset scraped from AliExpress. Your go
 
 Respond as if you're talking to an eCommerce entrepreneur looking for guidance.
 
-Dataset Preview:
-{df.head(20).to_markdown(index=False)}
+Dataset Preview (most attractive products first; prices in {CURRENCY}, discounts in %):
+{df.sort_values('attractiveness_score', ascending=False).head(PREVIEW_ROWS)[PREVIEW_COLUMNS].to_markdown(index=False)}
 
 User Question:
 {user_query}
@@ -1,8 +1,9 @@
 # utils/chat_shopify.py
+import functools
 import os
-from groq import Groq
 import pandas as pd
 import re # For simple query parsing
+from utils.dataset_version import file_version
 
 # --- Configuration ---
 FILENAME = "utils/products_data.csv"
@@ -15,18 +16,34 @@ if not os.environ.get("GROQ_API_KEY"):
     # exit() # You might want to exit if the key is essential for the app to run
 
 # --- 1. Load Data (Knowledge Base) ---
-df = pd.DataFrame() # Initialize df to prevent errors if loading fails
-try:
-    df = pd.read_csv(FILENAME)
-    print(f"Successfully loaded {FILENAME} with {len(df)} rows.")
-    print(f"Columns: {df.columns.tolist()}")
-except FileNotFoundError:
-    print(f"Error: The file {FILENAME} was not found. Please check the path.")
-    # Don't exit here if the app might run without it, or handle it in the app
-except pd.errors.EmptyDataError:
-    print(f"Error: The file {FILENAME} is empty.")
-except Exception as e:
-    print(f"An error occurred while loading the CSV: {e}")
+# Loaded on first use rather than at import, and reloaded when the CSV changes (keyed on its version)
+@functools.lru_cache(maxsize=2)
+def _load_df(filename, version):
+    df = pd.DataFrame() # Initialize df to prevent errors if loading fails
+    try:
+        df = pd.read_csv(filename)
+        print(f"Successfully loaded {filename} with {len(df)} rows.")
+        print(f"Columns: {df.columns.tolist()}")
+    except FileNotFoundError:
+        print(f"Error: The file {filename} was not found. Please check the path.")
+        # Don't exit here if the app might run without it, or handle it in the app
+    except pd.errors.EmptyDataError:
+        print(f"Error: The file {filename} is empty.")
+    except Exception as e:
+        print(f"An error occurred while loading the CSV: {e}")
+    return df
+
+
+def load_df(filename=FILENAME):
+    """The product knowledge base (empty DataFrame if it can't be loaded)."""
+    return _load_df(filename, file_version(filename))
+
+
+def __getattr__(name):
+    # `chat_shopify.df` stays available to callers, but is only loaded when accessed
+    if name == "df":
+        return load_df()
+    raise AttributeError(f"module {__name__!r} has no attribute {name!r}")
 
 # --- 2. Retriever Function ---
 def retrieve_relevant_products(dataframe, user_query, category=None, top_n=5):
@@ -190,6 +207,7 @@ Answer:
 """
 
     try:
+        from groq import Groq # Deferred: the client library is only needed when a question is asked
         client = Groq(api_key=os.environ.get("GROQ_API_KEY"))
         if not client.api_key:
             return "Error: GROQ_API_KEY is not configured. Cannot contact the AI model."
@@ -215,7 +233,8 @@ Answer:
 
 # --- Test the RAG system ---
 if __name__ == "__main__":
-    if 'df' in globals() and not df.empty:
+    df = load_df()
+    if not df.empty:
         print("\n--- RAG System Test ---")
         
         test_queries = [
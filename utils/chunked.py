@@ -0,0 +1,121 @@
+# utils/chunked.py
+import os
+
+import numpy as np
+import pandas as pd
+
+# --- Configuration ---
+DEFAULT_CHUNK_ROWS = 50_000  # Rows per batch; bounds the memory held by a single parsed chunk
+LARGE_FILE_BYTES = 256 * 1024 * 1024  # Above this size, pages switch to the chunked readers
+
+
+def is_large_file(path, threshold=LARGE_FILE_BYTES):
+    """True when `path` exists and is big enough that loading it whole should be avoided."""
+    return os.path.exists(path) and os.path.getsize(path) > threshold
+
+
+def iter_csv_batches(path, chunksize=DEFAULT_CHUNK_ROWS, usecols=None, dtype=None, transform=None):
+    """
+    Streams a CSV as typed DataFrame batches of at most `chunksize` rows.
+    `usecols` skips unneeded (e.g. `body_html`) columns at parse time, `dtype` fixes column types up front,
+    and `transform(batch)` is applied to every batch (cleaning, filtering) before it is yielded.
+    """
+    if usecols is not None:
+        header = pd.read_csv(path, nrows=0).columns
+        usecols = [col for col in usecols if col in header]
+        if dtype is not None:
+            dtype = {col: col_type for col, col_type in dtype.items() if col in usecols}
+    reader = pd.read_csv(path, chunksize=chunksize, usecols=usecols, dtype=dtype)
+    with reader:
+        for batch in reader:
+            yield transform(batch) if transform is not None else batch
+
+
+# --- Mergeable Aggregators (each one only holds O(bins / groups) state) ---
+class RunningStats:
+    """Count, sum, min and max of a numeric column across batches (NaN values are skipped)."""
+
+    def __init__(self):
+        self.count = 0
+        self.total = 0.0
+        self.min = np.nan
+        self.max = np.nan
+
+    def update(self, values):
+        values = pd.to_numeric(values, errors='coerce').dropna()
+        if values.empty:
+            return
+        self.count += int(values.size)
+        self.total += float(values.sum())
+        self.min = float(values.min()) if np.isnan(self.min) else min(self.min, float(values.min()))
+        self.max = float(values.max()) if np.isnan(self.max) else max(self.max, float(values.max()))
+
+    @property
+    def mean(self):
+        return self.total / self.count if self.count else np.nan
+
+
+class StreamingHistogram:
+    """Fixed-edge histogram filled batch by batch. Also gives an approximate (bin-resolution) quantile."""
+
+    def __init__(self, edges):
+        self.edges = np.asarray(edges, dtype=float)
+        self.counts = np.zeros(len(self.edges) - 1, dtype=np.int64)
+
+    def update(self, values):
+        values = pd.to_numeric(values, errors='coerce').dropna().to_numpy(dtype=float)
+        self.counts += np.histogram(values, bins=self.edges)[0]
+
+    def quantile(self, q):
+        total = self.counts.sum()
+        if total == 0:
+            return np.nan
+        cumulative = np.cumsum(self.counts)
+        bin_index = int(np.searchsorted(cumulative, q * total))
+        return float((self.edges[bin_index] + self.edges[bin_index + 1]) / 2)
+
+    def to_frame(self):
+        """Same columns as binning.binned_counts, so charts take either one."""
+        widths = np.diff(self.edges)
+        return pd.DataFrame({
+            'left': self.edges[:-1], 'right': self.edges[1:], 'center': (self.edges[:-1] + self.edges[1:]) / 2,
+            'width': widths, 'count': self.counts, 'density': self.counts / widths,
+        })
+
+
+class CountAccumulator:
+    """Summed value_counts of a column across batches (memory grows with the number of distinct values)."""
+
+    def __init__(self):
+        self.counts = pd.Series(dtype=np.int64)
+
+    def update(self, values):
+        batch_counts = values.value_counts(dropna=False)
+        self.counts = self.counts.add(batch_counts, fill_value=0).astype(np.int64)
+
+    def result(self):
+        return self.counts.sort_values(ascending=False)
+
+
+class DistinctCounter:
+    """
+    Number of distinct `value_col` per `key_col` (e.g. unique products per vendor) across batches.
+    Only the distinct (key, value) pairs are retained, never the batch rows themselves.
+    """
+
+    def __init__(self, key_col, value_col):
+        self.key_col = key_col
+        self.value_col = value_col
+        self.pairs = None
+
+    def update(self, batch):
+        pairs = batch[[self.key_col, self.value_col]].drop_duplicates()
+        self.pairs = pairs if self.pairs is None else pd.concat([self.pairs, pairs]).drop_duplicates()
+
+    def result(self):
+        if self.pairs is None:
+            return pd.Series(dtype=np.int64)
+        return self.pairs.groupby(self.key_col, observed=True)[self.value_col].nunique().sort_values(ascending=False)
+
+    def total_distinct_values(self):
+        return 0 if self.pairs is None else int(self.pairs[self.value_col].nunique())
@@ -0,0 +1,89 @@
+# utils/cleaning.py
+import hashlib
+import re
+
+import numpy as np
+import pandas as pd
+
+# --- Patterns ---
+ITEM_ID_PATTERN = r'/item/(\d+)\.html'
+NA_STRINGS = {"", "n/a", "nan", "none"}
+BESTSELLER_KEYWORDS = ["le plus vendu", "best seller", "top selling", "choix d'aliexpress", "choice"]
+
+
+# --- Helper Functions ---
+def _as_clean_strings(series):
+    """Returns the series as stripped strings, with NaN kept for missing / "N/A" values."""
+    strings = series.astype("string").str.strip()
+    return strings.mask(strings.str.lower().isin(NA_STRINGS))
+
+
+def parse_price(series):
+    """
+    Vectorized price parser. Accepts raw strings like "MAD 143.97", "1 234,50 €" or bare numbers
+    and returns a float Series (NaN when no number can be found).
+    """
+    if pd.api.types.is_numeric_dtype(series):
+        return series.astype(float)
+    strings = _as_clean_strings(series)
+    numbers = strings.str.replace(r'[^\d\.,]', '', regex=True)
+    # With both separators the right-most one is the decimal mark: "1,234.56" and "1.234,56" -> 1234.56
+    has_both = numbers.str.contains('.', regex=False) & numbers.str.contains(',', regex=False)
+    comma_last = has_both & (numbers.str.rfind(',') > numbers.str.rfind('.'))
+    numbers = numbers.where(~comma_last, numbers.str.replace('.', '', regex=False))
+    numbers = numbers.where(~has_both | comma_last, numbers.str.replace(',', '', regex=False))
+    # One separator: "143,97" -> decimal comma, "1,234" -> thousands separator
+    decimal_comma = numbers.str.contains(r',\d{1,2}$', regex=True)
+    numbers = numbers.where(~decimal_comma, numbers.str.replace(',', '.', regex=False))
+    numbers = numbers.str.replace(',', '', regex=False)
+    return pd.to_numeric(numbers, errors='coerce').astype(float)
+
+
+def parse_sales(series):
+    """
+    Vectorized sales parser ("5 000 vendus", "1k+ sold", 68). Missing or unparseable values become 0,
+    matching `clean_sales_info` in tools/machine_learning.py.
+    """
+    if pd.api.types.is_numeric_dtype(series):
+        return series.fillna(0).astype(np.int64)
+    strings = _as_clean_strings(series).str.lower()
+    digits = strings.str.replace(r'[^\d]', '', regex=True)
+    sales = pd.to_numeric(digits.mask(digits == ''), errors='coerce')
+    sales = sales.where(~strings.str.contains('k', regex=False).fillna(False), sales * 1000)
+    return sales.fillna(0).astype(np.int64)
+
+
+def item_ids(urls, names=None):
+    """
+    Canonical AliExpress item IDs taken from `/item/<id>.html` in the product URL.
+    Falls back to a short hash of the product name when the URL has no item ID.
+    """
+    ids = urls.astype("string").str.extract(ITEM_ID_PATTERN, expand=False)
+    if names is not None and ids.isna().any():
+        # Missing (NaN) names hash as "nan", as astype(str) did before pandas 3 kept NaN, so existing IDs don't change
+        fallback = names.astype("string").fillna("nan").map(lambda name: "name-" + hashlib.sha1(name.encode("utf-8")).hexdigest()[:12])
+        ids = ids.fillna(fallback)
+    return ids.astype(object)
+
+
+def parse_rating(series):
+    """Vectorized rating parser ("4,6", 4.6, "N/A") returning floats (NaN when missing)."""
+    if pd.api.types.is_numeric_dtype(series):
+        return series.astype(float)
+    strings = _as_clean_strings(series).str.replace(',', '.', regex=False)
+    return pd.to_numeric(strings, errors='coerce').astype(float)
+
+
+def parse_discount(series):
+    """Vectorized discount parser ("-50%", "30") returning the percentage as a positive float, 0 when missing."""
+    if pd.api.types.is_numeric_dtype(series):
+        return series.abs().fillna(0.0).astype(float)
+    numbers = _as_clean_strings(series).str.extract(r'(\d+\.?\d*)', expand=False)
+    return pd.to_numeric(numbers, errors='coerce').fillna(0.0).astype(float)
+
+
+def has_bestseller_badge(series):
+    """1 when the badges text mentions a bestseller / AliExpress Choice badge, else 0."""
+    pattern = "|".join(re.escape(keyword) for keyword in BESTSELLER_KEYWORDS)
+    strings = series.astype("string").str.lower()
+    return strings.str.contains(pattern, regex=True).fillna(False).astype(np.int64)
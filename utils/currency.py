@@ -0,0 +1,130 @@
+# utils/currency.py
+import functools
+import os
+import shutil
+import threading
+from datetime import date as date_cls
+
+import numpy as np
+import pandas as pd
+
+from utils.cleaning import parse_price
+from utils.dataset_version import file_version
+
+# --- Configuration ---
+PROJECT_ROOT = os.path.abspath(os.path.join(os.path.dirname(__file__), ".."))
+FX_SEED_PATH = os.path.join(os.path.dirname(__file__), "fx_rates_seed.csv")  # Shipped fallback rates
+FX_TABLE_PATH = os.path.join(PROJECT_ROOT, "data", "fx", "rates.csv")  # Local cache, refreshed from FX_API_URL
+FX_API_URL = "https://open.er-api.com/v6/latest/EUR"
+REPORTING_CURRENCY = os.environ.get("REPORTING_CURRENCY", "MAD")
+
+# Shopify's /products.json has no currency field: prices are in the store's currency
+STORE_CURRENCIES = {
+    "allbirds.com": "USD",
+    "gymshark.com": "USD",
+    "fashionnova.com": "USD",
+    "kyliecosmetics.com": "USD",
+    "rothys.com": "USD",
+    "tentree.com": "CAD",
+    "bombas.com": "USD",
+    "uk.huel.com": "GBP",
+    "stevemadden.com": "USD",
+    "silkandwillow.com": "USD",
+}
+DEFAULT_STORE_CURRENCY = "USD"
+
+CURRENCY_SYMBOLS = {"US $": "USD", "$": "USD", "€": "EUR", "£": "GBP", "¥": "CNY", "DH": "MAD"}
+CURRENCY_CODE_PATTERN = r'\b([A-Z]{3})\b'
+
+_fx_lock = threading.Lock()
+
+
+# --- FX Table ---
+def fx_table_path():
+    """The local FX table, initialized from the shipped seed the first time it's needed."""
+    with _fx_lock:
+        if not os.path.exists(FX_TABLE_PATH):
+            os.makedirs(os.path.dirname(FX_TABLE_PATH), exist_ok=True)
+            shutil.copyfile(FX_SEED_PATH, FX_TABLE_PATH)
+    return FX_TABLE_PATH
+
+
+def fx_table_version():
+    """Version token of the FX table; part of the key of anything computed with converted prices."""
+    return file_version(fx_table_path())
+
+
+@functools.lru_cache(maxsize=8)
+def _load_fx_table(version):
+    table = pd.read_csv(fx_table_path(), parse_dates=['date'])
+    return {currency: rows.sort_values('date') for currency, rows in table.groupby('currency')}
+
+
+@functools.lru_cache(maxsize=4096)
+def _per_eur(currency, on_date, version):
+    """Units of `currency` per EUR on `on_date` (latest rate on or before that date). Memoized per (currency, date)."""
+    rows = _load_fx_table(version).get(currency)
+    if rows is None or rows.empty:
+        return np.nan
+    position = rows['date'].searchsorted(pd.Timestamp(on_date), side='right') - 1
+    return float(rows['per_eur'].iloc[max(position, 0)])
+
+
+def rate(from_currency, to_currency=REPORTING_CURRENCY, on_date=None):
+    """Multiplier converting an amount in `from_currency` into `to_currency` (NaN when a rate is unknown)."""
+    on_date = on_date or date_cls.today()
+    version = fx_table_version()
+    return _per_eur(to_currency, on_date, version) / _per_eur(from_currency, on_date, version)
+
+
+def refresh_fx_rates(url=FX_API_URL):
+    """Appends today's rates from `url` to the local FX table, which gives it a new version."""
+    import requests
+
+    response = requests.get(url, timeout=30)
+    response.raise_for_status()
+    rates = response.json()["rates"]
+    today = date_cls.today().isoformat()
+    table = pd.read_csv(fx_table_path())
+    fresh = pd.DataFrame({'date': today, 'currency': list(rates), 'per_eur': list(rates.values()), 'source': url})
+    table = pd.concat([table[table['date'] != today], fresh], ignore_index=True)
+    tmp_path = f"{FX_TABLE_PATH}.tmp"
+    table.to_csv(tmp_path, index=False)
+    os.replace(tmp_path, FX_TABLE_PATH)
+    return len(fresh)
+
+
+# --- Parsing & Conversion ---
+def parse_currency(series, default=None):
+    """
+    Vectorized split of price strings into currency code and amount ("MAD 143.97" -> MAD, 143.97).
+    Strings without a recognizable code or symbol get `default`.
+    """
+    strings = series.astype("string")
+    codes = strings.str.extract(CURRENCY_CODE_PATTERN, expand=False)
+    for symbol, code in CURRENCY_SYMBOLS.items():
+        has_symbol = strings.str.contains(symbol, regex=False).fillna(False)
+        codes = codes.mask(codes.isna() & has_symbol, code)
+    codes = codes.fillna(default) if default is not None else codes
+    return pd.DataFrame({'currency': codes.astype(object), 'amount': parse_price(series)}, index=series.index)
+
+
+def convert(amounts, currencies, to_currency=REPORTING_CURRENCY, on_date=None):
+    """
+    Converts `amounts` (Series) given per-row `currencies` into `to_currency` in one vectorized pass:
+    one rate lookup per distinct currency, then a single multiply.
+    """
+    currencies = pd.Series(currencies, index=amounts.index) if np.isscalar(currencies) else currencies
+    codes, uniques = pd.factorize(currencies)
+    multipliers = np.array([rate(code, to_currency, on_date) for code in uniques] + [np.nan])
+    return amounts.astype(float) * multipliers[codes]  # code -1 (missing currency) picks the trailing NaN
+
+
+def store_currencies(domains):
+    """Store currency per Shopify row, from STORE_CURRENCIES."""
+    return domains.map(STORE_CURRENCIES).fillna(DEFAULT_STORE_CURRENCY)
+
+
+if __name__ == "__main__":
+    added = refresh_fx_rates()
+    print(f"Added {added} rates to {FX_TABLE_PATH} (version {fx_table_version()}).")
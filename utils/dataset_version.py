@@ -0,0 +1,40 @@
+# utils/dataset_version.py
+import hashlib
+import os
+
+# --- Configuration ---
+HASH_CHUNK_SIZE = 1024 * 1024  # Read files in 1 MB chunks when hashing
+TOKEN_LENGTH = 16  # Number of hex characters kept from the SHA-1 digest
+
+# abs_path -> ((mtime_ns, size), token). Lets reruns skip re-hashing unchanged files.
+_file_tokens = {}
+
+
+def file_version(path):
+    """
+    Returns a content-hash version token for the file at `path`, or None if it doesn't exist.
+    The file is only re-hashed when its modification time or size changes.
+    """
+    absolute_path = os.path.abspath(path)
+    try:
+        stat = os.stat(absolute_path)
+    except (FileNotFoundError, NotADirectoryError):
+        return None
+
+    signature = (stat.st_mtime_ns, stat.st_size)
+    cached = _file_tokens.get(absolute_path)
+    if cached is not None and cached[0] == signature:
+        return cached[1]
+
+    digest = hashlib.sha1()
+    with open(absolute_path, "rb") as f:
+        for chunk in iter(lambda: f.read(HASH_CHUNK_SIZE), b""):
+            digest.update(chunk)
+    token = digest.hexdigest()[:TOKEN_LENGTH]
+    _file_tokens[absolute_path] = (signature, token)
+    return token
+
+
+def bytes_version(data):
+    """Returns a version token for in-memory content (e.g. an uploaded file)."""
+    return hashlib.sha1(data).hexdigest()[:TOKEN_LENGTH]
@@ -0,0 +1,299 @@
+# utils/feature_store.py
+import glob
+import os
+
+import numpy as np
+import pandas as pd
+
+from utils.cleaning import (
+    has_bestseller_badge, item_ids, parse_discount, parse_rating, parse_sales,
+)
+from utils.binning import bin_edges
+from utils.chunked import CountAccumulator, RunningStats, StreamingHistogram, is_large_file, iter_csv_batches
+from utils.currency import convert, fx_table_version, parse_currency
+from utils.dataset_version import bytes_version, file_version
+
+# --- Configuration ---
+PROJECT_ROOT = os.path.abspath(os.path.join(os.path.dirname(__file__), ".."))
+FEATURES_DIR = os.path.join(PROJECT_ROOT, "data", "features")
+MAX_STORED_VERSIONS = 8  # Older feature files are pruned when a new version is materialized
+SCORE_COLUMN = 'attractiveness_proba'  # Classifier output, stored per (dataset version, model) next to the features
+RANK_COLUMN = 'rank_score'  # Learning-to-rank output, stored the same way (see utils.ranking)
+SCORE_FILE_PREFIXES = {SCORE_COLUMN: "attractiveness", RANK_COLUMN: "ranking"}
+SOURCE_CURRENCY = "MAD"  # Currency assumed for AliExpress prices that carry no currency code
+
+# Heuristic attractiveness scoring parameters (used as the classifier's target)
+SALES_THRESHOLD_LOW = 500
+SALES_THRESHOLD_HIGH = 2000
+RATING_THRESHOLD_GOOD = 4.0
+RATING_THRESHOLD_EXCELLENT = 4.5
+ATTRACTIVENESS_SCORE_THRESHOLD = 3  # Product needs at least this score to be "attractive"
+
+# Raw columns carried alongside the features so readers don't need the CSV for display
+DESCRIPTIVE_COLUMNS = ['name', 'url', 'image_url', 'additional_badges', 'page_number']
+FEATURE_COLUMNS = [
+    'price_numeric', 'original_price_numeric', 'rating_numeric', 'sales_numeric',
+    'discount_percentage_numeric', 'has_bestseller_badge', 'attractiveness_score',
+]
+
+
+# --- Feature Engineering ---
+def _clean_columns(df_raw):
+    """Row-wise cleaning of one raw frame or batch (everything that doesn't need dataset-wide statistics)."""
+    def column(name):
+        return df_raw[name] if name in df_raw.columns else pd.Series(np.nan, index=df_raw.index, dtype=object)
+
+    features = pd.DataFrame(index=df_raw.index)
+    features['item_id'] = item_ids(column('url'), column('name'))
+    for col in DESCRIPTIVE_COLUMNS:
+        features[col] = column(col)
+
+    # Prices are stored in the reporting currency; the scraped currency code is kept alongside
+    price = parse_currency(column('price'), default=SOURCE_CURRENCY)
+    original_price = parse_currency(column('original_price'), default=SOURCE_CURRENCY)
+    features['currency'] = price['currency']
+    features['price_numeric'] = convert(price['amount'], price['currency'])
+    features['original_price_numeric'] = convert(original_price['amount'], original_price['currency'])
+    features['rating_numeric'] = parse_rating(column('rating'))
+    features['sales_numeric'] = parse_sales(column('sales_info'))
+    features['has_bestseller_badge'] = has_bestseller_badge(column('additional_badges'))
+
+    # Scraped discount when present, otherwise derived from the original price
+    discount = parse_discount(column('discount_percentage'))
+    derived_discount = np.where(
+        (features['original_price_numeric'] > features['price_numeric']) & (features['original_price_numeric'] > 0),
+        (features['original_price_numeric'] - features['price_numeric']) / features['original_price_numeric'] * 100,
+        0.0,
+    )
+    features['discount_percentage_numeric'] = discount.where(discount > 0, derived_discount)
+    return features
+
+
+def attractiveness_scores(features, median_rating=None):
+    """
+    Heuristic attractiveness score (the classifier's target); missing ratings count as the median rating
+    (of `features`, unless the dataset-wide `median_rating` is given, e.g. from a chunked read).
+    """
+    if median_rating is None:
+        median_rating = features['rating_numeric'].median()
+    rating_for_score = features['rating_numeric'].fillna(median_rating)
+    return (
+        (features['sales_numeric'] > SALES_THRESHOLD_LOW).astype(int)
+        + (features['sales_numeric'] > SALES_THRESHOLD_HIGH).astype(int)
+        + (rating_for_score > RATING_THRESHOLD_GOOD).astype(int)
+        + (rating_for_score > RATING_THRESHOLD_EXCELLENT).astype(int)
+        + (features['has_bestseller_badge'] == 1).astype(int) * 2
+    )
+
+
+def _finalize(features, median_rating=None):
+    """Dataset-wide steps: the attractiveness score (median rating imputation) and one row per item_id."""
+    features['attractiveness_score'] = attractiveness_scores(features, median_rating)
+
+    features = features.drop_duplicates(subset='item_id', keep='first')  # Keep the best-ranked card
+    return features.set_index('item_id')
+
+
+def build_row_features(df_raw):
+    """
+    Row-wise features of raw scraped rows, in the same order and without deduplication (e.g. for online
+    predictions). The attractiveness score needs dataset-wide statistics, so it is not computed.
+    """
+    return _clean_columns(df_raw)
+
+
+def build_features(df_raw):
+    """
+    Cleans the raw AliExpress scrape into numeric feature columns, one row per item_id.
+    Missing values are kept as NaN; only the heuristic attractiveness score imputes ratings.
+    """
+    return _finalize(_clean_columns(df_raw))
+
+
+def _median_from_counts(counts):
+    """Exact median of the values a value -> count Series describes (same as Series.median on the values)."""
+    counts = counts.sort_index()
+    total = int(counts.sum())
+    if total == 0:
+        return np.nan
+    cumulative = counts.cumsum().to_numpy()
+    values = counts.index.to_numpy(dtype=float)
+    lower = values[np.searchsorted(cumulative, (total - 1) // 2 + 1)]
+    upper = values[np.searchsorted(cumulative, total // 2 + 1)]
+    return float((lower + upper) / 2)
+
+
+def iter_deduplicated_batches(batches, rating_counts=None):
+    """
+    Cleaned batches with the rows of already-seen item_ids dropped (the first, best-ranked card is kept,
+    as in build_features). Only the seen item_ids are retained across batches, not the rows.
+    `rating_counts` (a CountAccumulator) receives every row's rating before deduplication.
+    """
+    seen = set()
+    for batch in batches:
+        cleaned = _clean_columns(batch)
+        if rating_counts is not None:
+            rating_counts.update(cleaned['rating_numeric'].dropna())
+        cleaned = cleaned.drop_duplicates(subset='item_id', keep='first')
+        cleaned = cleaned[~cleaned['item_id'].isin(seen)]
+        seen.update(cleaned['item_id'])
+        yield cleaned
+
+
+def build_features_from_batches(batches):
+    """
+    Same as build_features, but only one raw batch is held in memory at a time: duplicate cards are
+    dropped batch by batch, and the median rating comes from per-value counts (ratings have few distinct values).
+    """
+    rating_counts = CountAccumulator()
+    deduplicated = list(iter_deduplicated_batches(batches, rating_counts))
+    if not deduplicated:
+        return build_features(pd.DataFrame())
+    return _finalize(pd.concat(deduplicated, ignore_index=True), _median_from_counts(rating_counts.result()))
+
+
+# --- Storage ---
+def feature_path(version):
+    # Converted prices depend on the FX table too, so its version is part of the file key
+    return os.path.join(FEATURES_DIR, f"aliexpress-{version}-fx{fx_table_version()}.parquet")
+
+
+def features_version(version):
+    """Dataset version models are registered under: the raw CSV's version combined with the FX table's."""
+    return None if version is None else bytes_version(f"{version}-fx{fx_table_version()}".encode("utf-8"))
+
+
+def _prune_old_versions(keep_path, pattern="aliexpress-*.parquet"):
+    stored = sorted(glob.glob(os.path.join(FEATURES_DIR, pattern)), key=os.path.getmtime, reverse=True)
+    for path in stored[MAX_STORED_VERSIONS:]:
+        if path != keep_path:
+            os.remove(path)
+
+
+def write_features(features, version):
+    """Writes a feature frame for `version` atomically."""
+    os.makedirs(FEATURES_DIR, exist_ok=True)
+    path = feature_path(version)
+    tmp_path = f"{path}.tmp"
+    features.to_parquet(tmp_path)
+    os.replace(tmp_path, path)
+    _prune_old_versions(path)
+
+
+def load_features(version, load_raw):
+    """
+    Returns the materialized features for a dataset version.
+    `load_raw` is only called (and the raw strings only parsed) when this version isn't stored yet.
+    """
+    path = feature_path(version)
+    if os.path.exists(path):
+        return pd.read_parquet(path)
+    features = build_features(load_raw())
+    write_features(features, version)
+    return features
+
+
+def load_features_for_csv(csv_path):
+    """
+    Feature store lookup for a scraped CSV; returns None if the file doesn't exist.
+    Large files are materialized from chunked reads instead of a single pd.read_csv.
+    """
+    version = file_version(csv_path)
+    if version is None:
+        return None
+    path = feature_path(version)
+    if os.path.exists(path):
+        return pd.read_parquet(path)
+    if is_large_file(csv_path):
+        features = build_features_from_batches(iter_csv_batches(csv_path))
+    else:
+        features = build_features(pd.read_csv(csv_path))
+    write_features(features, version)
+    return features
+
+
+# --- Out-of-Core Summaries ---
+class FeatureSummary:
+    """
+    Dashboard KPIs (products, mean price and rating, total sales) and fixed-edge price / rating histograms
+    of deduplicated feature batches, with the dashboard filters applied batch by batch: missing prices pass
+    the price range, missing ratings count as 0, unscored items only pass when `min_proba` is 0.
+    """
+
+    def __init__(self, price_range, rating_threshold=0.0, min_proba=0.0, scores=None, price_bins=30, rating_bins=10):
+        self.price_range = price_range
+        self.rating_threshold = rating_threshold
+        self.min_proba = min_proba
+        self.scores = scores
+        self.products = 0
+        self.price = RunningStats()
+        self.rating = RunningStats()
+        self.sales = RunningStats()
+        self.price_histogram = StreamingHistogram(bin_edges([], price_bins, value_range=price_range))
+        self.rating_histogram = StreamingHistogram(bin_edges([], rating_bins, value_range=(0, 5)))
+
+    def update(self, features):
+        price = features['price_numeric']
+        keep = price.isna() | price.between(*self.price_range)
+        keep &= features['rating_numeric'].fillna(0) >= self.rating_threshold
+        if self.min_proba > 0:
+            proba = features['item_id'].map(self.scores) if self.scores is not None else pd.Series(np.nan, index=features.index)
+            keep &= proba >= self.min_proba
+        kept = features[keep]
+        self.products += len(kept)
+        self.price.update(kept['price_numeric'])
+        self.rating.update(kept['rating_numeric'])
+        self.sales.update(kept['sales_numeric'])
+        self.price_histogram.update(kept['price_numeric'])
+        self.rating_histogram.update(kept['rating_numeric'])
+        return self
+
+    def result(self):
+        return {
+            'products': self.products,
+            'average_price': self.price.mean,
+            'average_rating': self.rating.mean,
+            'total_sales': self.sales.total,
+            'price_histogram': self.price_histogram.to_frame(),
+            'rating_histogram': self.rating_histogram.to_frame(),
+        }
+
+
+def summarize_csv(csv_path, price_range, rating_threshold=0.0, min_proba=0.0, scores=None, chunksize=None):
+    """FeatureSummary of a scraped CSV in one chunked pass: memory is bounded by the batch size and the distinct item_ids."""
+    summary = FeatureSummary(price_range, rating_threshold, min_proba, scores)
+    kwargs = {} if chunksize is None else {'chunksize': chunksize}
+    for features in iter_deduplicated_batches(iter_csv_batches(csv_path, **kwargs)):
+        summary.update(features)
+    return summary.result()
+
+
+# --- Model Scores ---
+def scores_path(version, model_key, column=SCORE_COLUMN):
+    # Scores depend on the features (dataset + FX versions) and on the model that produced them
+    return os.path.join(FEATURES_DIR, f"{SCORE_FILE_PREFIXES[column]}-{version}-fx{fx_table_version()}-{model_key}.parquet")
+
+
+def write_scores(scores, version, model_key, column=SCORE_COLUMN):
+    """Stores a model output `column` (a Series indexed by item_id) for a dataset version and a model."""
+    os.makedirs(FEATURES_DIR, exist_ok=True)
+    path = scores_path(version, model_key, column)
+    tmp_path = f"{path}.tmp"
+    scores.rename(column).to_frame().to_parquet(tmp_path)
+    os.replace(tmp_path, path)
+    _prune_old_versions(path, pattern=f"{SCORE_FILE_PREFIXES[column]}-*.parquet")
+
+
+def scores_version(version, model_key, column=SCORE_COLUMN):
+    """Content token of the stored scores (None if absent), so caches reload after a new scoring run."""
+    return file_version(scores_path(version, model_key, column)) if model_key is not None else None
+
+
+def load_scores(version, model_key, column=SCORE_COLUMN):
+    """Stored `column` Series (indexed by item_id), or None if this version wasn't scored by that model."""
+    if model_key is None:
+        return None
+    path = scores_path(version, model_key, column)
+    if not os.path.exists(path):
+        return None
+    return pd.read_parquet(path)[column]
@@ -0,0 +1,112 @@
+# utils/images.py
+import hashlib
+import io
+import os
+import threading
+import time
+from concurrent.futures import ThreadPoolExecutor
+
+import requests
+from PIL import Image
+
+# --- Configuration ---
+PROJECT_ROOT = os.path.abspath(os.path.join(os.path.dirname(__file__), ".."))
+THUMBNAIL_DIR = os.path.join(PROJECT_ROOT, "data", "thumbnails")
+THUMBNAIL_SIZE = (240, 240)  # Cards display images at ~150-300 px
+THUMBNAIL_QUALITY = 80
+MAX_CACHE_BYTES = int(os.environ.get("THUMBNAIL_CACHE_MB", 200)) * 1024 * 1024
+MAX_DOWNLOAD_WORKERS = 8  # Concurrent downloads per prefetch, so a page of cards doesn't hammer the CDN
+DOWNLOAD_TIMEOUT = 10  # seconds
+FAILURE_RETRY_SECONDS = 600  # A failed URL isn't retried on every rerun
+AVIF_SUFFIX = "_.avif"  # AliExpress CDN: "<name>.jpg_480x480q75.jpg_.avif" is also served as plain JPEG without it
+
+_session = requests.Session()
+_session.headers.update({"User-Agent": "Mozilla/5.0"})
+_evict_lock = threading.Lock()
+_failed_at = {}  # remote URL -> time of the last failed download
+
+
+# --- URLs & Paths ---
+def source_url(url):
+    """URL actually downloaded: protocol-relative URLs get https, AliExpress AVIF variants fall back to their JPEG."""
+    if not isinstance(url, str) or not url.strip():
+        return None
+    url = url.strip()
+    if url.startswith("//"):
+        url = "https:" + url
+    if url.endswith(AVIF_SUFFIX):
+        url = url[:-len(AVIF_SUFFIX)]
+    return url if url.startswith("http") else None
+
+
+def thumbnail_path(url):
+    key = hashlib.sha1(url.encode("utf-8")).hexdigest()[:20]
+    return os.path.join(THUMBNAIL_DIR, key[:2], f"{key}.jpg")
+
+
+# --- Fetching ---
+def fetch_thumbnail(url):
+    """
+    Local path of the downscaled JPEG thumbnail for `url`, downloading it on a cache miss.
+    Returns None when the image can't be fetched or decoded (callers fall back to the remote URL or a placeholder).
+    """
+    remote_url = source_url(url)
+    if remote_url is None:
+        return None
+    path = thumbnail_path(remote_url)
+    if os.path.exists(path):
+        os.utime(path)  # Recency for LRU eviction
+        return path
+    if time.time() - _failed_at.get(remote_url, 0) < FAILURE_RETRY_SECONDS:
+        return None
+    try:
+        response = _session.get(remote_url, timeout=DOWNLOAD_TIMEOUT)
+        response.raise_for_status()
+        image = Image.open(io.BytesIO(response.content))
+        image.thumbnail(THUMBNAIL_SIZE)
+        os.makedirs(os.path.dirname(path), exist_ok=True)
+        tmp_path = f"{path}.{threading.get_ident()}.tmp"
+        image.convert("RGB").save(tmp_path, format="JPEG", quality=THUMBNAIL_QUALITY, optimize=True)
+        os.replace(tmp_path, path)
+        return path
+    except Exception as e:
+        _failed_at[remote_url] = time.time()
+        print(f"Thumbnail unavailable for {remote_url}: {e}")
+        return None
+
+
+def prefetch(urls, max_workers=MAX_DOWNLOAD_WORKERS):
+    """
+    Thumbnails for `urls` fetched concurrently (at most `max_workers` downloads in flight).
+    Returns {url: local path or None}; the cache is trimmed back under MAX_CACHE_BYTES afterwards.
+    """
+    unique_urls = list(dict.fromkeys(url for url in urls if isinstance(url, str)))
+    if not unique_urls:
+        return {}
+    remote_urls = [source_url(url) for url in unique_urls]
+    downloads = sum(1 for url in remote_urls if url is not None and not os.path.exists(thumbnail_path(url)))
+    with ThreadPoolExecutor(max_workers=max_workers) as executor:
+        paths = dict(zip(unique_urls, executor.map(fetch_thumbnail, unique_urls)))
+    if downloads:  # Only a download can grow the cache
+        evict()
+    return paths
+
+
+# --- Cache Size ---
+def evict(max_bytes=MAX_CACHE_BYTES):
+    """Deletes least recently used thumbnails until the cache is at most `max_bytes`. Returns bytes freed."""
+    with _evict_lock:
+        entries = []
+        for root, _, files in os.walk(THUMBNAIL_DIR):
+            for name in files:
+                if name.endswith(".jpg"):
+                    stat = os.stat(os.path.join(root, name))
+                    entries.append((stat.st_mtime, stat.st_size, os.path.join(root, name)))
+        total = sum(size for _, size, _ in entries)
+        freed = 0
+        for _, size, path in sorted(entries):
+            if total - freed <= max_bytes:
+                break
+            os.remove(path)
+            freed += size
+        return freed
@@ -0,0 +1,85 @@
+# utils/import_profile.py
+"""
+Import-time report for the Streamlit entry point and pages, based on `python -X importtime`.
+Each target's top-level imports run in a fresh interpreter, so every number is a cold start.
+
+    python utils/import_profile.py                      # main.py and every page under tools/
+    python utils/import_profile.py tools/shopify.py --top 15
+"""
+import argparse
+import ast
+import glob
+import os
+import re
+import subprocess
+import sys
+
+# --- Configuration ---
+PROJECT_ROOT = os.path.abspath(os.path.join(os.path.dirname(__file__), ".."))
+DEFAULT_TARGETS = ["main.py"] + sorted(
+    os.path.relpath(path, PROJECT_ROOT) for path in glob.glob(os.path.join(PROJECT_ROOT, "tools", "*.py")))
+IMPORTTIME_LINE = re.compile(r"import time:\s+(\d+) \|\s+(\d+) \|( *)(\S+)")
+
+
+def top_level_imports(path):
+    """Modules imported at module level by `path` (imports inside functions are deferred, so not counted)."""
+    with open(os.path.join(PROJECT_ROOT, path), encoding="utf-8") as f:
+        tree = ast.parse(f.read(), filename=path)
+    modules = []
+    for node in tree.body:
+        if isinstance(node, ast.Import):
+            modules.extend(alias.name for alias in node.names)
+        elif isinstance(node, ast.ImportFrom) and node.module and node.level == 0:
+            modules.append(node.module)
+    return list(dict.fromkeys(modules))
+
+
+def profile_imports(modules):
+    """
+    Runs `import <modules>` under -X importtime in a fresh interpreter.
+    Returns a list of (module, self_us, cumulative_us, depth) in import order.
+    """
+    env = dict(os.environ, PYTHONPATH=PROJECT_ROOT)
+    code = "; ".join(f"import {module}" for module in modules) or "pass"
+    result = subprocess.run(
+        [sys.executable, "-X", "importtime", "-c", code],
+        cwd=PROJECT_ROOT, env=env, capture_output=True, text=True,
+    )
+    entries = []
+    for line in result.stderr.splitlines():
+        match = IMPORTTIME_LINE.search(line)
+        if match:
+            self_us, cumulative_us, indent, module = match.groups()
+            entries.append((module, int(self_us), int(cumulative_us), (len(indent) - 1) // 2))
+    if result.returncode != 0:
+        print(f"Warning: importing {modules} failed:\n{result.stderr.splitlines()[-1] if result.stderr else ''}")
+    return entries
+
+
+def report(targets, top=10):
+    """Markdown report: total cold import time per target, then its slowest top-level imports."""
+    lines = ["| Target | Cold import time (ms) |", "|---|---:|"]
+    details = []
+    for target in targets:
+        entries = profile_imports(top_level_imports(target))
+        roots = [entry for entry in entries if entry[3] == 0]
+        total_ms = sum(cumulative for _, _, cumulative, _ in roots) / 1000
+        lines.append(f"| `{target}` | {total_ms:,.0f} |")
+        details.append(f"\n### `{target}`\n\n| Module | Cumulative (ms) | Self (ms) |\n|---|---:|---:|")
+        for module, self_us, cumulative_us, _ in sorted(roots, key=lambda entry: -entry[2])[:top]:
+            details.append(f"| `{module}` | {cumulative_us / 1000:,.1f} | {self_us / 1000:,.1f} |")
+    return "\n".join(lines + details)
+
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser(description=__doc__.strip().splitlines()[0])
+    parser.add_argument("targets", nargs="*", default=DEFAULT_TARGETS, help="Python files, relative to the project root")
+    parser.add_argument("--top", type=int, default=10, help="Slowest top-level imports listed per target")
+    parser.add_argument("--output", help="Also write the report to this file")
+    args = parser.parse_args()
+
+    markdown = report(args.targets, top=args.top)
+    print(markdown)
+    if args.output:
+        with open(args.output, "w", encoding="utf-8") as f:
+            f.write(markdown + "\n")
@@ -0,0 +1,222 @@
+# utils/incremental_training.py
+import argparse
+import math
+import os
+import time
+
+import numpy as np
+import pandas as pd
+
+import utils.feature_store as feature_store
+import utils.model_registry as model_registry
+from utils.batch_scoring import fill_values
+from utils.dataset_version import file_version
+from utils.model_search import BASELINE, FEATURES, training_data
+
+# --- Configuration ---
+HOLDOUT_PERCENT = 25  # Stable per-item evaluation split (same share as the app's test_size=0.25)
+MAX_TREES_FACTOR = 4  # Past n_estimators * this, an update is replaced by a full retrain (drops stale trees)
+REPLAY_FACTOR = 2  # Already-seen rows replayed per new row when fitting the added trees
+ESTIMATOR = 'RandomForestClassifier'  # Trees are added with warm_start, so the model stays a plain forest
+
+
+# --- Rows and Ledger ---
+def row_hashes(X, y):
+    """
+    uint64 hash of every training row: item_id (the index), input values and label. A product whose
+    price or sales changed between scrapes hashes differently, so it counts as a new row.
+    """
+    return pd.util.hash_pandas_object(pd.concat([X, y.rename('__label__')], axis=1), index=True).to_numpy(np.uint64)
+
+
+def holdout_mask(item_ids):
+    """
+    True for the items kept out of training. Decided by the item_id alone, so an item stays on the same
+    side of the split in every dataset version and incremental updates never train on evaluation rows.
+    """
+    hashes = pd.util.hash_pandas_object(pd.Index(item_ids).astype(str), index=False).to_numpy(np.uint64)
+    return hashes % 100 < HOLDOUT_PERCENT
+
+
+def evaluate(model, X, y):
+    from sklearn.metrics import accuracy_score, classification_report, f1_score
+
+    if len(X) == 0:
+        return {'accuracy': None, 'f1': None, 'report': None}
+    y_pred = model.predict(X)
+    return {
+        'accuracy': accuracy_score(y, y_pred), 'f1': f1_score(y, y_pred, zero_division=0),
+        'report': classification_report(y, y_pred, output_dict=True, zero_division=0),
+    }
+
+
+# --- Training ---
+def fit_full(X, y, params, n_jobs=-1):
+    """Forest fitted on every row, and its ledger (the hashes of those rows)."""
+    from sklearn.ensemble import RandomForestClassifier
+
+    if y.nunique() < 2:
+        raise ValueError(f"Full training needs both classes, got {y.value_counts().to_dict()}")
+    model = RandomForestClassifier(**params, n_jobs=n_jobs).fit(X, y)
+    return model, row_hashes(X, y)
+
+
+def fit_delta(model, seen, X, y, base_n_estimators):
+    """
+    Adds trees (warm_start, in place) fitted on the rows of (X, y) that are not in the ledger `seen`,
+    plus a replay sample of already-seen rows (REPLAY_FACTOR times the delta) so the new trees don't
+    learn from one page alone; the cost stays proportional to the delta. New trees get the delta's
+    share of the forest: n_estimators * delta / seen rows, at least one, so a one-page scrape doesn't
+    outweigh the catalog. Returns (updated ledger, delta rows, trees added).
+
+    If even with the replay rows only one class is present, nothing is fitted (the forest would lose
+    a class): the delta stays out of the ledger and is picked up with the next one.
+    """
+    from sklearn.utils.class_weight import compute_class_weight
+
+    hashes = row_hashes(X, y)
+    new = np.isin(hashes, seen, invert=True)
+    n_delta = int(new.sum())
+    if n_delta == 0:
+        return seen, 0, 0
+    seen_rows = np.flatnonzero(~new)
+    rng = np.random.default_rng(len(seen))
+    replay = rng.choice(seen_rows, size=min(len(seen_rows), REPLAY_FACTOR * n_delta), replace=False)
+    rows = np.concatenate([np.flatnonzero(new), replay])
+    if y.iloc[rows].nunique() < 2:
+        return seen, n_delta, 0
+
+    n_trees = max(1, math.ceil(base_n_estimators * n_delta / max(len(seen), 1)))
+    class_weight = model.class_weight
+    if class_weight == 'balanced':
+        # "balanced" on the fitted rows alone would weight by the delta's class mix, not the catalog's
+        weights = compute_class_weight('balanced', classes=model.classes_, y=y)
+        model.set_params(class_weight=dict(zip(model.classes_, weights)))
+    model.set_params(warm_start=True, n_estimators=len(model.estimators_) + n_trees)
+    model.fit(X.iloc[rows], y.iloc[rows])
+    model.set_params(warm_start=False, class_weight=class_weight)
+    return np.union1d(seen, hashes[new]), n_delta, n_trees
+
+
+def update(model, seen, X, y, params, n_jobs=-1):
+    """
+    fit_delta on an existing forest, or a full fit when there is none yet or it has grown past
+    MAX_TREES_FACTOR * n_estimators (the compaction drops trees of stale observations).
+    Returns (model, ledger, info).
+    """
+    if model is not None and len(model.estimators_) < params['n_estimators'] * MAX_TREES_FACTOR:
+        seen, n_delta, n_trees = fit_delta(model, seen, X, y, params['n_estimators'])
+        return model, seen, {'mode': 'incremental', 'delta_rows': n_delta, 'trees_added': n_trees}
+    model, seen = fit_full(X, y, params, n_jobs)
+    return model, seen, {'mode': 'full', 'delta_rows': len(X), 'trees_added': params['n_estimators']}
+
+
+# --- Registry ---
+def incremental_base(features, params):
+    """Metadata of the newest registry model that can be updated for `features`/`params`, or None."""
+    for meta in [model_registry.current()] + model_registry.list_models():
+        if (meta and meta['estimator'] == ESTIMATOR and meta['features'] == list(features)
+                and meta.get('incremental', {}).get('base_params') == params
+                and model_registry.load_seen_rows(meta['key']) is not None):
+            return meta
+    return None
+
+
+def refresh(X, y, dataset_version, features, params, fills=None, n_jobs=-1, log=print):
+    """
+    Brings the forest up to date with a dataset version and publishes it as the current model.
+    If an updatable model exists, only the rows its ledger hasn't seen are fitted; otherwise (or once the
+    forest has grown past MAX_TREES_FACTOR * n_estimators) the forest is retrained on every row.
+    When the ledger has already seen every row, the base model is returned as is, without publishing.
+    Evaluation uses the item-stable holdout, which is never trained on. Returns (model, metadata).
+    """
+    holdout = holdout_mask(X.index)
+    X_train, y_train, X_test, y_test = X[~holdout], y[~holdout], X[holdout], y[holdout]
+    start = time.perf_counter()
+
+    base = incremental_base(features, params)
+    model, seen = None, None
+    if base is not None:
+        model, base = model_registry.load(base['key'])  # A fresh copy: cached models are shared read-only
+        seen = model_registry.load_seen_rows(base['key'])
+    model, seen, info = update(model, seen, X_train, y_train, params, n_jobs)
+    if info['mode'] == 'incremental' and info['delta_rows'] == 0:
+        # Nothing new since the base forest: publishing would only add an identical model under another key
+        log(f"no new rows since {base['key']}; keeping it")
+        return model, base
+    if info['mode'] == 'incremental':
+        info.update({'parent': base['key'], 'updates': base['incremental'].get('updates', 0) + 1})
+    else:
+        info['updates'] = 0
+    seconds = time.perf_counter() - start
+
+    metrics = {**evaluate(model, X_test, y_test), 'n_samples': len(X), 'holdout_rows': len(X_test)}
+    info.update({'base_params': params, 'fit_seconds': seconds, 'seen_rows': len(seen), 'n_trees': len(model.estimators_)})
+    # The key includes the lineage, so an updated forest never collides with a full retrain of the same data
+    key_params = {**params, 'incremental_from': info.get('parent'), 'n_trees': len(model.estimators_)}
+    meta = model_registry.publish(model, dataset_version, features, key_params, metrics=metrics, estimator=ESTIMATOR,
+                                  extra={'fill_values': fills or {}, 'incremental': info}, seen_rows=seen)
+    log(f"{info['mode']} fit of {info['delta_rows']} rows, {info['trees_added']} trees ({info['n_trees']} total) "
+        f"in {seconds:.2f} s; published {meta['key']}")
+    return model, meta
+
+
+# --- Incremental vs Full Retrain ---
+def compare(X, y, pages, params, n_jobs=-1, log=print):
+    """
+    Replays a scrape page by page: after each page arrives, the forest is updated from that page (update)
+    and, separately, retrained on everything seen so far. Both are scored on the same fixed holdout
+    (all pages). Returns one row per (page, strategy).
+    """
+    holdout = holdout_mask(X.index)
+    X_test, y_test = X[holdout], y[holdout]
+    rows, model, seen = [], None, None
+    for page in sorted(pages.unique()):
+        arrived = (~holdout) & (pages <= page).to_numpy()
+        X_seen, y_seen = X[arrived], y[arrived]
+        if y_seen.nunique() < 2:
+            continue  # Not trainable yet: wait for the first page with both classes
+        start = time.perf_counter()
+        full_model, _ = fit_full(X_seen, y_seen, params, n_jobs)
+        full_seconds = time.perf_counter() - start
+        rows.append({'page': page, 'strategy': 'full', 'fit': 'full', 'rows_fitted': len(X_seen),
+                     'trees': len(full_model.estimators_), 'fit_seconds': full_seconds, **evaluate(full_model, X_test, y_test)})
+
+        start = time.perf_counter()
+        model, seen, info = update(model, seen, X_seen, y_seen, params, n_jobs)
+        rows.append({'page': page, 'strategy': 'incremental', 'fit': info['mode'], 'rows_fitted': info['delta_rows'],
+                     'trees': len(model.estimators_), 'fit_seconds': time.perf_counter() - start, **evaluate(model, X_test, y_test)})
+        log(f"page {page}: full {rows[-2]['fit_seconds']:.2f} s f1 {rows[-2]['f1']:.3f} | "
+            f"incremental {rows[-1]['fit_seconds']:.2f} s f1 {rows[-1]['f1']:.3f}")
+    return pd.DataFrame(rows).drop(columns='report')
+
+
+if __name__ == "__main__":
+    from utils.model_benchmark import synthetic_features
+
+    parser = argparse.ArgumentParser(description="Incremental (warm-start) forest updates vs full retrains, page by page")
+    parser.add_argument("csv_path", nargs="?", default=os.path.join(feature_store.PROJECT_ROOT, "aliexpress_multi_page_firefox.csv"))
+    parser.add_argument("--synthetic", type=int, metavar="N_ROWS", help="Replay a synthetic catalog instead of the CSV")
+    parser.add_argument("--pages", type=int, default=20, help="Pages of the synthetic catalog (default: %(default)s)")
+    parser.add_argument("--publish", action="store_true", help="Refresh the registry's model from the CSV instead")
+    parser.add_argument("--output", help="Write the comparison table to this CSV")
+    args = parser.parse_args()
+    params = BASELINE[1]
+
+    if args.synthetic:
+        features = synthetic_features(args.synthetic)
+        features.index = features.index.astype(str).rename('item_id')
+        features['page_number'] = np.arange(len(features)) * args.pages // len(features) + 1
+    else:
+        features = feature_store.load_features_for_csv(args.csv_path)
+        if features is None:
+            parser.error(f"{args.csv_path} not found")
+    X, y = training_data(features)
+
+    if args.publish:
+        refresh(X, y, feature_store.features_version(file_version(args.csv_path)), FEATURES, params, fill_values(features))
+    else:
+        table = compare(X, y, features['page_number'], params)
+        if args.output:
+            table.to_csv(args.output, index=False)
+        print(table.to_string(index=False, float_format=lambda value: f"{value:.3f}"))
@@ -0,0 +1,293 @@
+# utils/inference_server.py
+import argparse
+import json
+import os
+import queue
+import subprocess
+import sys
+import threading
+import time
+import urllib.error
+import urllib.request
+from concurrent.futures import Future
+from http.server import BaseHTTPRequestHandler, ThreadingHTTPServer
+
+import numpy as np
+import pandas as pd
+
+import utils.feature_store as feature_store
+import utils.model_registry as model_registry
+import utils.tree_engine as tree_engine
+from utils.batch_scoring import model_inputs, positive_proba
+
+# --- Configuration ---
+HOST = "127.0.0.1"
+PORT = int(os.environ.get("INFERENCE_PORT", 8502))
+MAX_WAIT_MS = float(os.environ.get("INFERENCE_MAX_WAIT_MS", 5))  # How long the first request of a batch waits for company
+MAX_BATCH_ROWS = 512  # A batch is cut early at this many rows (the tree engine's sweet spot)
+MAX_REQUEST_ROWS = 10_000
+REQUEST_TIMEOUT_S = 30
+LISTEN_BACKLOG = 128  # socketserver's default of 5 drops connections (1 s SYN retries) under concurrent clients
+
+
+# --- Model ---
+class Predictor:
+    """
+    The registry model loaded once, with the recorded imputation values and, for forests, the array
+    engine. `predict(raw_rows)` takes scraper rows (price, rating, sales_info, additional_badges, ...).
+    """
+
+    def __init__(self, key=None):
+        meta = model_registry.get_meta(key) if key else model_registry.current()
+        if meta is None:
+            raise RuntimeError("The model registry has no current model: train one from the ML page first")
+        self.model, self.meta = model_registry.load(meta['key'])
+        self.engine = model_registry.load_engine(meta['key'], self.model)
+        self.features = self.meta['features']
+        self.fills = self.meta.get('fill_values') or {}
+        self.classes = list(self.model.classes_)
+
+    def inputs(self, raw_rows):
+        # Same row-wise cleaning as the feature store (currency conversion, "5 000 vendus", badges), no dedup
+        features = feature_store.build_row_features(pd.DataFrame(raw_rows))
+        return model_inputs(features, self.features, self.fills)
+
+    def predict(self, raw_rows):
+        """(P(attractive), label) per raw row."""
+        X = self.inputs(raw_rows)
+        if self.engine is not None and len(X) <= tree_engine.MAX_ENGINE_BATCH:
+            proba = self.engine.predict_proba(X)
+            positive = proba[:, self.classes.index(1)]
+            labels = np.asarray(self.classes)[proba.argmax(axis=1)]
+        else:
+            positive = positive_proba(self.model, X)
+            labels = np.where(positive > 0.5, 1, 0)  # argmax of the two class probabilities
+        return positive, labels
+
+
+# --- Micro-Batching ---
+class MicroBatcher:
+    """
+    Coalesces concurrent requests: a worker thread takes the first waiting request, then keeps
+    collecting for up to `max_wait_ms` (or until `max_batch_rows`), cleans and predicts all of their
+    rows at once and resolves each request's Future with its own slice. The vectorized cleaning has a
+    fixed cost of tens of milliseconds per call, whatever the row count, so it is paid once per batch.
+    """
+
+    def __init__(self, predictor, max_wait_ms=MAX_WAIT_MS, max_batch_rows=MAX_BATCH_ROWS):
+        self.predictor = predictor
+        self.max_wait = max_wait_ms / 1000
+        self.max_batch_rows = max_batch_rows
+        self.pending = queue.Queue()
+        self.batches = 0
+        self.rows = 0
+        threading.Thread(target=self._run, daemon=True).start()
+
+    def submit(self, raw_rows):
+        future = Future()
+        self.pending.put((raw_rows, future))
+        return future
+
+    def _collect(self):
+        batch = [self.pending.get()]
+        rows = len(batch[0][0])
+        deadline = time.perf_counter() + self.max_wait
+        while rows < self.max_batch_rows:
+            remaining = deadline - time.perf_counter()
+            try:
+                item = self.pending.get(timeout=remaining) if remaining > 0 else self.pending.get_nowait()
+            except queue.Empty:
+                break
+            batch.append(item)
+            rows += len(item[0])
+        return batch
+
+    def _run(self):
+        while True:
+            batch = self._collect()
+            try:
+                positive, labels = self.predictor.predict([row for rows, _ in batch for row in rows])
+            except Exception as e:  # Failed batch: every request in it gets the error
+                for _, future in batch:
+                    future.set_exception(e)
+                continue
+            self.batches += 1
+            self.rows += len(positive)
+            start = 0
+            for rows, future in batch:
+                future.set_result((positive[start:start + len(rows)], labels[start:start + len(rows)], len(positive)))
+                start += len(rows)
+
+
+# --- HTTP ---
+class InferenceHandler(BaseHTTPRequestHandler):
+    """POST /predict {"products": [raw rows]} (or a single raw row) -> probabilities; GET /health."""
+
+    server_version = "AttractivenessInference/1.0"
+
+    def _reply(self, status, payload):
+        body = json.dumps(payload).encode("utf-8")
+        self.send_response(status)
+        self.send_header("Content-Type", "application/json")
+        self.send_header("Content-Length", str(len(body)))
+        self.end_headers()
+        self.wfile.write(body)
+
+    def do_GET(self):
+        if self.path != "/health":
+            return self._reply(404, {"error": f"Unknown path {self.path}"})
+        batcher = self.server.batcher
+        self._reply(200, {"status": "ok", "model_key": batcher.predictor.meta['key'],
+                          "estimator": batcher.predictor.meta['estimator'], "engine": batcher.predictor.engine is not None,
+                          "batches": batcher.batches, "rows": batcher.rows})
+
+    def do_POST(self):
+        if self.path != "/predict":
+            return self._reply(404, {"error": f"Unknown path {self.path}"})
+        try:
+            payload = json.loads(self.rfile.read(int(self.headers.get("Content-Length", 0))) or b"{}")
+            rows = payload["products"] if isinstance(payload, dict) and "products" in payload else [payload]
+            if not isinstance(rows, list) or not rows or not all(isinstance(row, dict) for row in rows):
+                raise ValueError("expected a product object or {\"products\": [objects]}")
+            if len(rows) > MAX_REQUEST_ROWS:
+                raise ValueError(f"at most {MAX_REQUEST_ROWS} products per request")
+        except (ValueError, KeyError, TypeError) as e:
+            return self._reply(400, {"error": str(e)})
+        try:
+            positive, labels, batch_rows = self.server.batcher.submit(rows).result(timeout=REQUEST_TIMEOUT_S)
+        except Exception as e:
+            return self._reply(500, {"error": str(e)})
+        self._reply(200, {
+            "model_key": self.server.batcher.predictor.meta['key'], "batch_rows": batch_rows,
+            "predictions": [{feature_store.SCORE_COLUMN: float(p), "is_attractive": int(label)} for p, label in zip(positive, labels)],
+        })
+
+    def log_message(self, format, *args):
+        if self.server.verbose:
+            super().log_message(format, *args)
+
+
+class InferenceServer(ThreadingHTTPServer):
+    daemon_threads = True
+    request_queue_size = LISTEN_BACKLOG
+
+
+def make_server(host=HOST, port=PORT, max_wait_ms=MAX_WAIT_MS, max_batch_rows=MAX_BATCH_ROWS, model_key=None, verbose=False):
+    server = InferenceServer((host, port), InferenceHandler)
+    server.batcher = MicroBatcher(Predictor(model_key), max_wait_ms, max_batch_rows)
+    server.verbose = verbose
+    return server
+
+
+# --- Load Generator ---
+def sample_products(csv_path, n=1000, seed=0):
+    """Raw scraper rows (JSON-ready, NaN -> null) to replay against the service."""
+    raw = pd.read_csv(csv_path).sample(n, replace=True, random_state=seed)
+    return raw.astype(object).where(raw.notna(), None).to_dict(orient="records")
+
+
+def post_json(url, payload):
+    request = urllib.request.Request(url, data=json.dumps(payload).encode("utf-8"), headers={"Content-Type": "application/json"})
+    with urllib.request.urlopen(request, timeout=REQUEST_TIMEOUT_S) as response:
+        return json.loads(response.read())
+
+
+def load_test(url, products, concurrency=16, requests_per_client=100, rows_per_request=1):
+    """
+    `concurrency` client threads, each sending `requests_per_client` requests back to back.
+    Returns latency percentiles (ms), throughput and the mean size of the batches requests landed in.
+    """
+    latencies, batch_sizes, errors = [], [], []
+    lock = threading.Lock()
+
+    def client(index):
+        rng = np.random.default_rng(index)
+        for _ in range(requests_per_client):
+            rows = [products[i] for i in rng.integers(0, len(products), rows_per_request)]
+            start = time.perf_counter()
+            try:
+                response = post_json(url, {"products": rows})
+            except (urllib.error.URLError, OSError) as e:
+                with lock:
+                    errors.append(str(e))
+                continue
+            with lock:
+                latencies.append(time.perf_counter() - start)
+                batch_sizes.append(response["batch_rows"])
+
+    start = time.perf_counter()
+    threads = [threading.Thread(target=client, args=(index,)) for index in range(concurrency)]
+    for thread in threads:
+        thread.start()
+    for thread in threads:
+        thread.join()
+    seconds = time.perf_counter() - start
+    latencies_ms = np.array(latencies) * 1000
+    return {
+        'requests': len(latencies), 'errors': len(errors), 'seconds': seconds,
+        'requests_per_second': len(latencies) / seconds, 'rows_per_second': len(latencies) * rows_per_request / seconds,
+        'p50_ms': float(np.percentile(latencies_ms, 50)) if len(latencies) else None,
+        'p99_ms': float(np.percentile(latencies_ms, 99)) if len(latencies) else None,
+        'mean_batch_rows': float(np.mean(batch_sizes)) if batch_sizes else None,
+    }
+
+
+def wait_until_healthy(base_url, timeout_s=60):
+    deadline = time.perf_counter() + timeout_s
+    while time.perf_counter() < deadline:
+        try:
+            with urllib.request.urlopen(f"{base_url}/health", timeout=1) as response:
+                return json.loads(response.read())
+        except (urllib.error.URLError, OSError):
+            time.sleep(0.2)
+    raise RuntimeError(f"The inference service at {base_url} did not start within {timeout_s} s")
+
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser(description="Local HTTP inference service for the registry's attractiveness model")
+    subparsers = parser.add_subparsers(dest="command")
+    serve_parser = subparsers.add_parser("serve", help="Run the service (default)")
+    bench_parser = subparsers.add_parser("bench", help="Start the service in a subprocess per max-wait setting and load-test it")
+    for sub in (serve_parser, bench_parser):
+        sub.add_argument("--port", type=int, default=PORT)
+        sub.add_argument("--model-key", help="Registry key to serve (default: the current model)")
+        sub.add_argument("--max-batch-rows", type=int, default=MAX_BATCH_ROWS, help="1 disables batching (default: %(default)s)")
+    serve_parser.add_argument("--max-wait-ms", type=float, default=MAX_WAIT_MS)
+    serve_parser.add_argument("--verbose", action="store_true", help="Log every request")
+    bench_parser.add_argument("--max-wait-ms", type=float, nargs="+", default=[0.0, MAX_WAIT_MS])
+    bench_parser.add_argument("--concurrency", type=int, default=16)
+    bench_parser.add_argument("--requests", type=int, default=100, help="Requests per client (default: %(default)s)")
+    bench_parser.add_argument("--rows", type=int, default=1, help="Products per request (default: %(default)s)")
+    bench_parser.add_argument("--csv", default=os.path.join(feature_store.PROJECT_ROOT, "aliexpress_multi_page_firefox.csv"))
+    args = parser.parse_args()
+
+    if args.command == "bench":
+        base_url = f"http://{HOST}:{args.port}"
+        products = sample_products(args.csv)
+        print(f"{args.concurrency} clients x {args.requests} requests of {args.rows} product(s)")
+        for max_wait_ms in args.max_wait_ms:
+            command = [sys.executable, "-m", "utils.inference_server", "serve", "--port", str(args.port), "--max-wait-ms", str(max_wait_ms),
+                       "--max-batch-rows", str(args.max_batch_rows)]
+            if args.model_key:
+                command += ["--model-key", args.model_key]
+            service = subprocess.Popen(command, cwd=feature_store.PROJECT_ROOT)
+            try:
+                health = wait_until_healthy(base_url)
+                stats = load_test(f"{base_url}/predict", products, args.concurrency, args.requests, args.rows)
+            finally:
+                service.terminate()
+                service.wait()
+            print(f"max wait {max_wait_ms:>4} ms ({health['estimator']}, engine={health['engine']}): "
+                  f"p50 {stats['p50_ms']:.2f} ms, p99 {stats['p99_ms']:.2f} ms, {stats['requests_per_second']:,.0f} req/s, "
+                  f"{stats['rows_per_second']:,.0f} rows/s, mean batch {stats['mean_batch_rows']:.1f} rows, {stats['errors']} errors")
+    else:
+        server = make_server(port=getattr(args, "port", PORT), max_wait_ms=getattr(args, "max_wait_ms", MAX_WAIT_MS),
+                             max_batch_rows=getattr(args, "max_batch_rows", MAX_BATCH_ROWS),
+                             model_key=getattr(args, "model_key", None), verbose=getattr(args, "verbose", False))
+        meta = server.batcher.predictor.meta
+        print(f"Serving model {meta['key']} ({meta['estimator']}) on http://{HOST}:{server.server_port} "
+              f"(POST /predict, GET /health)", flush=True)
+        try:
+            server.serve_forever()
+        except KeyboardInterrupt:
+            server.server_close()
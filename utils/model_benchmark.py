@@ -0,0 +1,214 @@
+# utils/model_benchmark.py
+import argparse
+import glob
+import json
+import os
+import subprocess
+import sys
+import tempfile
+import time
+
+import numpy as np
+import pandas as pd
+
+import utils.feature_store as feature_store
+import utils.snapshots as snapshots
+from utils.model_search import FIXED_PARAMS, RANDOM_STATE, TEST_SIZE, make_estimator, training_data
+from utils.out_of_core import peak_rss_mb
+
+# --- Configuration ---
+SYNTHETIC_ROWS = [10_000, 100_000]
+LATENCY_REPEATS = 50  # One-row predict_proba calls per model; the median is reported
+THROUGHPUT_ROWS = 10_000  # The test split is resampled to this many rows for the batch throughput
+MIN_CLASS_ROWS = 2  # A dataset needs this many rows of each class to be split and scored
+
+# Model families compared, as (estimator, params) for model_search.make_estimator; the first one is the app's model
+MODELS = {
+    'random_forest': ('RandomForestClassifier', {'n_estimators': 100, **FIXED_PARAMS['RandomForestClassifier']}),
+    'hist_gradient_boosting': ('HistGradientBoostingClassifier', FIXED_PARAMS['HistGradientBoostingClassifier']),
+    'logistic_regression': ('LogisticRegression', FIXED_PARAMS['LogisticRegression']),
+    'calibrated_linear': ('CalibratedLinearSVC', {'C': 1.0, 'class_weight': 'balanced', 'cv': 3, 'method': 'sigmoid'}),
+}
+COLUMNS = [
+    'dataset', 'model', 'n_train', 'n_test', 'positive_rate', 'fit_seconds', 'baseline_rss_mb', 'peak_rss_mb',
+    'predict_one_ms', 'predict_rows_per_second', 'model_size_kb', 'accuracy', 'f1',
+]
+
+
+# --- Datasets ---
+def synthetic_features(n_rows, seed=0):
+    """Feature frame shaped like the scraped catalog (skewed sales, ~10% missing ratings), with its heuristic score."""
+    rng = np.random.default_rng(seed)
+    rating = np.round(rng.uniform(3.0, 5.0, n_rows), 1)
+    rating[rng.random(n_rows) < 0.1] = np.nan
+    features = pd.DataFrame({
+        'price_numeric': rng.gamma(2.0, 70.0, n_rows),
+        'sales_numeric': np.floor(rng.lognormal(5.0, 2.0, n_rows)),
+        'rating_numeric': rating,
+        'has_bestseller_badge': (rng.random(n_rows) < 0.15).astype(int),
+    })
+    features['attractiveness_score'] = feature_store.attractiveness_scores(features)
+    return features
+
+
+def dataset_specs(csv_path=None, synthetic_rows=SYNTHETIC_ROWS):
+    """
+    (name, spec) for the synthetic sizes and, with `csv_path`, the scraped CSV and every recorded history
+    snapshot. A spec ("synthetic:<rows>", "csv:<path>", "snapshot:<path>") is what a child process rebuilds.
+    """
+    specs = [(f"synthetic {n_rows}", f"synthetic:{n_rows}") for n_rows in synthetic_rows]
+    if csv_path:
+        if os.path.exists(csv_path):
+            specs.append((os.path.basename(csv_path), f"csv:{csv_path}"))
+        for path in sorted(glob.glob(os.path.join(snapshots.SNAPSHOTS_DIR, "*.csv"))):
+            specs.append((f"snapshot {os.path.basename(path)}", f"snapshot:{path}"))
+    return specs
+
+
+def load_dataset(spec):
+    kind, value = spec.split(":", 1)
+    if kind == "synthetic":
+        return synthetic_features(int(value))
+    if kind == "csv":
+        return feature_store.load_features_for_csv(value)
+    return feature_store.build_features(pd.read_csv(value))
+
+
+def split_dataset(features):
+    """
+    Same imputation, target and stratified held-out split as the app's training (preprocess_data_and_create_target /
+    train_classifier), as float32 arrays. None when a class is too rare to split.
+    """
+    from sklearn.model_selection import train_test_split
+
+    X, y = training_data(features)
+    if y.value_counts().reindex([0, 1], fill_value=0).min() < MIN_CLASS_ROWS / TEST_SIZE:
+        return None
+    return train_test_split(X.to_numpy(dtype=np.float32), y.to_numpy(), test_size=TEST_SIZE,
+                            random_state=RANDOM_STATE, stratify=y)
+
+
+# --- Measurements ---
+def build_model(estimator, params, n_jobs=1):
+    if estimator == 'CalibratedLinearSVC':
+        from sklearn.calibration import CalibratedClassifierCV
+        from sklearn.pipeline import make_pipeline
+        from sklearn.preprocessing import StandardScaler
+        from sklearn.svm import LinearSVC
+
+        params = dict(params)
+        calibration = {'cv': params.pop('cv'), 'method': params.pop('method')}
+        return make_pipeline(StandardScaler(), CalibratedClassifierCV(LinearSVC(**params), **calibration))
+    return make_estimator(estimator, params, n_jobs=n_jobs)
+
+
+def model_size_bytes(model):
+    import joblib
+
+    with tempfile.TemporaryDirectory() as tmp_dir:
+        path = os.path.join(tmp_dir, "model.joblib")
+        joblib.dump(model, path)  # Same format the registry stores
+        return os.path.getsize(path)
+
+
+def benchmark_model(estimator, params, X_train, X_test, y_train, y_test, n_jobs=1):
+    """
+    Fits one candidate and measures it. The memory figures are the process's peak RSS before and right after
+    the fit (native buffers such as the trees' nodes included), so they are only meaningful in a process that
+    benchmarks a single model: see `measure`.
+    """
+    from sklearn.metrics import accuracy_score, f1_score
+
+    model = build_model(estimator, params, n_jobs)
+    baseline_rss = peak_rss_mb()
+    start = time.perf_counter()
+    model.fit(X_train, y_train)
+    fit_seconds = time.perf_counter() - start
+    fit_peak_rss = peak_rss_mb()
+
+    one_row = X_test[:1]
+    timings = []
+    for _ in range(LATENCY_REPEATS):
+        start = time.perf_counter()
+        model.predict_proba(one_row)
+        timings.append(time.perf_counter() - start)
+    batch = X_test[np.random.default_rng(RANDOM_STATE).integers(0, len(X_test), THROUGHPUT_ROWS)]
+    start = time.perf_counter()
+    model.predict_proba(batch)
+    batch_seconds = time.perf_counter() - start
+
+    y_pred = model.predict(X_test)
+    return {
+        # The baseline is the interpreter, imports and dataset, before the fit
+        'fit_seconds': fit_seconds, 'baseline_rss_mb': baseline_rss, 'peak_rss_mb': fit_peak_rss,
+        'predict_one_ms': float(np.median(timings)) * 1000, 'predict_rows_per_second': len(batch) / batch_seconds,
+        'model_size_kb': model_size_bytes(model) / 1024,
+        'accuracy': accuracy_score(y_test, y_pred), 'f1': f1_score(y_test, y_pred, zero_division=0),
+    }
+
+
+def benchmark_in_process(spec, model_name, n_jobs=1):
+    """Row of measurements for one (dataset, model family) in this process; what a `measure` child runs."""
+    X_train, X_test, y_train, y_test = split_dataset(load_dataset(spec))
+    estimator, params = MODELS[model_name]
+    result = benchmark_model(estimator, params, X_train, X_test, y_train, y_test, n_jobs)
+    positive_rate = (y_train.sum() + y_test.sum()) / (len(y_train) + len(y_test))
+    return {'n_train': len(X_train), 'n_test': len(X_test), 'positive_rate': float(positive_rate), **result}
+
+
+def measure(spec, model_name, n_jobs=1):
+    """
+    Runs `benchmark_in_process` in a fresh interpreter: a process's peak RSS only ever grows, so each
+    (dataset, model) needs its own process for the number to mean anything. Returns the child's row.
+    """
+    command = [sys.executable, "-m", "utils.model_benchmark", "--child", model_name, "--dataset", spec, "--n-jobs", str(n_jobs)]
+    result = subprocess.run(command, cwd=feature_store.PROJECT_ROOT, capture_output=True, text=True, check=True)
+    return json.loads(result.stdout.strip().splitlines()[-1])
+
+
+def benchmark_dataset(name, spec, models=tuple(MODELS), n_jobs=1, log=print):
+    """One row per model family for a dataset spec, each measured in its own process. [] when a class is too rare to split."""
+    features = load_dataset(spec)
+    if split_dataset(features) is None:
+        log(f"{name}: skipped, class counts {training_data(features)[1].value_counts().to_dict()}")
+        return []
+    rows = []
+    for model_name in models:
+        result = measure(spec, model_name, n_jobs)
+        rows.append({'dataset': name, 'model': model_name, **result})
+        log(f"{name} / {model_name}: fit {result['fit_seconds']:.2f} s, peak RSS {result['peak_rss_mb']:.0f} MB, "
+            f"f1 {result['f1']:.3f}")
+    return rows
+
+
+def run(csv_path=None, synthetic_rows=SYNTHETIC_ROWS, models=tuple(MODELS), n_jobs=1, log=print):
+    """Benchmark table (one row per dataset x model family, COLUMNS order) over synthetic and real data."""
+    rows = [row for name, spec in dataset_specs(csv_path, synthetic_rows)
+            for row in benchmark_dataset(name, spec, models, n_jobs, log)]
+    return pd.DataFrame(rows, columns=COLUMNS)
+
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser(description="Cost vs quality of the candidate model families for the attractiveness classifier")
+    parser.add_argument("csv_path", nargs="?", default=os.path.join(feature_store.PROJECT_ROOT, "aliexpress_multi_page_firefox.csv"))
+    parser.add_argument("--synthetic", type=int, nargs="*", default=SYNTHETIC_ROWS, metavar="N_ROWS",
+                        help="Synthetic dataset sizes (default: %(default)s)")
+    parser.add_argument("--no-real", action="store_true", help="Skip the scraped CSV and the history snapshots")
+    parser.add_argument("--models", nargs="+", choices=list(MODELS), default=list(MODELS))
+    parser.add_argument("--n-jobs", type=int, default=1, help="Cores for the forests (default: %(default)s)")
+    parser.add_argument("--output", help="Write the table to this .csv or .json file instead of stdout")
+    parser.add_argument("--child", choices=list(MODELS), help=argparse.SUPPRESS)
+    parser.add_argument("--dataset", help=argparse.SUPPRESS)
+    args = parser.parse_args()
+
+    if args.child:
+        print(json.dumps(benchmark_in_process(args.dataset, args.child, args.n_jobs)))
+        sys.exit()
+    table = run(None if args.no_real else args.csv_path, args.synthetic, args.models, args.n_jobs,
+                log=lambda message: print(message, file=sys.stderr))
+    if args.output and args.output.endswith(".json"):
+        table.to_json(args.output, orient="records", indent=2)
+    elif args.output:
+        table.to_csv(args.output, index=False)
+    else:
+        table.to_csv(sys.stdout, index=False, float_format="%.4g")
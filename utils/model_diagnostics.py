@@ -0,0 +1,176 @@
+# utils/model_diagnostics.py
+import argparse
+import copy
+import os
+import time
+from datetime import datetime, timezone
+
+import numpy as np
+import pandas as pd
+
+import utils.feature_store as feature_store
+import utils.model_registry as model_registry
+from utils.batch_scoring import positive_proba
+from utils.dataset_version import file_version
+from utils.incremental_training import holdout_mask
+from utils.model_search import RANDOM_STATE, SCORING, TEST_SIZE, training_data
+
+# --- Configuration ---
+N_REPEATS = 10  # Shuffles per feature; the spread across them is reported as the importance's std
+IMPORTANCE_SCORERS = [SCORING, 'roc_auc']  # F1 at the model's own threshold, and the threshold-free ranking quality
+THRESHOLDS = np.round(np.arange(0.05, 1.0, 0.05), 2)
+CALIBRATION_BINS = 10
+
+
+# --- Evaluation Rows ---
+def evaluation_split(X, y, meta):
+    """
+    The rows the model was evaluated on when it was trained, so the diagnostics never score training rows:
+    the item-stable holdout for incrementally updated forests, the app's stratified split otherwise
+    (train_classifier and model_search both hold out TEST_SIZE with RANDOM_STATE).
+    """
+    from sklearn.model_selection import train_test_split
+
+    if meta.get('incremental'):
+        holdout = holdout_mask(X.index)
+        return X[holdout], y[holdout]
+    _, X_test, _, y_test = train_test_split(X, y, test_size=TEST_SIZE, random_state=RANDOM_STATE, stratify=y)
+    return X_test, y_test
+
+
+# --- Diagnostics ---
+def permutation_importances(model, X, y, n_repeats=N_REPEATS, n_jobs=-1):
+    """
+    Drop in each scorer when one feature column is shuffled, {scorer: {feature: {'mean', 'std'}}}.
+    Unlike impurity importances, it isn't inflated for features with many distinct values (sales_numeric).
+    The features are scored in parallel (one job per column), with a single-threaded view of the model
+    so the workers don't each start a full thread pool.
+    """
+    from sklearn.inspection import permutation_importance
+
+    model = copy.copy(model)  # Shallow: the fitted trees are shared, only n_jobs differs from the cached model
+    if 'n_jobs' in model.get_params():
+        model.set_params(n_jobs=1)
+    results = permutation_importance(model, X, y, scoring=IMPORTANCE_SCORERS, n_repeats=n_repeats,
+                                     n_jobs=n_jobs, random_state=RANDOM_STATE)
+    return {
+        scorer: {feature: {'mean': float(result.importances_mean[j]), 'std': float(result.importances_std[j])}
+                 for j, feature in enumerate(X.columns)}
+        for scorer, result in results.items()
+    }
+
+
+def threshold_sweep(y_true, proba, thresholds=THRESHOLDS):
+    """Precision, recall, F1 and share of products flagged attractive at every threshold, in one vectorized pass."""
+    y_true = np.asarray(y_true) == 1
+    flagged = proba[:, None] >= thresholds[None, :]
+    tp = (flagged & y_true[:, None]).sum(axis=0)
+    fp = (flagged & ~y_true[:, None]).sum(axis=0)
+    fn = y_true.sum() - tp
+    precision = np.divide(tp, tp + fp, out=np.zeros(len(thresholds)), where=(tp + fp) > 0)
+    recall = np.divide(tp, tp + fn, out=np.zeros(len(thresholds)), where=(tp + fn) > 0)
+    f1 = np.divide(2 * precision * recall, precision + recall, out=np.zeros(len(thresholds)), where=(precision + recall) > 0)
+    return [
+        {'threshold': float(t), 'precision': float(p), 'recall': float(r), 'f1': float(f), 'flagged_share': float(s)}
+        for t, p, r, f, s in zip(thresholds, precision, recall, f1, flagged.mean(axis=0))
+    ]
+
+
+def calibration(y_true, proba, n_bins=CALIBRATION_BINS):
+    """
+    Reliability table (mean predicted probability vs observed attractive rate per probability bin, empty bins
+    left out), Brier score, log loss and expected calibration error (bin-size weighted gap).
+    """
+    y_true = np.asarray(y_true, dtype=float)
+    bins = np.minimum((proba * n_bins).astype(int), n_bins - 1)
+    counts = np.bincount(bins, minlength=n_bins)
+    predicted = np.bincount(bins, weights=proba, minlength=n_bins)
+    observed = np.bincount(bins, weights=y_true, minlength=n_bins)
+    filled = counts > 0
+    mean_predicted = predicted[filled] / counts[filled]
+    observed_rate = observed[filled] / counts[filled]
+    clipped = np.clip(proba, 1e-7, 1 - 1e-7)
+    return {
+        'bins': [{'bin_start': float(b / n_bins), 'mean_predicted': float(p), 'observed_rate': float(o), 'count': int(c)}
+                 for b, p, o, c in zip(np.flatnonzero(filled), mean_predicted, observed_rate, counts[filled])],
+        'brier': float(np.mean((proba - y_true) ** 2)),
+        'log_loss': float(-np.mean(y_true * np.log(clipped) + (1 - y_true) * np.log(1 - clipped))),
+        'ece': float(np.sum(counts[filled] / len(proba) * np.abs(observed_rate - mean_predicted))),
+    }
+
+
+def compute(model, meta, X, y, n_repeats=N_REPEATS, n_jobs=-1):
+    """Every diagnostic of `model` on its evaluation rows of (X, y), as a JSON-ready dict."""
+    start = time.perf_counter()
+    X_test, y_test = evaluation_split(X[meta['features']], y, meta)
+    if len(X_test) == 0 or y_test.nunique() < 2:
+        raise ValueError(f"The evaluation split needs both classes, got {y_test.value_counts().to_dict()}")
+    proba = positive_proba(model, X_test.to_numpy(dtype=np.float32))
+    sweep = threshold_sweep(y_test, proba)
+    best = max(sweep, key=lambda row: row['f1'])  # First maximum: the lowest threshold reaching the best F1
+    impurity = getattr(model, 'feature_importances_', None)
+    return {
+        'model_key': meta['key'],
+        'dataset_version': meta['dataset_version'],
+        'evaluation_rows': len(X_test),
+        'evaluation_positives': int(y_test.sum()),
+        'n_repeats': n_repeats,
+        'permutation_importance': permutation_importances(model, X_test, y_test, n_repeats, n_jobs),
+        'impurity_importance': dict(zip(meta['features'], map(float, impurity))) if impurity is not None else None,
+        'thresholds': sweep,
+        'best_threshold': best,
+        'calibration': calibration(y_test, proba),
+        'seconds': time.perf_counter() - start,
+        'created_at': datetime.now(timezone.utc).isoformat(),
+    }
+
+
+def diagnostics_for(model, meta, X, y, n_jobs=-1, force=False):
+    """
+    Diagnostics of a registry model, computed on first request and stored beside it: every later
+    reader (any process, any replica) gets the stored JSON.
+    """
+    diagnostics = None if force else model_registry.load_diagnostics(meta['key'])
+    if diagnostics is None:
+        diagnostics = compute(model, meta, X, y, n_jobs=n_jobs)
+        model_registry.save_diagnostics(meta['key'], diagnostics)
+    return diagnostics
+
+
+def importance_table(diagnostics):
+    """One row per feature: permutation importances (mean/std per scorer) and the impurity importance."""
+    table = pd.DataFrame({
+        f"{scorer}_{stat}": {feature: values[stat] for feature, values in per_feature.items()}
+        for scorer, per_feature in diagnostics['permutation_importance'].items() for stat in ('mean', 'std')
+    })
+    if diagnostics['impurity_importance']:
+        table['impurity'] = pd.Series(diagnostics['impurity_importance'])
+    return table.sort_values(f"{SCORING}_mean", ascending=False)
+
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser(description="Permutation importance and threshold/calibration sweeps of a registry model, "
+                                                 "stored beside it")
+    parser.add_argument("csv_path", nargs="?", default=os.path.join(feature_store.PROJECT_ROOT, "aliexpress_multi_page_firefox.csv"))
+    parser.add_argument("--key", help="Registry key (default: the current model)")
+    parser.add_argument("--n-jobs", type=int, default=-1)
+    parser.add_argument("--force", action="store_true", help="Recompute even if stored diagnostics exist")
+    args = parser.parse_args()
+
+    meta = model_registry.get_meta(args.key) if args.key else model_registry.current()
+    if meta is None:
+        parser.error("no such model in the registry")
+    if meta['dataset_version'] != feature_store.features_version(file_version(args.csv_path)):
+        parser.error(f"model {meta['key']} was trained on dataset {meta['dataset_version']}, not {args.csv_path}")
+    features = feature_store.load_features_for_csv(args.csv_path)
+    X, y = training_data(features, meta['features'])
+    model, meta = model_registry.load(meta['key'])
+    diagnostics = diagnostics_for(model, meta, X, y, n_jobs=args.n_jobs, force=args.force)
+
+    print(f"Model {meta['key']} ({meta['estimator']}), {diagnostics['evaluation_rows']} evaluation rows "
+          f"({diagnostics['evaluation_positives']} attractive), computed in {diagnostics['seconds']:.2f} s")
+    print(importance_table(diagnostics).to_string(float_format=lambda value: f"{value:.3f}"))
+    print(pd.DataFrame(diagnostics['thresholds']).to_string(index=False, float_format=lambda value: f"{value:.3f}"))
+    calibration_stats = diagnostics['calibration']
+    print(f"best F1 {diagnostics['best_threshold']['f1']:.3f} at threshold {diagnostics['best_threshold']['threshold']:.2f}; "
+          f"Brier {calibration_stats['brier']:.4f}, log loss {calibration_stats['log_loss']:.4f}, ECE {calibration_stats['ece']:.4f}")
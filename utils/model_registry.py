@@ -0,0 +1,271 @@
+# utils/model_registry.py
+import argparse
+import hashlib
+import json
+import os
+import shutil
+import threading
+import time
+from datetime import datetime, timezone
+from importlib import metadata
+
+import numpy as np
+
+import utils.tree_engine as tree_engine
+from utils.dataset_version import file_version
+
+# --- Configuration ---
+PROJECT_ROOT = os.path.abspath(os.path.join(os.path.dirname(__file__), ".."))
+REGISTRY_DIR = os.path.join(PROJECT_ROOT, "data", "models")
+CURRENT_PATH = os.path.join(REGISTRY_DIR, "current.json")  # Pointer to the last published model
+MODEL_FILE = "model.joblib"
+META_FILE = "meta.json"
+SEEN_ROWS_FILE = "seen_rows.npy"  # Row hashes an incrementally trainable model has been fitted on
+DIAGNOSTICS_FILE = "diagnostics.json"  # Permutation importance and threshold/calibration sweeps (model_diagnostics)
+MAX_STORED_MODELS = 16  # Older entries are pruned on publish; the current model is always kept
+KEY_LENGTH = 16
+
+_registry_lock = threading.Lock()
+
+
+def sklearn_version():
+    # Read from the package metadata, so a cache hit never has to import sklearn just to check it
+    try:
+        return metadata.version("scikit-learn")
+    except metadata.PackageNotFoundError:
+        return None
+
+
+# --- Keys ---
+def model_key(dataset_version, features, params, estimator="RandomForestClassifier"):
+    """
+    Registry key of a model: hash of the dataset version, the ordered feature list, the estimator
+    and its hyperparameters. Same inputs -> same key, so a trained model is found again by any process.
+    """
+    payload = json.dumps(
+        {"dataset_version": dataset_version, "features": list(features), "estimator": estimator, "params": params},
+        sort_keys=True, default=str,
+    )
+    return hashlib.sha1(payload.encode("utf-8")).hexdigest()[:KEY_LENGTH]
+
+
+def _entry_dir(key):
+    return os.path.join(REGISTRY_DIR, key)
+
+
+def _read_json(path):
+    try:
+        with open(path, encoding="utf-8") as f:
+            return json.load(f)
+    except (FileNotFoundError, json.JSONDecodeError):
+        return None
+
+
+def _write_json_atomic(path, payload):
+    tmp_path = f"{path}.{threading.get_ident()}.tmp"
+    with open(tmp_path, "w", encoding="utf-8") as f:
+        json.dump(payload, f, indent=2, default=str)
+    os.replace(tmp_path, path)
+
+
+# --- Lookup ---
+def get_meta(key):
+    """Metadata of a stored model, or None if the entry is missing or was pickled by another sklearn version."""
+    meta = _read_json(os.path.join(_entry_dir(key), META_FILE))
+    if meta is None or not os.path.exists(os.path.join(_entry_dir(key), MODEL_FILE)):
+        return None
+    if meta.get("sklearn_version") != sklearn_version():
+        return None  # Unpickling across sklearn versions is unsupported
+    return meta
+
+
+def find(dataset_version, features, params, estimator="RandomForestClassifier"):
+    """Metadata of the model trained on exactly these inputs, or None (the caller trains and publishes)."""
+    return get_meta(model_key(dataset_version, features, params, estimator))
+
+
+def current():
+    """Metadata of the model the "current" pointer designates, or None."""
+    pointer = _read_json(CURRENT_PATH)
+    return get_meta(pointer["key"]) if pointer else None
+
+
+def list_models():
+    """Metadata of every readable entry, newest first."""
+    if not os.path.isdir(REGISTRY_DIR):
+        return []
+    entries = (_read_json(os.path.join(REGISTRY_DIR, name, META_FILE))
+               for name in os.listdir(REGISTRY_DIR)
+               if not name.startswith(".") and os.path.isdir(os.path.join(REGISTRY_DIR, name)))  # Skip in-progress publishes
+    return sorted((meta for meta in entries if meta), key=lambda meta: meta["created_at"], reverse=True)
+
+
+def load(key):
+    """(model, metadata) for `key`, or (None, None) if there is no compatible entry."""
+    meta = get_meta(key)
+    if meta is None:
+        return None, None
+    import joblib  # Deferred like sklearn: only paid when a model is actually loaded
+    return joblib.load(os.path.join(_entry_dir(key), MODEL_FILE)), meta
+
+
+def load_engine(key, model=None):
+    """
+    Array-backed ForestEngine of a stored forest (NumPy only, no sklearn import), or None for other estimators.
+    Entries published before the engine existed are exported on first use when their `model` is passed in.
+    """
+    meta = get_meta(key)
+    if meta is None or meta["estimator"] not in tree_engine.SUPPORTED_ESTIMATORS:
+        return None
+    path = os.path.join(_entry_dir(key), tree_engine.ENGINE_FILE)
+    if not os.path.exists(path):
+        if model is None:
+            return None
+        tree_engine.save(tree_engine.export_forest(model), path)
+    return tree_engine.ForestEngine.load(path)
+
+
+def load_seen_rows(key):
+    """Sorted uint64 hashes of the rows the model `key` was trained on, or None if it has no ledger."""
+    path = os.path.join(_entry_dir(key), SEEN_ROWS_FILE)
+    if get_meta(key) is None or not os.path.exists(path):
+        return None
+    return np.load(path)
+
+
+def load_diagnostics(key):
+    """Stored evaluation diagnostics of the model `key` (see model_diagnostics), or None if not computed yet."""
+    if get_meta(key) is None:
+        return None
+    return _read_json(os.path.join(_entry_dir(key), DIAGNOSTICS_FILE))
+
+
+def save_diagnostics(key, diagnostics):
+    """
+    Stores diagnostics beside the model. They describe one stored model, so a republish of the key
+    (which replaces the entry directory) drops them. Returns False if the entry no longer exists.
+    """
+    if get_meta(key) is None:
+        return False
+    _write_json_atomic(os.path.join(_entry_dir(key), DIAGNOSTICS_FILE), diagnostics)
+    return True
+
+
+def load_latest_compatible(features, dataset_version=None, params=None, estimator="RandomForestClassifier"):
+    """
+    Best stored model for `features`: the exact (dataset_version, params) entry if given and present,
+    else the current model, else the newest entry, as long as it uses the same features and sklearn version.
+    Returns (model, metadata) or (None, None).
+    """
+    if dataset_version is not None and params is not None:
+        meta = find(dataset_version, features, params, estimator)
+        if meta:
+            return load(meta["key"])
+    candidates = [current()] + list_models()
+    for meta in candidates:
+        if meta and meta["features"] == list(features) and meta.get("sklearn_version") == sklearn_version():
+            return load(meta["key"])
+    return None, None
+
+
+# --- Publishing ---
+def publish(model, dataset_version, features, params, metrics=None, estimator=None, set_current=True, extra=None,
+            seen_rows=None):
+    """
+    Stores `model` with its metadata and metrics under its key and (by default) moves the "current"
+    pointer to it. Written to a temporary directory first, so readers never see a half-written entry.
+    `seen_rows` (row hashes, see incremental_training) is stored as the entry's ledger. Returns the metadata.
+    """
+    import joblib
+
+    estimator = estimator or type(model).__name__
+    key = model_key(dataset_version, features, params, estimator)
+    meta = {
+        "key": key,
+        "estimator": estimator,
+        "dataset_version": dataset_version,
+        "features": list(features),
+        "params": params,
+        "metrics": metrics or {},
+        "sklearn_version": sklearn_version(),
+        "created_at": datetime.now(timezone.utc).isoformat(),
+        **(extra or {}),
+    }
+    os.makedirs(REGISTRY_DIR, exist_ok=True)
+    tmp_dir = os.path.join(REGISTRY_DIR, f".{key}.{os.getpid()}.{threading.get_ident()}.tmp")
+    os.makedirs(tmp_dir, exist_ok=True)
+    joblib.dump(model, os.path.join(tmp_dir, MODEL_FILE))
+    if estimator in tree_engine.SUPPORTED_ESTIMATORS:
+        # Array export for sklearn-free, low-latency serving (load_engine)
+        tree_engine.save(tree_engine.export_forest(model), os.path.join(tmp_dir, tree_engine.ENGINE_FILE))
+    if seen_rows is not None:
+        np.save(os.path.join(tmp_dir, SEEN_ROWS_FILE), np.sort(np.asarray(seen_rows, dtype=np.uint64)))
+    _write_json_atomic(os.path.join(tmp_dir, META_FILE), meta)
+    with _registry_lock:
+        if os.path.isdir(_entry_dir(key)):
+            shutil.rmtree(_entry_dir(key))  # Same inputs retrained (e.g. after a sklearn upgrade)
+        try:
+            os.replace(tmp_dir, _entry_dir(key))
+        except OSError:
+            shutil.rmtree(tmp_dir, ignore_errors=True)  # Another process published the same key first
+        if set_current:
+            set_current_model(key)
+        _prune_old_models()
+    return meta
+
+
+def set_current_model(key):
+    _write_json_atomic(CURRENT_PATH, {"key": key, "updated_at": datetime.now(timezone.utc).isoformat()})
+
+
+def _prune_old_models():
+    pointer = _read_json(CURRENT_PATH) or {}
+    for meta in list_models()[MAX_STORED_MODELS:]:
+        if meta["key"] != pointer.get("key"):
+            shutil.rmtree(_entry_dir(meta["key"]), ignore_errors=True)
+
+
+def import_artifact(model_path, dataset_version, features, params, metrics=None, set_current=True):
+    """Publishes a joblib model trained elsewhere (e.g. the KFP train_classifier_component output)."""
+    import joblib
+
+    model = joblib.load(model_path)
+    return publish(model, dataset_version, features, params, metrics=metrics,
+                   set_current=set_current, extra={"source": os.path.abspath(model_path)})
+
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser(description="Local model registry")
+    subparsers = parser.add_subparsers(dest="command", required=True)
+    subparsers.add_parser("list", help="Stored models, newest first")
+    import_parser = subparsers.add_parser("import", help="Publish a joblib model (e.g. a KFP artifact)")
+    import_parser.add_argument("model_path")
+    import_parser.add_argument("--metadata", help="JSON with dataset_version (the raw CSV's hash), features, params, "
+                                                  "metrics and currency (the KFP Model artifact metadata)")
+    import_parser.add_argument("--dataset", help="CSV the model was trained on, instead of the metadata's dataset_version")
+    import_parser.add_argument("--no-current", action="store_true", help="Don't move the current pointer")
+    args = parser.parse_args()
+
+    if args.command == "list":
+        pointer = (_read_json(CURRENT_PATH) or {}).get("key")
+        for meta in list_models():
+            marker = "*" if meta["key"] == pointer else " "
+            print(f"{marker} {meta['key']}  {meta['created_at']}  {meta['estimator']}  "
+                  f"data={meta['dataset_version']}  accuracy={meta['metrics'].get('accuracy')}")
+    else:
+        # Imports pandas, which only this command needs
+        from utils.currency import REPORTING_CURRENCY
+        from utils.feature_store import features_version
+
+        artifact_meta = _read_json(args.metadata) if args.metadata else {}
+        raw_version = file_version(args.dataset) if args.dataset else artifact_meta.get("dataset_version")
+        if not raw_version or "features" not in artifact_meta:
+            parser.error("dataset version and feature list are required (--dataset / --metadata)")
+        if artifact_meta.get("currency", REPORTING_CURRENCY) != REPORTING_CURRENCY:
+            parser.error(f"model trained on {artifact_meta['currency']} prices, the app reports in {REPORTING_CURRENCY}")
+        start = time.perf_counter()
+        # The app looks models up by the version of its features: the CSV hash combined with the FX table's
+        meta = import_artifact(args.model_path, features_version(raw_version), artifact_meta["features"],
+                               artifact_meta.get("params", {}), artifact_meta.get("metrics"),
+                               set_current=not args.no_current)
+        print(f"Published {meta['key']} in {time.perf_counter() - start:.2f} s")
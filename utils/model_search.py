@@ -0,0 +1,262 @@
+# utils/model_search.py
+import argparse
+import json
+import math
+import os
+import threading
+import time
+
+import numpy as np
+import pandas as pd
+
+import utils.feature_store as feature_store
+import utils.model_registry as model_registry
+from utils.batch_scoring import fill_values
+from utils.currency import fx_table_version
+from utils.dataset_version import file_version
+
+# --- Configuration ---
+SEARCH_CACHE_DIR = os.path.join(model_registry.REGISTRY_DIR, "search")  # Fold results, one JSON file per dataset version
+FEATURES = ['price_numeric', 'sales_numeric', 'rating_numeric', 'has_bestseller_badge']
+TIME_BUDGET_SECONDS = float(os.environ.get("MODEL_SEARCH_BUDGET_S", 120))
+HALVING_FACTOR = 3  # Each round keeps the best third of the candidates on three times the rows
+CV_SPLITS = 5
+MAX_CANDIDATES = 27
+TEST_SIZE = 0.25  # Same held-out split as the app's train_classifier, so the published metrics compare
+RANDOM_STATE = 42
+SCORING = 'f1'  # F1 of the "attractive" class: the positive class is the rare one
+
+# Hyperparameter grid per model family; the app's default forest is always a candidate
+SEARCH_SPACE = {
+    'RandomForestClassifier': {
+        'n_estimators': [100, 300], 'max_depth': [None, 8, 16], 'min_samples_leaf': [1, 3], 'max_features': ['sqrt', None],
+    },
+    'ExtraTreesClassifier': {'n_estimators': [200], 'max_depth': [None, 12], 'min_samples_leaf': [1, 3]},
+    'HistGradientBoostingClassifier': {'learning_rate': [0.05, 0.1], 'max_leaf_nodes': [15, 31], 'l2_regularization': [0.0, 1.0]},
+    'LogisticRegression': {'C': [0.1, 1.0, 10.0]},
+}
+FIXED_PARAMS = {
+    'RandomForestClassifier': {'random_state': RANDOM_STATE, 'class_weight': 'balanced'},
+    'ExtraTreesClassifier': {'random_state': RANDOM_STATE, 'class_weight': 'balanced'},
+    'HistGradientBoostingClassifier': {'random_state': RANDOM_STATE, 'class_weight': 'balanced'},
+    'LogisticRegression': {'class_weight': 'balanced', 'max_iter': 1000},
+}
+BASELINE = ('RandomForestClassifier', {'n_estimators': 100, 'random_state': RANDOM_STATE, 'class_weight': 'balanced'})
+
+_cache_lock = threading.Lock()
+
+
+# --- Candidates ---
+def make_estimator(estimator, params, n_jobs=1):
+    """
+    Unfitted estimator for a (family, params) candidate. Forests get `n_jobs` (1 inside CV, where the folds
+    are already spread over the cores); the linear model is scaled first.
+    """
+    from sklearn import ensemble, linear_model
+    from sklearn.pipeline import make_pipeline
+    from sklearn.preprocessing import StandardScaler
+
+    if estimator == 'LogisticRegression':
+        return make_pipeline(StandardScaler(), linear_model.LogisticRegression(**params))
+    model = getattr(ensemble, estimator)(**params)
+    if 'n_jobs' in model.get_params():
+        model.set_params(n_jobs=n_jobs)
+    return model
+
+
+def candidates(max_candidates=MAX_CANDIDATES, random_state=RANDOM_STATE):
+    """(family, params) pairs from SEARCH_SPACE, randomly thinned to `max_candidates`, baseline first."""
+    from sklearn.model_selection import ParameterGrid
+
+    pool = [(name, {**grid_params, **FIXED_PARAMS[name]}) for name, grid in SEARCH_SPACE.items() for grid_params in ParameterGrid(grid)]
+    pool = [candidate for candidate in pool if candidate != BASELINE]
+    rng = np.random.default_rng(random_state)
+    picked = rng.choice(len(pool), size=min(max_candidates - 1, len(pool)), replace=False)
+    return [BASELINE] + [pool[i] for i in sorted(picked)]
+
+
+def candidate_key(estimator, params):
+    return json.dumps([estimator, params], sort_keys=True, default=str)
+
+
+# --- Fold Cache ---
+def _cache_path(dataset_version, features):
+    # X carries FX-converted prices, so fold scores are only reusable under the same FX table
+    stem = model_registry.model_key(dataset_version, features, {'fx_version': fx_table_version()}, estimator="search")
+    return os.path.join(SEARCH_CACHE_DIR, f"{stem}.json")
+
+
+def _read_cache(path):
+    try:
+        with open(path, encoding="utf-8") as f:
+            return json.load(f)
+    except (FileNotFoundError, json.JSONDecodeError):
+        return {}
+
+
+def _write_cache(path, cache):
+    os.makedirs(os.path.dirname(path), exist_ok=True)
+    tmp_path = f"{path}.{threading.get_ident()}.tmp"
+    with open(tmp_path, "w", encoding="utf-8") as f:
+        json.dump(cache, f)
+    os.replace(tmp_path, path)
+
+
+def _fit_fold(estimator, params, X, y, train_rows, test_rows):
+    # One (candidate, fold) job; runs in a worker process
+    from sklearn.metrics import get_scorer
+
+    start = time.perf_counter()
+    model = make_estimator(estimator, params).fit(X[train_rows], y[train_rows])
+    return {'score': float(get_scorer(SCORING)(model, X[test_rows], y[test_rows])), 'fit_seconds': time.perf_counter() - start}
+
+
+# --- Search ---
+def successive_halving(X, y, dataset_version, features, candidate_list=None, time_budget=TIME_BUDGET_SECONDS,
+                       factor=HALVING_FACTOR, n_splits=CV_SPLITS, n_jobs=-1, log=print):
+    """
+    Successive halving: every candidate is cross-validated (stratified K-fold) on a small stratified
+    subsample, the best 1/`factor` move on to `factor` times more rows, until one is left or the full
+    training set is reached. All (candidate, fold) fits of a round run in parallel on `n_jobs` cores.
+
+    Fold results are cached per dataset and FX version, so a rerun (or a longer budget) only fits what's new.
+    A round is not started once its estimated duration would exceed `time_budget`. Within a round, candidates
+    are fitted in batches of about `n_jobs` fits and no batch starts past the budget (the first one always
+    runs), so the search overruns it by at most one batch; the best candidate evaluated in the last round
+    wins. Returns (best result of that round, leaderboard DataFrame).
+    """
+    from joblib import Parallel, delayed, effective_n_jobs
+    from sklearn.model_selection import StratifiedKFold, train_test_split
+
+    start = time.perf_counter()
+    X, y = np.asarray(X, dtype=np.float32), np.asarray(y)
+    remaining = list(candidate_list or candidates())
+    n_rounds, survivors = 1, len(remaining)
+    while survivors > factor:  # e.g. 27 candidates -> rounds of 27, 9 and 3
+        survivors, n_rounds = math.ceil(survivors / factor), n_rounds + 1
+    minority = np.bincount(y).min()
+    # Smallest subsample that still leaves 2 minority rows per fold
+    min_resources = min(len(y), max(len(y) // factor ** (n_rounds - 1), math.ceil(2 * n_splits * len(y) / minority)))
+
+    cache_path = _cache_path(dataset_version, features)
+    with _cache_lock:
+        cache = _read_cache(cache_path)
+    leaderboard = []
+    last_round_seconds = 0.0
+    resources = min_resources
+    for round_index in range(n_rounds):
+        elapsed = time.perf_counter() - start
+        # The next round costs about as much as the last one: 1/factor the candidates on factor times the rows
+        if round_index > 0 and elapsed + last_round_seconds > time_budget:
+            log(f"Time budget reached after {round_index} round(s) ({elapsed:.1f} s)")
+            break
+        round_start = time.perf_counter()
+        rows = np.arange(len(y)) if resources >= len(y) else train_test_split(
+            np.arange(len(y)), train_size=resources, stratify=y, random_state=RANDOM_STATE)[0]
+        folds = list(StratifiedKFold(n_splits=n_splits, shuffle=True, random_state=RANDOM_STATE).split(rows, y[rows]))
+
+        def fold_key(estimator, params, fold_index):
+            return f"{candidate_key(estimator, params)}|{resources}|{n_splits}|{fold_index}"
+
+        pending = [(estimator, params) for estimator, params in remaining
+                   if any(fold_key(estimator, params, i) not in cache for i in range(n_splits))]
+        evaluated = len(remaining) - len(pending)  # Fully cached candidates cost nothing
+        batch_size = max(1, math.ceil(effective_n_jobs(n_jobs) / n_splits))  # Candidates per batch: about one fit per core
+        fits, out_of_time = 0, False
+        with Parallel(n_jobs=n_jobs) as parallel:
+            for batch_start in range(0, len(pending), batch_size):
+                if evaluated > 0 and time.perf_counter() - start > time_budget:
+                    out_of_time = True
+                    break
+                jobs, job_keys = [], []
+                for estimator, params in pending[batch_start:batch_start + batch_size]:
+                    for fold_index, (train_pos, test_pos) in enumerate(folds):
+                        if fold_key(estimator, params, fold_index) not in cache:
+                            jobs.append(delayed(_fit_fold)(estimator, params, X, y, rows[train_pos], rows[test_pos]))
+                            job_keys.append(fold_key(estimator, params, fold_index))
+                for key, result in zip(job_keys, parallel(jobs)):
+                    cache[key] = result
+                with _cache_lock:
+                    _write_cache(cache_path, {**_read_cache(cache_path), **cache})
+                fits += len(job_keys)
+                evaluated += len(pending[batch_start:batch_start + batch_size])
+
+        round_results = []
+        for estimator, params in remaining:
+            if any(fold_key(estimator, params, i) not in cache for i in range(n_splits)):
+                continue  # Not reached before the budget ran out
+            folds_results = [cache[fold_key(estimator, params, i)] for i in range(n_splits)]
+            scores = [result['score'] for result in folds_results]
+            round_results.append({
+                'round': round_index, 'resources': resources, 'estimator': estimator, 'params': params,
+                'mean_score': float(np.mean(scores)), 'std_score': float(np.std(scores)),
+                'fit_seconds': float(sum(result['fit_seconds'] for result in folds_results)),
+            })
+        round_results.sort(key=lambda result: -result['mean_score'])  # Stable: earlier candidates win ties
+        leaderboard.extend(round_results)
+        last_round_seconds = time.perf_counter() - round_start
+        log(f"Round {round_index}: {len(round_results)}/{len(remaining)} candidates x {n_splits} folds on {resources} rows, "
+            f"{fits} fits ({len(round_results) * n_splits - fits} cached), {last_round_seconds:.1f} s")
+
+        best = round_results[0]
+        if out_of_time:
+            log(f"Time budget reached during round {round_index} ({time.perf_counter() - start:.1f} s)")
+            break
+        if resources >= len(y):
+            break
+        remaining = [(result['estimator'], result['params']) for result in round_results[:math.ceil(len(round_results) / factor)]]
+        resources = min(len(y), resources * factor)
+
+    return best, pd.DataFrame(leaderboard)
+
+
+def training_data(features, feature_list=FEATURES):
+    """(X, y) with the app's imputation and heuristic target (attractiveness_score >= threshold)."""
+    df = features.fillna(fill_values(features))
+    y = (df['attractiveness_score'] >= feature_store.ATTRACTIVENESS_SCORE_THRESHOLD).astype(int)
+    return df[feature_list], y
+
+
+def tune_and_publish(X, y, dataset_version, features, fills=None, time_budget=TIME_BUDGET_SECONDS, n_jobs=-1, log=print):
+    """
+    Searches on a stratified training split, refits the winner on it with every core, evaluates it on
+    the held-out split and publishes it as the registry's current model. Returns (metadata, leaderboard).
+    """
+    from sklearn.metrics import accuracy_score, classification_report
+    from sklearn.model_selection import train_test_split
+
+    X_train, X_test, y_train, y_test = train_test_split(X, y, test_size=TEST_SIZE, random_state=RANDOM_STATE, stratify=y)
+    best, leaderboard = successive_halving(X_train, y_train, dataset_version, features,
+                                           time_budget=time_budget, n_jobs=n_jobs, log=log)
+    estimator, params = best['estimator'], best['params']
+    model = make_estimator(estimator, params, n_jobs=n_jobs).fit(X_train, y_train)
+    y_pred = model.predict(X_test)
+    meta = model_registry.publish(
+        model, dataset_version, features, params, estimator=estimator,
+        metrics={
+            'accuracy': accuracy_score(y_test, y_pred),
+            'report': classification_report(y_test, y_pred, output_dict=True, zero_division=0),
+            'n_samples': len(X), f'cv_{SCORING}': best['mean_score'], 'cv_resources': int(best['resources']),
+        },
+        extra={'fill_values': fills or {}, 'search': {'candidates': int((leaderboard['round'] == 0).sum()), 'rounds': int(leaderboard['round'].max()) + 1}},
+    )
+    log(f"Published {estimator} {params} as {meta['key']} (cv {SCORING} {best['mean_score']:.3f}, test accuracy {meta['metrics']['accuracy']:.3f})")
+    return meta, leaderboard
+
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser(description="Successive-halving model search; publishes the winner to the model registry")
+    parser.add_argument("csv_path", nargs="?", default=os.path.join(feature_store.PROJECT_ROOT, "aliexpress_multi_page_firefox.csv"))
+    parser.add_argument("--time-budget", type=float, default=TIME_BUDGET_SECONDS, help="Seconds (default: %(default)s)")
+    parser.add_argument("--n-jobs", type=int, default=-1)
+    args = parser.parse_args()
+
+    features = feature_store.load_features_for_csv(args.csv_path)
+    if features is None:
+        parser.error(f"{args.csv_path} not found")
+    X, y = training_data(features)
+    start = time.perf_counter()
+    meta, leaderboard = tune_and_publish(X, y, feature_store.features_version(file_version(args.csv_path)), FEATURES, fill_values(features),
+                                         time_budget=args.time_budget, n_jobs=args.n_jobs)
+    print(leaderboard.sort_values(['round', 'mean_score'], ascending=[False, False]).head(10).to_string(index=False))
+    print(f"Total {time.perf_counter() - start:.1f} s")
@@ -0,0 +1,273 @@
+# utils/out_of_core.py
+import argparse
+import glob
+import json
+import os
+import resource
+import subprocess
+import sys
+import tempfile
+import time
+
+import numpy as np
+import pandas as pd
+
+import utils.feature_store as feature_store
+import utils.model_registry as model_registry
+import utils.snapshots as snapshots
+from utils.batch_scoring import fill_values
+from utils.chunked import iter_csv_batches
+from utils.dataset_version import bytes_version, file_version
+from utils.incremental_training import evaluate, holdout_mask
+from utils.model_search import BASELINE, FEATURES, RANDOM_STATE, training_data
+
+# --- Configuration ---
+MEMORY_BUDGET_MB = float(os.environ.get("OUT_OF_CORE_BUDGET_MB", 4))  # Training sample held by the reservoir strategy
+BATCH_ROWS = 20_000  # Raw rows parsed at once: parsing and featurizing a batch is the streaming strategies' peak
+TEST_ROWS = 50_000  # Uniform sample of the holdout items every strategy is scored on
+SGD_EPOCHS = 5  # Passes over the partitions for the partial_fit strategy
+STRATEGIES = ('in_memory', 'reservoir', 'sgd')
+
+
+# --- Partitions ---
+def partition_paths(directory=snapshots.SNAPSHOTS_DIR):
+    """Snapshot CSVs (one immutable file per scrape), oldest first."""
+    return sorted(glob.glob(os.path.join(directory, "*.csv")))
+
+
+def partitions_version(paths):
+    """Dataset version of a set of partitions: digest of their content hashes."""
+    return bytes_version("\n".join(file_version(path) for path in paths).encode("utf-8"))
+
+
+def iter_training_batches(paths, batch_rows=BATCH_ROWS):
+    """
+    (X float32, y, holdout mask) per raw batch of every partition; only one batch is parsed at a time.
+    Each batch is featurized on its own, so the median imputations are per batch (tens of thousands
+    of rows are plenty for a stable median).
+    """
+    for path in paths:
+        for batch in iter_csv_batches(path, batch_rows):
+            features = feature_store.build_features(batch)
+            X, y = training_data(features)
+            yield X.to_numpy(dtype=np.float32), y.to_numpy(), holdout_mask(features.index)
+
+
+# --- Reservoir Sampling ---
+class Reservoir:
+    """Uniform sample of at most `capacity` rows of a stream (Algorithm R), preallocated once."""
+
+    def __init__(self, capacity, n_features, seed=RANDOM_STATE):
+        self.X = np.empty((capacity, n_features), dtype=np.float32)
+        self.y = np.empty(capacity, dtype=np.int8)
+        self.capacity = capacity
+        self.seen = 0
+        self.rng = np.random.default_rng(seed)
+
+    def update(self, X, y):
+        positions = self.seen + np.arange(len(X))  # Stream position of every incoming row
+        self.seen += len(X)
+        filling = positions < self.capacity
+        self.X[positions[filling]], self.y[positions[filling]] = X[filling], y[filling]
+        # Row t replaces a random slot with probability capacity / (t + 1)
+        slots = self.rng.integers(0, positions + 1)
+        accepted = np.flatnonzero(~filling & (slots < self.capacity))
+        if accepted.size:
+            # When two rows of the batch draw the same slot, the later one wins (as in the sequential algorithm)
+            accepted_slots = slots[accepted][::-1]
+            _, last = np.unique(accepted_slots, return_index=True)
+            rows = accepted[::-1][last]
+            self.X[slots[rows]], self.y[slots[rows]] = X[rows], y[rows]
+
+    def sample(self):
+        size = min(self.seen, self.capacity)
+        return self.X[:size], self.y[:size]
+
+
+class StratifiedReservoir:
+    """One Reservoir per class, so the rare "attractive" class is never crowded out of the sample."""
+
+    def __init__(self, capacity_per_class, n_features, seed=RANDOM_STATE):
+        self.reservoirs = {}
+        self.capacity_per_class = capacity_per_class
+        self.n_features = n_features
+        self.seed = seed
+
+    def update(self, X, y):
+        for label in np.unique(y):
+            if label not in self.reservoirs:
+                self.reservoirs[label] = Reservoir(self.capacity_per_class, self.n_features, self.seed + int(label))
+            self.reservoirs[label].update(X[y == label], y[y == label])
+
+    @property
+    def seen(self):
+        return {int(label): reservoir.seen for label, reservoir in self.reservoirs.items()}
+
+    def sample(self):
+        samples = [reservoir.sample() for _, reservoir in sorted(self.reservoirs.items())]
+        return np.concatenate([X for X, _ in samples]), np.concatenate([y for _, y in samples])
+
+
+def budget_rows_per_class(budget_mb, n_features=len(FEATURES), n_classes=2):
+    # float32 inputs + int8 label per sampled row
+    return int(budget_mb * 2**20 / (n_features * 4 + 1) / n_classes)
+
+
+# --- Strategies ---
+def fit_in_memory(paths):
+    """
+    The previous approach (train_classifier_component): every partition read whole, then one forest fit.
+    The frames are featurized in the same row slices as iter_training_batches, so every strategy trains and
+    is scored on the same rows (one build_features over the concatenation would dedup item_id across snapshots).
+    """
+    from sklearn.ensemble import RandomForestClassifier
+
+    frames = [pd.read_csv(path) for path in paths]
+    features = pd.concat([feature_store.build_features(frame.iloc[start:start + BATCH_ROWS])
+                          for frame in frames for start in range(0, len(frame), BATCH_ROWS)])
+    X, y = training_data(features)
+    X, y, holdout = X.to_numpy(dtype=np.float32), y.to_numpy(), holdout_mask(features.index)
+    model = RandomForestClassifier(**BASELINE[1], n_jobs=-1).fit(X[~holdout], y[~holdout])
+    return model, {'train_rows': int((~holdout).sum()), 'fitted_rows': int((~holdout).sum())}, (X[holdout], y[holdout])
+
+
+def fit_reservoir(paths, budget_mb=MEMORY_BUDGET_MB):
+    """One streaming pass into a stratified reservoir bounded by `budget_mb`, then the app's forest on the sample."""
+    from sklearn.ensemble import RandomForestClassifier
+
+    train = StratifiedReservoir(budget_rows_per_class(budget_mb), len(FEATURES))
+    test = Reservoir(TEST_ROWS, len(FEATURES))
+    for X, y, holdout in iter_training_batches(paths):
+        train.update(X[~holdout], y[~holdout])
+        test.update(X[holdout], y[holdout])
+    X_sample, y_sample = train.sample()
+    # The sample over-represents the rare class; "balanced" re-weights it to the sample's own mix
+    model = RandomForestClassifier(**BASELINE[1], n_jobs=-1).fit(X_sample, y_sample)
+    return model, {'train_rows': sum(train.seen.values()), 'fitted_rows': len(y_sample)}, test.sample()
+
+
+def fit_sgd(paths, epochs=SGD_EPOCHS):
+    """
+    Out-of-core linear model: a first pass fits the scaler and counts the classes, then `epochs` passes
+    of SGDClassifier.partial_fit (log loss, class weights from the full counts, as "balanced" would).
+    """
+    from sklearn.linear_model import SGDClassifier
+    from sklearn.pipeline import Pipeline
+    from sklearn.preprocessing import StandardScaler
+
+    scaler = StandardScaler()
+    counts = np.zeros(2, dtype=np.int64)
+    test = Reservoir(TEST_ROWS, len(FEATURES))
+    for X, y, holdout in iter_training_batches(paths):
+        scaler.partial_fit(X[~holdout])
+        counts += np.bincount(y[~holdout], minlength=2)
+        test.update(X[holdout], y[holdout])
+    class_weight = {label: counts.sum() / (2 * count) for label, count in enumerate(counts) if count}
+    model = SGDClassifier(loss='log_loss', class_weight=class_weight, random_state=RANDOM_STATE)
+    for epoch in range(epochs):
+        for X, y, holdout in iter_training_batches(paths):
+            model.partial_fit(scaler.transform(X[~holdout]), y[~holdout], classes=np.array([0, 1]))
+    pipeline = Pipeline([('standardscaler', scaler), ('sgdclassifier', model)])
+    return pipeline, {'train_rows': int(counts.sum()), 'fitted_rows': int(counts.sum()) * epochs}, test.sample()
+
+
+def peak_rss_mb():
+    """
+    Peak resident set size of this process. VmHWM is reset by exec, unlike ru_maxrss, which a child
+    inherits from the parent it was forked from; ru_maxrss (KiB on Linux) is the fallback elsewhere.
+    """
+    try:
+        with open("/proc/self/status", encoding="ascii") as f:
+            for line in f:
+                if line.startswith("VmHWM:"):
+                    return int(line.split()[1]) / 1024
+    except OSError:
+        pass
+    return resource.getrusage(resource.RUSAGE_SELF).ru_maxrss / 1024
+
+
+def train(strategy, paths, budget_mb=MEMORY_BUDGET_MB):
+    """(model, stats) for one strategy; stats include the holdout metrics and the process's peak RSS."""
+    baseline_rss = peak_rss_mb()
+    start = time.perf_counter()
+    if strategy == 'in_memory':
+        model, stats, (X_test, y_test) = fit_in_memory(paths)
+    elif strategy == 'reservoir':
+        model, stats, (X_test, y_test) = fit_reservoir(paths, budget_mb)
+    elif strategy == 'sgd':
+        model, stats, (X_test, y_test) = fit_sgd(paths)
+    else:
+        raise ValueError(f"Unknown strategy {strategy!r} (expected one of {STRATEGIES})")
+    seconds = time.perf_counter() - start
+    metrics = evaluate(model, X_test, y_test)
+    stats.update({
+        'strategy': strategy, 'seconds': seconds, 'test_rows': len(y_test),
+        'accuracy': metrics['accuracy'], 'f1': metrics['f1'],
+        # The baseline is the interpreter + imports, before any batch was read
+        'baseline_rss_mb': baseline_rss, 'peak_rss_mb': peak_rss_mb(),
+    })
+    return model, stats, (X_test, y_test, metrics)
+
+
+def measure(strategy, paths, budget_mb=MEMORY_BUDGET_MB):
+    """
+    Runs `train` in a fresh interpreter: a process's peak RSS only ever grows, so each strategy needs
+    its own process for the number to mean anything. Returns the child's stats.
+    """
+    command = [sys.executable, "-m", "utils.out_of_core", "--child", strategy, "--budget-mb", str(budget_mb), *paths]
+    result = subprocess.run(command, cwd=feature_store.PROJECT_ROOT, capture_output=True, text=True, check=True)
+    return json.loads(result.stdout.strip().splitlines()[-1])
+
+
+def write_synthetic_partitions(directory, n_partitions, rows_per_partition):
+    """Raw snapshot CSVs shaped like the scraper's output, for sizes the real history doesn't reach yet."""
+    from utils.model_benchmark import synthetic_features
+
+    for index in range(n_partitions):
+        features = synthetic_features(rows_per_partition, seed=index)
+        ids = 1_005_000_000_000_000 + index * rows_per_partition + np.arange(rows_per_partition)
+        badges = np.where(features['has_bestseller_badge'] == 1, "Le plus vendu sur AliExpress", "")
+        pd.DataFrame({
+            'item_id': ids, 'rank': np.arange(1, rows_per_partition + 1),
+            'url': [f"https://fr.aliexpress.com/item/{item_id}.html" for item_id in ids],
+            'name': [f"Produit {item_id}" for item_id in ids],
+            'price': [f"MAD {price:.2f}" for price in features['price_numeric']],
+            'rating': features['rating_numeric'],
+            'sales_info': [f"{int(sales)} vendus" for sales in features['sales_numeric']],
+            'additional_badges': badges,
+        }).to_csv(os.path.join(directory, f"synthetic-{index:04d}.csv"), index=False)
+
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser(description="Out-of-core training over the snapshot partitions, with peak RSS per strategy")
+    parser.add_argument("paths", nargs="*", help="Partition CSVs (default: every history snapshot)")
+    parser.add_argument("--strategies", nargs="+", choices=STRATEGIES, default=list(STRATEGIES))
+    parser.add_argument("--budget-mb", type=float, default=MEMORY_BUDGET_MB, help="Reservoir sample budget (default: %(default)s)")
+    parser.add_argument("--synthetic", type=int, nargs=2, metavar=("PARTITIONS", "ROWS"), help="Benchmark on generated partitions")
+    parser.add_argument("--publish", choices=STRATEGIES, help="Train with this strategy and publish the model to the registry")
+    parser.add_argument("--child", choices=STRATEGIES, help=argparse.SUPPRESS)
+    args = parser.parse_args()
+
+    paths = args.paths or partition_paths()
+    if args.child:
+        _, stats, _ = train(args.child, paths, args.budget_mb)
+        print(json.dumps(stats))
+    elif args.publish:
+        model, stats, (X_test, _, metrics) = train(args.publish, paths, args.budget_mb)
+        params = {'loss': 'log_loss', 'epochs': SGD_EPOCHS} if args.publish == 'sgd' else BASELINE[1]
+        meta = model_registry.publish(
+            model, feature_store.features_version(partitions_version(paths)), FEATURES, {**params, 'out_of_core': args.publish},
+            estimator='SGDClassifier' if args.publish == 'sgd' else None,
+            metrics={'accuracy': metrics['accuracy'], 'report': metrics['report'], 'n_samples': stats['train_rows']},
+            extra={'fill_values': fill_values(pd.DataFrame(X_test, columns=FEATURES)), 'out_of_core': stats},
+        )
+        print(f"Published {meta['key']} ({args.publish}, {stats['fitted_rows']:,} rows fitted, peak RSS {stats['peak_rss_mb']:.0f} MB)")
+    else:
+        with tempfile.TemporaryDirectory() as tmp_dir:
+            if args.synthetic:
+                write_synthetic_partitions(tmp_dir, *args.synthetic)
+                paths = partition_paths(tmp_dir)
+            print(f"{len(paths)} partition(s), {sum(os.path.getsize(path) for path in paths) / 2**20:.1f} MB of CSV")
+            table = pd.DataFrame([measure(strategy, paths, args.budget_mb) for strategy in args.strategies])
+        columns = ['strategy', 'train_rows', 'fitted_rows', 'seconds', 'baseline_rss_mb', 'peak_rss_mb', 'accuracy', 'f1']
+        print(table[columns].to_string(index=False, float_format=lambda value: f"{value:.3f}"))
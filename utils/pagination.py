@@ -0,0 +1,36 @@
+# utils/pagination.py
+import math
+
+# --- Configuration ---
+PAGE_SIZE_OPTIONS = [12, 24, 48]
+DEFAULT_PAGE_SIZE = 24
+
+
+def page_count(n_items, page_size):
+    """Number of pages needed for `n_items` (at least 1, so an empty result still has a page 1)."""
+    return max(math.ceil(n_items / page_size), 1)
+
+
+def clamp_page(page, n_items, page_size):
+    """`page` (0-based) brought back into range, e.g. after a filter shrank the result set."""
+    return min(max(int(page), 0), page_count(n_items, page_size) - 1)
+
+
+def page_bounds(page, n_items, page_size):
+    """(start, stop) row positions of `page`; slice the already-sorted frame with .iloc[start:stop]."""
+    page = clamp_page(page, n_items, page_size)
+    start = page * page_size
+    return start, min(start + page_size, n_items)
+
+
+def shift_page(state, key, step):
+    """Pager button callback: moves the page cursor `state[key]` (e.g. st.session_state) by `step`."""
+    state[key] += step
+
+
+def stable_sort(df, by, ascending=True, na_position='last'):
+    """
+    sort_values with a stable algorithm: rows with equal keys keep their original (relevance) order,
+    so a card never moves to another page between reruns.
+    """
+    return df.sort_values(by=by, ascending=ascending, na_position=na_position, kind='mergesort')
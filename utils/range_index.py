@@ -0,0 +1,105 @@
+# utils/range_index.py
+import time
+
+import numpy as np
+import pandas as pd
+
+
+class SortedColumn:
+    """
+    One numeric column kept as sorted values plus the row permutation that sorts it.
+    A range query is two searchsorted calls and a slice of the permutation: O(log n + k).
+    """
+
+    def __init__(self, values):
+        values = np.asarray(values, dtype=float)
+        valid = ~np.isnan(values)
+        valid_rows = np.flatnonzero(valid)
+        order = np.argsort(values[valid_rows], kind='stable')
+        self.permutation = valid_rows[order]
+        self.sorted_values = values[self.permutation]
+        self.missing_rows = np.flatnonzero(~valid)
+
+    def between(self, low=None, high=None, include_missing=False):
+        """
+        Row positions (unordered) with low <= value <= high; `None` leaves that side open. NaN rows only on request.
+        Returns None when the range keeps every row.
+        """
+        start = 0 if low is None else np.searchsorted(self.sorted_values, low, side='left')
+        stop = len(self.sorted_values) if high is None else np.searchsorted(self.sorted_values, high, side='right')
+        if start == 0 and stop == len(self.sorted_values) and (include_missing or not self.missing_rows.size):
+            return None  # Every row passes: no constraint
+        rows = self.permutation[start:max(start, stop)]
+        if include_missing and self.missing_rows.size:
+            rows = np.concatenate([rows, self.missing_rows])
+        return rows
+
+
+class RangeIndex:
+    """Sorted-column indexes over the numeric columns of a frame, built once per dataset version."""
+
+    def __init__(self, df, columns):
+        self.n_rows = len(df)
+        self.columns = {col: SortedColumn(df[col].to_numpy(dtype=float, na_value=np.nan)) for col in columns}
+
+    def query(self, ranges, candidates=None):
+        """
+        Sorted row positions satisfying every range in `ranges` ({column: (low, high, include_missing)})
+        and, if given, belonging to `candidates` (e.g. keyword search hits).
+        Row sets are intersected smallest first through a row bitmap, so the cost follows the matched rows;
+        ranges that keep every row are skipped.
+        """
+        row_sets = [self.columns[col].between(low, high, include_missing) for col, (low, high, include_missing) in ranges.items()]
+        if candidates is not None:
+            row_sets.append(np.asarray(candidates, dtype=np.int64))
+        row_sets = sorted((rows for rows in row_sets if rows is not None), key=len)
+        if not row_sets:
+            return np.arange(self.n_rows)
+        if len(row_sets[0]) * 8 > self.n_rows:
+            # Even the most selective set is a large share of the frame: AND bitmaps, no sort needed
+            mask = np.zeros(self.n_rows, dtype=bool)
+            mask[row_sets[0]] = True
+            for rows in row_sets[1:]:
+                other = np.zeros(self.n_rows, dtype=bool)
+                other[rows] = True
+                mask &= other
+            return np.flatnonzero(mask)
+        result = row_sets[0]
+        for rows in row_sets[1:]:
+            if result.size == 0:
+                break
+            mask = np.zeros(self.n_rows, dtype=bool)
+            mask[rows] = True
+            result = result[mask[result]]
+        return np.sort(result)  # Back to frame order
+
+
+if __name__ == "__main__":
+    # Benchmark against the previous approach: a full boolean mask per filter on every interaction
+    rng = np.random.default_rng(0)
+    n_rows = 5_000_000
+    df = pd.DataFrame({
+        'price_numeric': np.where(rng.random(n_rows) < 0.02, np.nan, rng.gamma(2, 70, n_rows)),
+        'rating_numeric': np.where(rng.random(n_rows) < 0.1, np.nan, np.round(rng.uniform(1, 5, n_rows), 1)),
+    })
+    start = time.perf_counter()
+    index = RangeIndex(df, ['price_numeric', 'rating_numeric'])
+    print(f"{n_rows:,} rows: index build {time.perf_counter() - start:.2f} s (once per dataset version)")
+
+    for price_range, min_rating in [((100.0, 110.0), 4.5), ((50.0, 400.0), 3.0), ((0.0, 2000.0), 0.0)]:
+        start = time.perf_counter()
+        mask = (
+            (df['price_numeric'].fillna(price_range[0]) >= price_range[0]) &
+            (df['price_numeric'].fillna(price_range[1]) <= price_range[1]) &
+            (df['rating_numeric'].fillna(0) >= min_rating)
+        )
+        mask_rows = np.flatnonzero(mask.to_numpy())
+        mask_ms = (time.perf_counter() - start) * 1000
+        start = time.perf_counter()
+        rows = index.query({
+            'price_numeric': (price_range[0], price_range[1], True),
+            'rating_numeric': (min_rating, None, min_rating <= 0),
+        })
+        index_ms = (time.perf_counter() - start) * 1000
+        assert np.array_equal(rows, mask_rows)
+        print(f"price {price_range}, rating >= {min_rating}: {rows.size:,} rows, index {index_ms:.1f} ms, masks {mask_ms:.1f} ms")
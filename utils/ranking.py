@@ -0,0 +1,270 @@
+# utils/ranking.py
+import argparse
+import json
+import os
+import threading
+import time
+from datetime import datetime, timedelta, timezone
+
+import numpy as np
+import pandas as pd
+
+import utils.feature_store as feature_store
+import utils.model_registry as model_registry
+import utils.scoring as scoring
+import utils.snapshots as snapshots
+from utils.dataset_version import file_version
+
+# --- Configuration ---
+RANKING_DIR = os.path.join(model_registry.REGISTRY_DIR, "ranking")  # One JSON file per trained ranker
+CURRENT_RANKER_PATH = os.path.join(RANKING_DIR, "current.json")
+# The hand-weighted score terms (scoring.score_matrix) plus the bestseller badge
+TERMS = scoring.WEIGHT_KEYS + ['badge']
+HAND_WEIGHTS = {'rating': 2.0, 'sales': 1.5, 'price': 0.5, 'discount': 1.0}  # The dashboard's default sliders
+RELEVANCE_GRADES = 4  # Growing items are split into this many growth quantiles per snapshot (0 = no growth)
+MAX_PAIRS_PER_QUERY = 50_000
+TEST_FRACTION = 0.25  # Latest snapshots held out for the NDCG evaluation
+NDCG_AT = [10, 50]
+RANDOM_STATE = 42
+
+_ranking_lock = threading.Lock()
+
+
+# --- Training Data ---
+def rank_terms(features):
+    """(n_rows, len(TERMS)) matrix: the dashboard's score terms, then the badge flag. Missing values are 0."""
+    badge = features['has_bestseller_badge'].to_numpy(dtype=float, na_value=0.0) if 'has_bestseller_badge' in features else np.zeros(len(features))
+    return np.column_stack([scoring.score_matrix(features), badge])
+
+
+def relevance_grades(growth):
+    """
+    Graded relevance of one snapshot's items from their future sales growth: 0 for no growth, else
+    1..RELEVANCE_GRADES by growth quantile within the snapshot (the scale of growth drifts over time).
+    """
+    growth = np.asarray(growth, dtype=float)
+    grades = np.zeros(len(growth), dtype=np.int64)
+    growing = growth > 0
+    if growing.any():
+        edges = np.quantile(growth[growing], np.linspace(0, 1, RELEVANCE_GRADES + 1)[1:-1])
+        grades[growing] = 1 + np.searchsorted(edges, growth[growing], side='right')
+    return grades
+
+
+def training_queries(groups, deltas):
+    """
+    One ranking query per snapshot: the items' terms at snapshot time and their relevance grades from
+    the sales growth per day until the next snapshot (the delta log row whose prev_snapshot_at is this
+    snapshot). Items without a next observation are left out. `groups` yields (snapshot_at, features).
+    """
+    growth_by_snapshot = {at: rows.set_index('item_id')['sales_growth_per_day']
+                          for at, rows in deltas.groupby('prev_snapshot_at')}
+    queries = []
+    for snapshot_at, features in groups:
+        growth = growth_by_snapshot.get(snapshot_at)
+        if growth is None:
+            continue  # Latest snapshot: its future isn't known yet
+        growth = growth.reindex(features.index).to_numpy(dtype=float)
+        known = ~np.isnan(growth)
+        if known.sum() < 2:
+            continue
+        queries.append({'snapshot_at': snapshot_at, 'terms': rank_terms(features)[known],
+                        'grades': relevance_grades(growth[known])})
+    return queries
+
+
+def history_groups():
+    """(snapshot_at, features) for every recorded snapshot, oldest first, featurized like the live catalog."""
+    for entry in snapshots.list_snapshots():
+        yield entry['snapshot_at'], feature_store.build_features(snapshots.load_snapshot(entry))
+
+
+# --- Pairwise Ranker ---
+def sample_pairs(queries, max_pairs=MAX_PAIRS_PER_QUERY, random_state=RANDOM_STATE):
+    """Term differences of random same-snapshot pairs with different grades, and whether the first one ranks higher."""
+    rng = np.random.default_rng(random_state)
+    differences, labels = [], []
+    for query in queries:
+        n = len(query['grades'])
+        first, second = rng.integers(0, n, max_pairs), rng.integers(0, n, max_pairs)
+        differ = query['grades'][first] != query['grades'][second]
+        first, second = first[differ], second[differ]
+        differences.append(query['terms'][first] - query['terms'][second])
+        labels.append(query['grades'][first] > query['grades'][second])
+    return np.concatenate(differences), np.concatenate(labels)
+
+
+def fit_weights(queries):
+    """
+    RankNet-style pairwise model: a logistic regression without intercept on pair differences, so
+    P(i above j) = sigmoid(w . (x_i - x_j)) and w is directly a weight per score term.
+    Returns (weights in the terms' own units, number of pairs).
+    """
+    from sklearn.linear_model import LogisticRegression
+
+    differences, labels = sample_pairs(queries)
+    if len(np.unique(labels)) < 2:
+        raise ValueError("Not enough graded pairs to train a ranker")
+    scale = differences.std(axis=0)
+    scale[scale == 0] = 1.0
+    model = LogisticRegression(fit_intercept=False, max_iter=1000).fit(differences / scale, labels)
+    return model.coef_[0] / scale, len(labels)
+
+
+def hand_weights():
+    """The hand-weighted formula as a TERMS weight vector (no badge term)."""
+    return np.append(scoring.weight_vector(HAND_WEIGHTS), 0.0)
+
+
+def mean_ndcg(queries, weights, k):
+    from sklearn.metrics import ndcg_score
+
+    return float(np.mean([ndcg_score(query['grades'][np.newaxis], (query['terms'] @ weights)[np.newaxis], k=k)
+                          for query in queries]))
+
+
+def train(queries, test_fraction=TEST_FRACTION):
+    """
+    Fits the ranker on the older snapshots and reports NDCG@k on the latest ones, next to the
+    hand-weighted formula; the published weights are then refitted on every snapshot.
+    """
+    if len(queries) < 2:
+        raise ValueError(f"Ranking needs at least 2 snapshots with a known future, got {len(queries)}")
+    n_test = max(1, int(round(len(queries) * test_fraction)))
+    train_queries, test_queries = queries[:-n_test], queries[-n_test:]
+    holdout_weights, _ = fit_weights(train_queries)
+    metrics = {}
+    for k in NDCG_AT:
+        metrics[f'ndcg@{k}'] = {'ranker': mean_ndcg(test_queries, holdout_weights, k),
+                                'hand_weighted': mean_ndcg(test_queries, hand_weights(), k)}
+    weights, n_pairs = fit_weights(queries)
+    return {
+        'terms': TERMS, 'weights': weights.tolist(), 'metrics': metrics,
+        'queries': len(queries), 'test_queries': n_test, 'pairs': n_pairs,
+    }
+
+
+# --- Storage ---
+def ranker_path(key):
+    return os.path.join(RANKING_DIR, f"{key}.json")
+
+
+def save_ranker(ranker, history_version, set_current=True):
+    """Stores a trained ranker under a key derived from its weights and history, and points "current" at it."""
+    key = model_registry.model_key(history_version, TERMS, {'weights': ranker['weights']}, estimator="PairwiseRanker")
+    ranker = {**ranker, 'key': key, 'history_version': history_version, 'created_at': datetime.now(timezone.utc).isoformat()}
+    os.makedirs(RANKING_DIR, exist_ok=True)
+    with _ranking_lock:
+        for path, payload in [(ranker_path(key), ranker)] + ([(CURRENT_RANKER_PATH, {'key': key})] if set_current else []):
+            tmp_path = f"{path}.{threading.get_ident()}.tmp"
+            with open(tmp_path, "w", encoding="utf-8") as f:
+                json.dump(payload, f, indent=2)
+            os.replace(tmp_path, path)
+    return ranker
+
+
+def current_ranker():
+    """The current ranker (a small JSON: terms and weights, no sklearn needed to score), or None."""
+    try:
+        with open(CURRENT_RANKER_PATH, encoding="utf-8") as f:
+            key = json.load(f)['key']
+        with open(ranker_path(key), encoding="utf-8") as f:
+            return json.load(f)
+    except (FileNotFoundError, json.JSONDecodeError, KeyError):
+        return None
+
+
+def current_key():
+    ranker = current_ranker()
+    return ranker['key'] if ranker else None
+
+
+def rank_scores(features, ranker):
+    """`rank_score` of every row (same index as `features`)."""
+    return pd.Series(rank_terms(features) @ np.asarray(ranker['weights']), index=features.index, name=feature_store.RANK_COLUMN)
+
+
+def scores_for_version(features, version, ranker=None):
+    """
+    Stored `rank_score` of a dataset version (feature frame indexed by item_id) for the current ranker,
+    computed and written on first use. None when no ranker has been trained yet.
+    """
+    ranker = ranker or current_ranker()
+    if ranker is None:
+        return None
+    scores = feature_store.load_scores(version, ranker['key'], feature_store.RANK_COLUMN)
+    if scores is None:
+        scores = rank_scores(features, ranker)
+        feature_store.write_scores(scores, version, ranker['key'], feature_store.RANK_COLUMN)
+    return scores
+
+
+# --- Synthetic History ---
+def synthetic_history(n_items, n_snapshots, seed=0):
+    """
+    (groups, deltas) like history_groups / load_delta_log, for daily scrapes of `n_items` products.
+    Sales grow with a hidden quality (visible through rating and badge), the discount and the current
+    sales level, and shrink with the price; 90% of the catalog is seen in each scrape.
+    """
+    rng = np.random.default_rng(seed)
+    item_id = pd.Index([f"{1_005_000_000_000_000 + i}" for i in range(n_items)], name='item_id')
+    quality = rng.normal(0, 1, n_items)
+    rating = np.clip(np.round(4.2 + 0.3 * quality + rng.normal(0, 0.3, n_items), 1), 1, 5)
+    rating[rng.random(n_items) < 0.1] = np.nan
+    badge = (quality + rng.normal(0, 1, n_items) > 1.5).astype(int)
+    price = rng.gamma(2.0, 70.0, n_items)
+    sales = np.floor(rng.lognormal(5.0, 2.0, n_items))
+    start = datetime(2025, 1, 1, tzinfo=timezone.utc)
+
+    groups, observed = [], []
+    for day in range(n_snapshots):
+        discount = rng.choice([0, 0, 10, 30, 50], n_items).astype(float)
+        price_now = price * (1 - discount / 100)
+        seen = rng.random(n_items) < 0.9
+        snapshot_at = (start + timedelta(days=day)).isoformat()
+        features = pd.DataFrame({
+            'price_numeric': price_now, 'rating_numeric': rating, 'sales_numeric': sales,
+            'discount_percentage_numeric': discount, 'has_bestseller_badge': badge,
+        }, index=item_id)
+        groups.append((snapshot_at, features[seen]))
+        observed.append(pd.Series(sales, index=item_id)[seen])
+        growth = np.exp(0.8 * quality + 0.02 * discount - 0.004 * price_now + 0.1 * np.log1p(sales) + rng.normal(0, 0.5, n_items))
+        sales = sales + np.floor(growth)
+
+    deltas = []
+    for day in range(1, n_snapshots):  # Daily scrapes: the sales difference is the growth per day
+        previous, current = observed[day - 1], observed[day]
+        both = previous.index.intersection(current.index)
+        deltas.append(pd.DataFrame({'item_id': both, 'snapshot_at': groups[day][0], 'prev_snapshot_at': groups[day - 1][0],
+                                    'sales_growth_per_day': (current[both] - previous[both]).to_numpy()}))
+    return groups, pd.concat(deltas, ignore_index=True)
+
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser(description="Pairwise learning-to-rank on the snapshot history (future sales growth)")
+    parser.add_argument("csv_path", nargs="?", default=os.path.join(feature_store.PROJECT_ROOT, "aliexpress_multi_page_firefox.csv"))
+    parser.add_argument("--synthetic", type=int, nargs=2, metavar=("ITEMS", "SNAPSHOTS"),
+                        help="Evaluate on a generated history instead (nothing is stored)")
+    args = parser.parse_args()
+
+    start = time.perf_counter()
+    if args.synthetic:
+        queries = training_queries(*synthetic_history(*args.synthetic))
+    else:
+        queries = training_queries(history_groups(), snapshots.load_delta_log())
+    try:
+        ranker = train(queries)
+    except ValueError as e:
+        parser.error(f"{e} (record more scrapes, or try --synthetic 5000 10)")
+    print(f"{ranker['queries']} snapshots ({ranker['test_queries']} held out), {ranker['pairs']:,} pairs, "
+          f"trained in {time.perf_counter() - start:.2f} s")
+    for metric, values in ranker['metrics'].items():
+        print(f"{metric}: ranker {values['ranker']:.3f} | hand-weighted {values['hand_weighted']:.3f}")
+    print("weights:", {term: round(weight, 4) for term, weight in zip(TERMS, ranker["weights"])})
+
+    if not args.synthetic:
+        ranker = save_ranker(ranker, file_version(snapshots.DELTA_LOG_PATH))
+        features = feature_store.load_features_for_csv(args.csv_path)
+        if features is not None:
+            scores = scores_for_version(features, file_version(args.csv_path), ranker)
+            print(f"Saved ranker {ranker['key']} and scored {len(scores):,} items of {os.path.basename(args.csv_path)}")
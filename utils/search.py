@@ -0,0 +1,109 @@
+# utils/search.py
+import bisect
+import re
+import time
+import unicodedata
+
+import numpy as np
+import pandas as pd
+
+# --- Configuration ---
+TOKEN_PATTERN = r'\w+'
+COMBINING_MARKS_PATTERN = "[\u0300-\u036f]"  # Accents left over after NFKD decomposition (escapes decoded by Python)
+
+
+def fold(series):
+    """Lowercase, accent-free version of a text Series ("Été Décontracté" -> "ete decontracte")."""
+    return (series.astype("string").fillna("")
+            .str.normalize("NFKD")
+            .str.replace(COMBINING_MARKS_PATTERN, "", regex=True)
+            .str.lower())
+
+
+def query_terms(query):
+    """Folded tokens of a search query; same folding and tokenization as `fold` applies to the titles."""
+    folded = re.sub(COMBINING_MARKS_PATTERN, "", unicodedata.normalize("NFKD", query or "")).lower()
+    return re.findall(TOKEN_PATTERN, folded)
+
+
+class TitleIndex:
+    """
+    Inverted index over product titles, stored CSR-style: a sorted vocabulary, and for term i
+    the sorted row positions rows[offsets[i]:offsets[i + 1]]. Every query term is a prefix, so
+    prefix matches are one contiguous slice of the vocabulary (two bisects); terms are ANDed.
+    """
+
+    def __init__(self, vocabulary, offsets, rows, n_rows):
+        self.vocabulary = vocabulary
+        self.offsets = offsets
+        self.rows = rows
+        self.n_rows = n_rows
+
+    @classmethod
+    def build(cls, titles):
+        """Index of `titles` (a Series, in frame order); search results are positions into that order."""
+        tokens = fold(titles).str.findall(TOKEN_PATTERN)
+        positions = np.repeat(np.arange(len(tokens), dtype=np.int64), tokens.str.len().fillna(0).astype(int))
+        pairs = pd.DataFrame({'term': np.concatenate(tokens.to_numpy()) if len(tokens) else [], 'row': positions})
+        pairs = pairs.drop_duplicates().sort_values(['term', 'row'], kind='mergesort')
+        term_codes, vocabulary = pd.factorize(pairs['term'], sort=True)
+        offsets = np.searchsorted(term_codes, np.arange(len(vocabulary) + 1))
+        return cls(vocabulary.tolist(), offsets, pairs['row'].to_numpy(dtype=np.int64), len(titles))
+
+    def _mark(self, rows):
+        mask = np.zeros(self.n_rows, dtype=bool)
+        mask[rows] = True
+        return mask
+
+    def prefix_rows(self, prefix):
+        """Sorted row positions of titles containing a token starting with `prefix`."""
+        start = bisect.bisect_left(self.vocabulary, prefix)
+        stop = bisect.bisect_left(self.vocabulary, prefix + "\uffff", lo=start)
+        postings = self.rows[self.offsets[start]:self.offsets[stop]]
+        if stop - start <= 1:
+            return postings
+        # Union of several terms' postings: a row bitmap beats sorting once the postings are large
+        if postings.size * 8 > self.n_rows:
+            return np.flatnonzero(self._mark(postings))
+        return np.unique(postings)
+
+    def search(self, query):
+        """
+        Sorted row positions matching every term of `query` (accent- and case-insensitive prefix match),
+        or None for an empty query, meaning "no keyword filter".
+        """
+        terms = query_terms(query)
+        if not terms:
+            return None
+        # Most selective term first, so each intersection only shrinks an already small set
+        candidates = sorted((self.prefix_rows(term) for term in set(terms)), key=len)
+        result = candidates[0]
+        for rows in candidates[1:]:
+            if result.size == 0:
+                break
+            result = result[self._mark(rows)[result]]  # O(len(rows) + len(result)), keeps result sorted
+        return result
+
+
+if __name__ == "__main__":
+    # Benchmark against the previous approach: case-insensitive str.contains over every title
+    rng = np.random.default_rng(0)
+    words = np.array(["robe", "été", "décontractée", "homme", "femme", "chemise", "pantalon", "coton",
+                      "montre", "sac", "smartphone", "étui", "chaussures", "sport", "légère", "élégante"])
+    n_rows = 500_000
+    titles = pd.Series([" ".join(rng.choice(words, 8)) + f" ref{i}" for i in range(n_rows)])
+
+    start = time.perf_counter()
+    index = TitleIndex.build(titles)
+    build_s = time.perf_counter() - start
+
+    for query in ["robe", "ete robe", "Décontr femme sac", "ref12345"]:
+        start = time.perf_counter()
+        for _ in range(20):
+            rows = index.search(query)
+        search_ms = (time.perf_counter() - start) / 20 * 1000
+        start = time.perf_counter()
+        scan = titles.str.contains(query, case=False, na=False)
+        scan_ms = (time.perf_counter() - start) * 1000
+        print(f"{query!r}: index {search_ms:.3f} ms ({rows.size:,} rows), str.contains {scan_ms:.1f} ms ({int(scan.sum()):,} rows)")
+    print(f"Index build for {n_rows:,} titles: {build_s:.2f} s (once per dataset version)")
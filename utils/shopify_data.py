@@ -0,0 +1,325 @@
+# utils/shopify_data.py
+import itertools
+import sys
+
+import numpy as np
+import pandas as pd
+
+from utils.binning import binned_counts
+from utils.chunked import (
+    CountAccumulator, DistinctCounter, RunningStats, StreamingHistogram, iter_csv_batches,
+)
+from utils.currency import convert, store_currencies
+
+# --- Configuration ---
+# Columns the Shopify dashboard actually uses. Heavy text columns (body_html, tags, all_image_srcs)
+# are skipped at parse time, which is most of the file size on multi-store exports.
+DASHBOARD_COLUMNS = [
+    'store_domain', 'product_id', 'title', 'vendor', 'product_type', 'variant_title',
+    'price', 'compare_at_price', 'available',
+    'created_at', 'updated_at', 'published_at', 'variant_created_at', 'variant_updated_at',
+]
+DATETIME_COLUMNS = ['created_at', 'updated_at', 'published_at', 'variant_created_at', 'variant_updated_at']
+CATEGORICAL_COLUMNS = ['vendor', 'product_type', 'store_domain']
+READ_DTYPES = {'store_domain': str, 'vendor': str, 'product_type': str, 'title': str, 'variant_title': str}
+HISTOGRAM_BINS = 50
+FACET_LEVELS = ['store_domain', 'vendor', 'product_type']  # Cascading filter order in the dashboard
+EXPENSIVE_COLUMNS = ['title', 'vendor', 'price', 'store_domain']
+UNAVAILABLE_SAMPLE_COLUMNS = ['title', 'variant_title', 'vendor', 'store_domain']
+
+
+# --- Cleaning ---
+def clean_shopify_batch(df):
+    """Basic cleaning and type conversion for one batch of the Shopify export."""
+    # Convert price columns to numeric, coercing errors to NaN, then from the store's currency
+    # to the reporting currency (one rate lookup per distinct currency in the batch)
+    currencies = store_currencies(df['store_domain']) if 'store_domain' in df.columns else None
+    if currencies is not None:
+        df['currency'] = currencies
+    for col in ['price', 'compare_at_price']:
+        if col in df.columns:
+            df[col] = pd.to_numeric(df[col], errors='coerce')
+            if currencies is not None:
+                df[f'{col}_store'] = df[col]
+                df[col] = convert(df[col], currencies)
+
+    # Convert relevant columns to datetime objects
+    for col in DATETIME_COLUMNS:
+        if col in df.columns:
+            df[col] = pd.to_datetime(df[col], errors='coerce', utc=True)
+
+    # Ensure 'available' is boolean (handle potential string representations)
+    if 'available' in df.columns:
+        lowered = df['available'].astype(str).str.lower()
+        df['available'] = lowered.map({'true': True, 'false': False}).astype('boolean')
+
+    # Handle potential missing values in key categorical columns
+    for col in CATEGORICAL_COLUMNS:
+        if col in df.columns:
+            df[col] = df[col].fillna('Inconnu')
+    return df
+
+
+def iter_shopify_batches(path, chunksize=None, usecols=DASHBOARD_COLUMNS):
+    """Cleaned, typed batches of the Shopify export (see utils.chunked.iter_csv_batches)."""
+    kwargs = {} if chunksize is None else {'chunksize': chunksize}
+    return iter_csv_batches(path, usecols=usecols, dtype=READ_DTYPES, transform=clean_shopify_batch, **kwargs)
+
+
+def load_shopify_frame(path, usecols=DASHBOARD_COLUMNS):
+    """Loads the dashboard columns batch by batch, so peak memory never holds the heavy text columns."""
+    return pd.concat(iter_shopify_batches(path, usecols=usecols), ignore_index=True)
+
+
+# --- Aggregations ---
+class ShopifySummary:
+    """
+    KPIs, availability counts and per-vendor / per-type product counts, folded batch by batch.
+    With `price_edges`, prices go into a fixed histogram (bounded memory, bin-resolution median);
+    without, price values are kept so the median is exact (for frames that are already in memory).
+    """
+
+    def __init__(self, price_edges=None):
+        self.product_ids = None
+        self.total_variants = 0
+        self.available_variants = 0
+        self.price_stats = RunningStats()
+        self.price_histogram = StreamingHistogram(price_edges) if price_edges is not None else None
+        self.price_values = []
+        self.availability = CountAccumulator()
+        self.vendor_products = DistinctCounter('vendor', 'product_id')
+        self.type_products = DistinctCounter('product_type', 'product_id')
+
+    def update(self, batch):
+        self.total_variants += len(batch)
+        if 'product_id' in batch.columns:
+            ids = batch['product_id'].dropna().drop_duplicates()  # Like nunique: a missing ID isn't a product
+            self.product_ids = ids if self.product_ids is None else pd.concat([self.product_ids, ids]).drop_duplicates()
+            if 'vendor' in batch.columns:
+                self.vendor_products.update(batch)
+            if 'product_type' in batch.columns:
+                self.type_products.update(batch)
+        if 'available' in batch.columns:
+            self.available_variants += int(batch['available'].eq(True).sum())
+            self.availability.update(batch['available'])
+        if 'price' in batch.columns:
+            self.price_stats.update(batch['price'])
+            if self.price_histogram is not None:
+                self.price_histogram.update(batch['price'])
+            else:
+                self.price_values.append(batch['price'].dropna().to_numpy(dtype=float))
+        return self
+
+    def result(self):
+        if self.price_histogram is not None:
+            median_price = self.price_histogram.quantile(0.5)
+        else:
+            prices = np.concatenate(self.price_values) if self.price_values else np.array([])
+            median_price = float(np.median(prices)) if prices.size else np.nan
+        vendor_counts = self.vendor_products.result()
+        type_counts = self.type_products.result()
+        return {
+            'total_unique_products': 0 if self.product_ids is None else int(self.product_ids.size),
+            'total_variants': self.total_variants,
+            'available_variants': self.available_variants,
+            'unavailable_variants': self.total_variants - self.available_variants,
+            'average_price': self.price_stats.mean,
+            'median_price': median_price,
+            'num_vendors': int(vendor_counts.size),
+            'num_product_types': int(type_counts.size),
+            'vendor_product_counts': vendor_counts,
+            'type_product_counts': type_counts,
+            'availability_counts': self.availability.result(),
+            'price_histogram': self.price_histogram.to_frame() if self.price_histogram is not None else None,
+        }
+
+
+# --- Facets ---
+class FacetIndex:
+    """
+    Cascading facets (store_domain -> vendor -> product_type) precomputed at load time.
+    A selection is a tuple with one value per level, None meaning "all"; for every such selection
+    the index holds the matching row positions and the product / variant counts of each option
+    at the next level, so the filters never scan or copy the frame.
+    """
+
+    def __init__(self, df, levels=FACET_LEVELS):
+        self.levels = list(levels)
+        self.n_rows = len(df)
+        self.row_dtype = np.int32 if self.n_rows < 2**31 else np.int64  # Positions are most of the index's memory
+        self.rows = {}  # selection -> sorted row positions
+        self.counts = {}  # selection -> (unique products, variants)
+        for fixed in itertools.product([False, True], repeat=len(self.levels)):
+            columns = [level for level, is_fixed in zip(self.levels, fixed) if is_fixed]
+            if not columns:
+                self.rows[self._selection({})] = np.arange(self.n_rows, dtype=self.row_dtype)
+                self.counts[self._selection({})] = (int(df['product_id'].nunique()), self.n_rows)
+                continue
+            grouped = df.groupby(columns, sort=False, observed=True)
+            products = grouped['product_id'].nunique()
+            for key, positions in grouped.indices.items():
+                key = key if isinstance(key, tuple) else (key,)
+                selection = self._selection(dict(zip(columns, key)))
+                self.rows[selection] = positions.astype(self.row_dtype)
+                self.counts[selection] = (int(products[key if len(key) > 1 else key[0]]), len(positions))
+
+        # Options of each level under each selection of the levels before it (the cascade)
+        children = {}
+        for key, (products, variants) in self.counts.items():
+            fixed_positions = [i for i, value in enumerate(key) if value is not None]
+            if not fixed_positions:
+                continue
+            last = fixed_positions[-1]
+            parent = key[:last] + (None,) * (len(self.levels) - last)
+            children.setdefault((parent, self.levels[last]), []).append((key[last], products, variants))
+        self.children = {
+            parent_level: pd.DataFrame(options, columns=['value', 'products', 'variants']).sort_values('value', ignore_index=True)
+            for parent_level, options in children.items()
+        }
+
+    def _selection(self, values):
+        return tuple(values.get(level) for level in self.levels)
+
+    def selection_rows(self, selection):
+        """Row positions (sorted) matching `selection`; empty if that combination doesn't exist."""
+        return self.rows.get(tuple(selection), np.array([], dtype=np.int64))
+
+    def options(self, level, selection):
+        """
+        Options of `level` under `selection` (levels from `level` on are ignored) as a DataFrame
+        (value, products, variants), sorted by value.
+        """
+        position = self.levels.index(level)
+        parent = tuple(selection[:position]) + (None,) * (len(self.levels) - position)
+        empty = pd.DataFrame(columns=['value', 'products', 'variants'])
+        return self.children.get((parent, level), empty)
+
+
+# --- Selection Aggregates ---
+class SelectionAggregator:
+    """
+    Every dashboard aggregate of a row selection computed together from integer codes factorized once at load time:
+    KPIs, per-vendor / per-type unique product counts, availability counts, the price histogram,
+    the most expensive products and a sample of unavailable variants. No groupby or value_counts per section.
+    """
+
+    def __init__(self, df):
+        self.df = df
+        self.product_codes, self.product_ids = pd.factorize(df['product_id'])
+        self.vendor_codes, self.vendors = pd.factorize(df['vendor'])
+        self.type_codes, self.product_types = pd.factorize(df['product_type'])
+        self.prices = df['price'].to_numpy(dtype=float, na_value=np.nan)
+        # Availability as 0 = False, 1 = True, 2 = unknown
+        available = df['available'].astype('boolean')
+        self.availability_codes = np.where(available.isna(), 2, available.fillna(False).astype(int)).astype(np.int8)
+
+    def _distinct_products_per(self, group_codes, group_names, products, rows):
+        """Unique products per group (vendor / type) for the selected rows, largest first."""
+        groups = group_codes[rows]
+        known = (groups >= 0) & (products >= 0)  # Missing vendor/type or product_id: factorize code -1
+        pairs = np.unique(groups[known].astype(np.int64) * len(self.product_ids) + products[known])
+        counts = np.bincount(pairs // len(self.product_ids), minlength=len(group_names))
+        present = np.flatnonzero(counts)
+        result = pd.Series(counts[present], index=pd.Index(group_names[present]), dtype=np.int64)
+        return result.sort_values(ascending=False, kind='stable')
+
+    def aggregate(self, rows, bins=HISTOGRAM_BINS):
+        """Aggregates of the rows at positions `rows`; same keys as ShopifySummary.result(), plus the story sections."""
+        rows = np.asarray(rows)
+        products = self.product_codes[rows]
+        unique_products = np.unique(products[products >= 0])
+
+        availability = np.bincount(self.availability_codes[rows], minlength=3)
+        availability_counts = pd.Series(
+            availability, index=pd.Index([False, True, pd.NA], dtype=object), dtype=np.int64
+        )
+        availability_counts = availability_counts[availability_counts > 0].sort_values(ascending=False, kind='stable')
+
+        prices = self.prices[rows]
+        priced = ~np.isnan(prices)
+        vendor_counts = self._distinct_products_per(self.vendor_codes, self.vendors, products, rows)
+        type_counts = self._distinct_products_per(self.type_codes, self.product_types, products, rows)
+
+        # Most expensive products: highest variant price per product, first 5 distinct products
+        priced_rows = rows[priced]
+        by_price = priced_rows[np.argsort(-self.prices[priced_rows], kind='stable')]
+        _, first_positions = np.unique(self.product_codes[by_price], return_index=True)
+        most_expensive_rows = by_price[np.sort(first_positions)[:5]]
+
+        return {
+            'total_unique_products': int(unique_products.size),
+            'total_variants': int(rows.size),
+            'available_variants': int(availability[1]),
+            'unavailable_variants': int(rows.size - availability[1]),
+            'average_price': float(prices[priced].mean()) if priced.any() else np.nan,
+            'median_price': float(np.median(prices[priced])) if priced.any() else np.nan,
+            'num_vendors': int(vendor_counts.size),
+            'num_product_types': int(type_counts.size),
+            'vendor_product_counts': vendor_counts,
+            'type_product_counts': type_counts,
+            'availability_counts': availability_counts,
+            'price_histogram': binned_counts(prices, bins=bins),
+            'most_expensive': self._frame(most_expensive_rows, EXPENSIVE_COLUMNS),
+            'unavailable_sample': self._unavailable_sample(rows[self.availability_codes[rows] == 0]),
+        }
+
+    def _frame(self, rows, columns):
+        return self.df.iloc[rows][[col for col in columns if col in self.df.columns]]
+
+    def _unavailable_sample(self, rows, size=10):
+        """First `size` distinct unavailable variants, reading only as many rows as needed."""
+        window = size * 10
+        while True:
+            sample = self._frame(rows[:window], UNAVAILABLE_SAMPLE_COLUMNS).drop_duplicates().head(size)
+            if len(sample) == size or window >= rows.size:
+                return sample
+            window *= 4
+
+
+def summarize_csv(path, bins=HISTOGRAM_BINS, chunksize=None):
+    """
+    Out-of-core summary of a Shopify export: one cheap pass over the (converted) price to fix the histogram range,
+    then one pass over the dashboard columns. Memory is bounded by the batch size and the number of
+    distinct products / vendors, not by the file size.
+    """
+    price_range = RunningStats()
+    for batch in iter_shopify_batches(path, chunksize=chunksize, usecols=['store_domain', 'price']):
+        price_range.update(batch['price'])
+    low = price_range.min if price_range.count else 0.0
+    high = price_range.max if price_range.count and price_range.max > low else low + 1.0
+    summary = ShopifySummary(price_edges=np.linspace(low, high, bins + 1))
+    for batch in iter_shopify_batches(path, chunksize=chunksize):
+        summary.update(batch)
+    return summary.result()
+
+
+def check_selection_aggregator(df):
+    """Asserts that SelectionAggregator agrees with the batch-folded ShopifySummary on every row of `df`."""
+    expected = ShopifySummary().update(df).result()
+    actual = SelectionAggregator(df).aggregate(np.arange(len(df)))
+    for key in ['total_unique_products', 'total_variants', 'available_variants', 'num_vendors', 'num_product_types']:
+        assert actual[key] == expected[key], (key, actual[key], expected[key])
+    for key in ['vendor_product_counts', 'type_product_counts']:
+        assert actual[key].sort_index().to_dict() == expected[key].sort_index().to_dict(), key
+
+
+if __name__ == "__main__":
+    if sys.argv[1:] == ["--check"]:
+        # Rows with a missing product_id, vendor or type must not be counted (nor shift into a neighbouring group)
+        check_frame = pd.DataFrame({
+            'product_id': [1, 1, 2, np.nan, 3, np.nan, 4],
+            'vendor': ['a', 'a', 'b', 'b', np.nan, np.nan, 'c'],
+            'product_type': ['x', np.nan, 'y', 'y', 'x', np.nan, 'x'],
+            'price': [10.0, 12.0, np.nan, 5.0, 7.0, 1.0, 3.0],
+            'available': [True, False, True, None, True, False, True],
+        })
+        check_selection_aggregator(check_frame)
+        print("SelectionAggregator matches ShopifySummary")
+        sys.exit(0)
+    csv_path = sys.argv[1] if len(sys.argv) > 1 else "utils/products_data.csv"
+    result = summarize_csv(csv_path)
+    for key, value in result.items():
+        if isinstance(value, (pd.Series, pd.DataFrame)):
+            print(f"{key}:\n{value.head(10)}")
+        else:
+            print(f"{key}: {value}")
@@ -0,0 +1,188 @@
+# utils/snapshots.py
+import json
+import os
+import threading
+from datetime import datetime, timezone
+
+import numpy as np
+import pandas as pd
+
+from utils.cleaning import item_ids, parse_price, parse_sales
+from utils.dataset_version import file_version
+
+# --- Configuration ---
+PROJECT_ROOT = os.path.abspath(os.path.join(os.path.dirname(__file__), ".."))
+HISTORY_DIR = os.path.join(PROJECT_ROOT, "data", "history")
+SNAPSHOTS_DIR = os.path.join(HISTORY_DIR, "snapshots")  # One immutable CSV per scrape
+MANIFEST_PATH = os.path.join(HISTORY_DIR, "manifest.json")  # Recorded and applied snapshots
+STATE_PATH = os.path.join(HISTORY_DIR, "state.csv")  # Latest observation + deltas per item
+DELTA_LOG_PATH = os.path.join(HISTORY_DIR, "delta_log.csv")  # Append-only log of every computed delta
+
+STATE_COLUMNS = [
+    'item_id', 'snapshot_at', 'rank', 'price_numeric', 'sales_numeric',
+    'prev_snapshot_at', 'price_change', 'price_change_pct', 'sales_growth_per_day', 'rank_change',
+]
+DELTA_COLUMNS = ['price_change', 'price_change_pct', 'sales_growth_per_day', 'rank_change']
+
+_history_lock = threading.Lock()
+
+
+# --- Storage Helpers ---
+def _read_manifest():
+    if not os.path.exists(MANIFEST_PATH):
+        return {"snapshots": [], "applied": []}
+    with open(MANIFEST_PATH, encoding="utf-8") as f:
+        return json.load(f)
+
+
+def _write_atomic(path, write):
+    """Writes via a temporary file and os.replace so readers never see a partial file."""
+    tmp_path = f"{path}.tmp"
+    write(tmp_path)
+    os.replace(tmp_path, path)
+
+
+def _write_manifest(manifest):
+    def write(tmp_path):
+        with open(tmp_path, "w", encoding="utf-8") as f:
+            json.dump(manifest, f, indent=2)
+    _write_atomic(MANIFEST_PATH, write)
+
+
+def _read_state():
+    if not os.path.exists(STATE_PATH):
+        return pd.DataFrame(columns=STATE_COLUMNS).set_index('item_id')
+    return pd.read_csv(STATE_PATH, dtype={'item_id': str}).set_index('item_id')
+
+
+# --- Snapshot Recording ---
+def record_snapshot(df_raw, snapshot_at=None, source_version=None):
+    """
+    Appends a scrape to the history as a new immutable snapshot and applies it to the delta state.
+    `df_raw` is the scraper output (one row per product card, in page order).
+    Returns the snapshot id.
+    """
+    snapshot_at = snapshot_at or datetime.now(timezone.utc)
+    snapshot_id = snapshot_at.strftime("%Y%m%dT%H%M%SZ")
+
+    snapshot = df_raw.copy()
+    snapshot.insert(0, 'item_id', item_ids(snapshot['url'], snapshot.get('name')))
+    snapshot.insert(1, 'snapshot_at', snapshot_at.isoformat())
+    snapshot.insert(2, 'rank', np.arange(1, len(snapshot) + 1))
+    snapshot = snapshot.drop_duplicates(subset='item_id', keep='first')  # Keep the best-ranked card
+
+    with _history_lock:
+        os.makedirs(SNAPSHOTS_DIR, exist_ok=True)
+        manifest = _read_manifest()
+        if any(entry["id"] == snapshot_id for entry in manifest["snapshots"]):
+            return snapshot_id
+
+        snapshot_path = os.path.join(SNAPSHOTS_DIR, f"{snapshot_id}.csv")
+        _write_atomic(snapshot_path, lambda tmp_path: snapshot.to_csv(tmp_path, index=False, encoding="utf-8"))
+        manifest["snapshots"].append({
+            "id": snapshot_id,
+            "path": os.path.relpath(snapshot_path, HISTORY_DIR),
+            "snapshot_at": snapshot_at.isoformat(),
+            "source_version": source_version,
+            "rows": int(len(snapshot)),
+        })
+        _write_manifest(manifest)
+        _apply_pending(manifest)
+    return snapshot_id
+
+
+def sync_from_csv(csv_path):
+    """
+    Records `csv_path` as a snapshot if its content hasn't been recorded yet.
+    Cheap to call on every rerun: the version token is cached on mtime/size.
+    """
+    version = file_version(csv_path)
+    if version is None:
+        return None
+    manifest = _read_manifest()
+    for entry in manifest["snapshots"]:
+        if entry.get("source_version") == version:
+            return entry["id"]
+    snapshot_at = datetime.fromtimestamp(os.path.getmtime(csv_path), tz=timezone.utc)
+    return record_snapshot(pd.read_csv(csv_path), snapshot_at=snapshot_at, source_version=version)
+
+
+# --- Incremental Delta Job ---
+def _apply_pending(manifest):
+    """Applies snapshots not yet folded into the state, oldest first. Caller must hold the lock."""
+    applied = set(manifest["applied"])
+    pending = sorted(
+        (entry for entry in manifest["snapshots"] if entry["id"] not in applied),
+        key=lambda entry: entry["snapshot_at"],
+    )
+    for entry in pending:
+        _apply_snapshot(load_snapshot(entry))
+        manifest["applied"].append(entry["id"])
+        _write_manifest(manifest)
+
+
+def _apply_snapshot(snapshot):
+    """
+    Folds one snapshot into the per-item state. Only the new snapshot and the previous state are read,
+    so the cost is proportional to the catalog size, not the length of the history.
+    """
+    state = _read_state()
+
+    current = pd.DataFrame({
+        'snapshot_at': snapshot['snapshot_at'].values,
+        'rank': snapshot['rank'].values,
+        'price_numeric': parse_price(snapshot['price']).values if 'price' in snapshot else np.nan,
+        'sales_numeric': parse_sales(snapshot['sales_info']).values if 'sales_info' in snapshot else 0,
+    }, index=pd.Index(snapshot['item_id'].values, name='item_id'))
+
+    previous = state.reindex(current.index)
+    seen_before = previous['snapshot_at'].notna()
+    elapsed_days = (
+        pd.to_datetime(current['snapshot_at'], utc=True) - pd.to_datetime(previous['snapshot_at'], utc=True)
+    ).dt.total_seconds() / 86400
+
+    current['prev_snapshot_at'] = previous['snapshot_at']
+    current['price_change'] = current['price_numeric'] - previous['price_numeric']
+    current['price_change_pct'] = current['price_change'] / previous['price_numeric'].replace(0, np.nan) * 100
+    current['sales_growth_per_day'] = (
+        (current['sales_numeric'] - previous['sales_numeric']) / elapsed_days.where(elapsed_days > 0)
+    )
+    current['rank_change'] = previous['rank'] - current['rank']  # Positive = moved up the listing
+
+    # Items missing from this scrape keep their last known observation
+    state = pd.concat([state[~state.index.isin(current.index)], current[STATE_COLUMNS[1:]]])
+    _write_atomic(STATE_PATH, lambda tmp_path: state.reset_index().to_csv(tmp_path, index=False))
+
+    deltas = current.loc[seen_before].reset_index()[['item_id', 'snapshot_at', 'prev_snapshot_at'] + DELTA_COLUMNS]
+    if not deltas.empty:
+        write_header = not os.path.exists(DELTA_LOG_PATH)
+        deltas.to_csv(DELTA_LOG_PATH, mode='a', header=write_header, index=False)
+
+
+# --- Readers ---
+def state_version():
+    """Version token of the delta state, for keying cached readers."""
+    return file_version(STATE_PATH)
+
+
+def load_delta_log():
+    """Every computed delta (one row per item and snapshot pair), or an empty frame when no history exists."""
+    if not os.path.exists(DELTA_LOG_PATH):
+        return pd.DataFrame(columns=['item_id', 'snapshot_at', 'prev_snapshot_at'] + DELTA_COLUMNS)
+    return pd.read_csv(DELTA_LOG_PATH, dtype={'item_id': str})
+
+
+def load_snapshot(entry):
+    """Raw rows of one manifest entry (item_id, snapshot_at and rank first, then the scraper's columns)."""
+    return pd.read_csv(os.path.join(HISTORY_DIR, entry["path"]), dtype={'item_id': str})
+
+
+def list_snapshots():
+    """Manifest entries, oldest first."""
+    return sorted(_read_manifest()["snapshots"], key=lambda entry: entry["snapshot_at"])
+
+
+def load_item_deltas():
+    """Latest per-item delta columns (indexed by item_id), or an empty frame when no history exists."""
+    state = _read_state()
+    return state[DELTA_COLUMNS + ['prev_snapshot_at']]
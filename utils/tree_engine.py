@@ -0,0 +1,155 @@
+# utils/tree_engine.py
+import argparse
+import os
+import time
+
+import numpy as np
+
+# --- Configuration ---
+CHUNK_ROWS = 16_384  # Rows traversed at once: bounds the (row, tree) pair arrays to a few tens of MB
+MAX_ENGINE_BATCH = 512  # Above this, sklearn's compiled traversal is faster (see the benchmark below)
+SUPPORTED_ESTIMATORS = ('RandomForestClassifier', 'ExtraTreesClassifier')
+ENGINE_FILE = "forest.npz"  # Stored next to model.joblib in a registry entry
+
+
+# --- Export (needs the fitted sklearn model) ---
+def export_forest(model):
+    """
+    Flattens a fitted RandomForest/ExtraTrees classifier into contiguous arrays: every tree's nodes one
+    after the other, child pointers made absolute, and per-node class probabilities normalized the way
+    DecisionTreeClassifier.predict_proba does. Returns a dict of NumPy arrays (savable with np.savez).
+    """
+    if type(model).__name__ not in SUPPORTED_ESTIMATORS:
+        raise ValueError(f"Unsupported estimator for the tree engine: {type(model).__name__}")
+    trees = [estimator.tree_ for estimator in model.estimators_]
+    node_counts = np.array([tree.node_count for tree in trees])
+    roots = np.concatenate([[0], np.cumsum(node_counts)[:-1]]).astype(np.int32)
+
+    def absolute(children, root):
+        # Leaves (-1) stay -1; internal children are offset by the tree's first node
+        return np.where(children == -1, -1, children + root).astype(np.int32)
+
+    n_classes = len(model.classes_)
+    values = []
+    for tree in trees:
+        proba = tree.value[:, 0, :n_classes].astype(np.float64)
+        normalizer = proba.sum(axis=1)[:, np.newaxis]
+        normalizer[normalizer == 0.0] = 1.0
+        values.append(proba / normalizer)
+    return {
+        'feature': np.concatenate([np.maximum(tree.feature, 0) for tree in trees]).astype(np.int32),
+        'threshold': np.concatenate([tree.threshold for tree in trees]).astype(np.float64),
+        'left': np.concatenate([absolute(tree.children_left, root) for tree, root in zip(trees, roots)]),
+        'right': np.concatenate([absolute(tree.children_right, root) for tree, root in zip(trees, roots)]),
+        'missing_left': np.concatenate([np.asarray(tree.missing_go_to_left, dtype=bool) for tree in trees]),
+        'value': np.concatenate(values),
+        'roots': roots,
+        'max_depth': np.array(max(tree.max_depth for tree in trees)),
+        'classes': np.asarray(model.classes_),
+        'n_features': np.array(model.n_features_in_),
+    }
+
+
+def save(arrays, path):
+    tmp_path = f"{path}.tmp.npz"
+    np.savez(tmp_path, **arrays)
+    os.replace(tmp_path, path)
+
+
+# --- Inference (NumPy only) ---
+class ForestEngine:
+    """
+    predict_proba for an exported forest, without sklearn: all (row, tree) pairs descend one level per step,
+    then leaf probabilities are added tree by tree and averaged (same order as sklearn with n_jobs=1).
+    """
+
+    def __init__(self, arrays):
+        self.feature = arrays['feature']
+        self.threshold = arrays['threshold']
+        self.left = arrays['left']
+        self.right = arrays['right']
+        self.missing_left = arrays['missing_left']
+        self.value = arrays['value']
+        self.roots = arrays['roots']
+        self.max_depth = int(arrays['max_depth'])
+        self.classes_ = arrays['classes']
+        self.n_features = int(arrays['n_features'])
+
+    @classmethod
+    def load(cls, path):
+        with np.load(path) as arrays:
+            return cls({name: arrays[name] for name in arrays.files})
+
+    def leaves(self, X):
+        """(n_rows, n_trees) absolute leaf node reached by every row in every tree."""
+        n_rows, n_trees = len(X), len(self.roots)
+        flat_X = X.ravel()
+        nodes = np.tile(self.roots, n_rows)  # Row-major (row, tree) pairs
+        row_offsets = np.repeat(np.arange(n_rows, dtype=np.int64) * self.n_features, n_trees)
+        # Only pairs still on an internal node are advanced, so the work follows the actual path lengths
+        active = np.flatnonzero(self.left[nodes] != -1)
+        while active.size:
+            current = nodes[active]
+            x = flat_X[row_offsets[active] + self.feature[current]]
+            # Same test as sklearn's tree: float32 input promoted to the float64 threshold; NaN follows missing_left
+            go_left = (x <= self.threshold[current]) | (np.isnan(x) & self.missing_left[current])
+            children = np.where(go_left, self.left[current], self.right[current])
+            nodes[active] = children
+            active = active[self.left[children] != -1]
+        return nodes.reshape(n_rows, n_trees)
+
+    def predict_proba(self, X, chunk_rows=CHUNK_ROWS):
+        """Class probabilities (n_rows, n_classes), columns in `classes_` order, like sklearn's predict_proba."""
+        X = np.ascontiguousarray(X, dtype=np.float32)  # sklearn trees also cast to float32
+        proba = np.zeros((len(X), self.value.shape[1]), dtype=np.float64)
+        for start in range(0, len(X), chunk_rows):
+            nodes = self.leaves(X[start:start + chunk_rows])
+            out = proba[start:start + chunk_rows]
+            for tree in range(nodes.shape[1]):
+                out += self.value[nodes[:, tree]]
+        proba /= len(self.roots)
+        return proba
+
+    def predict(self, X):
+        return self.classes_[self.predict_proba(X).argmax(axis=1)]
+
+
+if __name__ == "__main__":
+    # Latency per batch size: sklearn predict_proba (DataFrame, as the app called it, and ndarray) vs the engine
+    import pandas as pd
+    from sklearn.ensemble import RandomForestClassifier
+
+    parser = argparse.ArgumentParser(description="Tree engine benchmark")
+    parser.add_argument("--n-estimators", type=int, default=100)
+    args = parser.parse_args()
+
+    rng = np.random.default_rng(0)
+    n_train = 20_000
+    train = pd.DataFrame({
+        'price_numeric': rng.gamma(2, 70, n_train), 'sales_numeric': rng.lognormal(5, 2, n_train),
+        'rating_numeric': np.round(rng.uniform(1, 5, n_train), 1), 'has_bestseller_badge': rng.integers(0, 2, n_train),
+    })
+    target = ((train['sales_numeric'] > 500).astype(int) + (train['rating_numeric'] > 4.5) + 2 * train['has_bestseller_badge']
+              + rng.integers(0, 2, n_train)) >= 3
+    model = RandomForestClassifier(n_estimators=args.n_estimators, random_state=42, class_weight='balanced').fit(train, target)
+    engine = ForestEngine(export_forest(model))
+
+    def best_ms(function, repeats):
+        timings = []
+        for _ in range(repeats):
+            start = time.perf_counter()
+            function()
+            timings.append(time.perf_counter() - start)
+        return min(timings) * 1000
+
+    print(f"{args.n_estimators} trees, max depth {engine.max_depth}, {len(engine.feature):,} nodes")
+    print(f"{'batch':>8} | {'sklearn DataFrame ms':>20} | {'sklearn ndarray ms':>18} | {'engine ms':>10} | max |diff|")
+    for batch_size in [1, 10, 100, 1_000, 10_000, 100_000]:
+        batch = train.sample(batch_size, replace=True, random_state=1)
+        X = batch.to_numpy(dtype=np.float32)
+        repeats = 20 if batch_size <= 1_000 else 3
+        sklearn_df_ms = best_ms(lambda: model.predict_proba(batch), repeats)
+        sklearn_np_ms = best_ms(lambda: model.predict_proba(X), repeats)
+        engine_ms = best_ms(lambda: engine.predict_proba(X), repeats)
+        diff = np.abs(engine.predict_proba(X) - model.predict_proba(batch)).max()
+        print(f"{batch_size:>8,} | {sklearn_df_ms:>20.2f} | {sklearn_np_ms:>18.2f} | {engine_ms:>10.2f} | {diff:.1e}")